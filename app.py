@@ -20,6 +20,7 @@ def main():
             continue
 
         if user.lower() in ("/exit", "/quit"):
+            bot.fechar()
             print("Antonia> Até mais.")
             break
 
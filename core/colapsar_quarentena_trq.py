@@ -9,6 +9,7 @@ Quarentena:
 Regras:
 - somente candidatos com {validado: true, acao: "aceitar"} viram arestas no grafo
 - deduplica por (de, para, tipo) antes de adicionar
+- tipos fora dos aceitos pelo grafo (diretos ou inversos) são contados e pulados
 """
 
 from __future__ import annotations
@@ -24,7 +25,8 @@ if str(_ROOT) not in sys.path:
 
 import argparse
 import json
-from typing import Any, Dict, List, Set, Tuple
+from collections import Counter
+from typing import Any, Dict, List, Tuple
 
 from core.trq_graph import TRQGraph
 from core.quarantine_store import export_accepted, load_quarantine, list_quarantine
@@ -34,6 +36,14 @@ def _edge_key(e: Dict[str, Any]) -> Tuple[str, str, str]:
     return (str(e.get("de", "")), str(e.get("para", "")), str(e.get("tipo", "")))
 
 
+def _resumo_tipos(tipos: Counter) -> str:
+    """Total e tipos recusados: '3 (efeito: 2, similar_a: 1)'."""
+    total = sum(tipos.values())
+    if not total:
+        return "0"
+    return f"{total} (" + ", ".join(f"{t or '<vazio>'}: {n}" for t, n in sorted(tipos.items())) + ")"
+
+
 def main() -> int:
     ap = argparse.ArgumentParser()
     ap.add_argument("--concept", default=None, help="Colapsar apenas um conceito (id do arquivo).")
@@ -49,15 +59,13 @@ def main() -> int:
         print("Nenhum arquivo de quarentena encontrado.")
         return 0
 
-    existing: Set[Tuple[str, str, str]] = {
-        (e.get("de", ""), e.get("para", ""), e.get("tipo", "")) for e in graph.data.get("arestas", [])
-    }
-
     add_ok = 0
     add_skip = 0
     missing_nodes = 0
+    invalid_types: Counter = Counter()
 
     pending_to_add: List[Dict[str, Any]] = []
+    pending_keys = set()
     for conceito in conceitos:
         data = load_quarantine(quarantine_dir, conceito)
         if not data:
@@ -65,14 +73,18 @@ def main() -> int:
         accepted = export_accepted(data)
         for e in accepted:
             k = _edge_key(e)
-            if k in existing:
+            # add_edge recusaria em silêncio: conta junto com os outros motivos
+            if k[2] not in TRQGraph.TIPOS_VALIDOS and k[2] not in TRQGraph.TIPOS_INVERSOS:
+                invalid_types[k[2]] += 1
+                continue
+            if graph.has_edge(*k) or k in pending_keys:
                 add_skip += 1
                 continue
-            if e["de"] not in graph.data.get("nodos", {}) or e["para"] not in graph.data.get("nodos", {}):
+            if not graph.get_node(e["de"]) or not graph.get_node(e["para"]):
                 missing_nodes += 1
                 continue
             pending_to_add.append(e)
-            existing.add(k)
+            pending_keys.add(k)
 
     if args.dry_run:
         print("DRY RUN")
@@ -80,18 +92,21 @@ def main() -> int:
         print(f"aceitas para adicionar: {len(pending_to_add)}")
         print(f"puladas (duplicadas): {add_skip}")
         print(f"puladas (nodo ausente): {missing_nodes}")
+        print(f"puladas (tipo invalido): {_resumo_tipos(invalid_types)}")
         return 0
 
     if pending_to_add:
-        graph.data.setdefault("arestas", []).extend(pending_to_add)
-        graph.save()
-        add_ok = len(pending_to_add)
+        with graph.batch():
+            for e in pending_to_add:
+                if graph.add_edge(e["de"], e["para"], e["tipo"], peso=e["peso"], origem=e["origem"]):
+                    add_ok += 1
 
     print("=== Colapso concluido ===")
     print(f"conceitos: {len(conceitos)}")
     print(f"arestas adicionadas: {add_ok}")
     print(f"arestas puladas (duplicadas): {add_skip}")
     print(f"arestas puladas (nodo ausente): {missing_nodes}")
+    print(f"arestas puladas (tipo invalido): {_resumo_tipos(invalid_types)}")
     return 0
 
 
@@ -0,0 +1,343 @@
+# core/cow.py
+"""
+Containers copy-on-write do grafo TRQ (ver TRQGraph.snapshot).
+
+O snapshot compartilha os índices do grafo com a versão publicada e o
+escritor copia o que vai alterar. Com dict/list/set comuns essa cópia é do
+container inteiro: a primeira escrita depois de cada snapshot custava O(n).
+
+Aqui o conteúdo fica em fragmentos (~√n fragmentos de ~√n itens, com
+crescimento automático). copy() copia só a tabela de fragmentos, que passa
+a ser compartilhada pelas duas cópias; cada uma copia um fragmento na
+primeira escrita que o toca (uma vez por versão). Leituras custam um
+índice a mais que no dict.
+"""
+from collections.abc import ItemsView, Mapping, MutableMapping, MutableSet, Sequence, ValuesView
+from itertools import chain
+from typing import Iterable, Iterator, List
+
+_AUSENTE = object()
+_BITS_MIN = 3
+
+
+def _bits_para(n: int) -> int:
+    """log2 do nº de fragmentos para n itens: n <= 2 * fragmentos²."""
+    bits = _BITS_MIN
+    while n > 2 << (2 * bits):
+        bits += 1
+    return bits
+
+
+def para_json(obj):
+    """default= do json.dumps para Aresta e para os containers daqui."""
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    if isinstance(obj, (ListaCOW, ConjuntoCOW)):
+        return list(obj)
+    raise TypeError(f"Objeto do tipo {type(obj).__name__} não é serializável em JSON")
+
+
+class _Fragmentado:
+    """Tabela de fragmentos com posse por fragmento (base de MapaCOW e ConjuntoCOW)."""
+
+    __slots__ = ()
+
+    def _montar(self, fragmentos: List, n: int):
+        self._frags = fragmentos
+        self._donos = bytearray(b"\x01") * len(fragmentos)
+        self._mascara = len(fragmentos) - 1
+        self._n = n
+
+    def _indice(self, chave) -> int:
+        h = hash(chave)
+        return (h ^ h >> 4) & self._mascara
+
+    def _copiar_fragmento(self, i: int):
+        f = self._frags[i] = self._frags[i].copy()
+        self._donos[i] = 1
+        return f
+
+    def _compartilhar(self):
+        """Cópia rasa: as duas passam a compartilhar (e copiar ao escrever) os fragmentos."""
+        novo = object.__new__(type(self))
+        novo._frags = self._frags[:]
+        novo._mascara = self._mascara
+        novo._n = self._n
+        novo._donos = bytearray(len(self._frags))
+        self._donos = bytearray(len(self._frags))
+        return novo
+
+    def _cheio(self) -> bool:
+        return self._n > 2 * (self._mascara + 1) ** 2
+
+    def __len__(self) -> int:
+        return self._n
+
+
+class MapaCOW(_Fragmentado, MutableMapping):
+    """
+    dict com copy() em O(√n) e escrita copiando só um fragmento.
+
+    Com ordenado=True a iteração segue a ordem de inserção, como no dict
+    (data["nodos"] é gravado nessa ordem); uma chave removida e inserida
+    de novo volta para a posição antiga.
+    """
+
+    __slots__ = ("_frags", "_donos", "_mascara", "_n", "_ordem")
+
+    def __init__(self, itens=(), ordenado: bool = False):
+        itens = itens if isinstance(itens, dict) else dict(itens)
+        self._ordem = ListaCOW(itens) if ordenado else None
+        self._distribuir(itens.items(), len(itens))
+
+    def _distribuir(self, itens: Iterable, n: int):
+        frags = [{} for _ in range(1 << _bits_para(n))]
+        mascara = len(frags) - 1
+        for chave, valor in itens:
+            h = hash(chave)
+            frags[(h ^ h >> 4) & mascara][chave] = valor
+        self._montar(frags, n)
+
+    def __getitem__(self, chave):
+        h = hash(chave)
+        return self._frags[(h ^ h >> 4) & self._mascara][chave]
+
+    def get(self, chave, padrao=None):
+        h = hash(chave)
+        return self._frags[(h ^ h >> 4) & self._mascara].get(chave, padrao)
+
+    def __contains__(self, chave) -> bool:
+        h = hash(chave)
+        return chave in self._frags[(h ^ h >> 4) & self._mascara]
+
+    def __setitem__(self, chave, valor):
+        h = hash(chave)
+        i = (h ^ h >> 4) & self._mascara
+        f = self._frags[i] if self._donos[i] else self._copiar_fragmento(i)
+        antes = len(f)
+        f[chave] = valor
+        if len(f) == antes:
+            return
+        self._n += 1
+        if self._ordem is not None:
+            self._ordem.append(chave)
+            self._podar_ordem()
+        if self._cheio():
+            self._distribuir(list(self.items()), self._n)
+
+    def __delitem__(self, chave):
+        i = self._indice(chave)
+        if chave not in self._frags[i]:
+            raise KeyError(chave)
+        f = self._frags[i] if self._donos[i] else self._copiar_fragmento(i)
+        del f[chave]
+        self._n -= 1
+
+    def pop(self, chave, padrao=_AUSENTE):
+        if chave in self:
+            valor = self[chave]
+            del self[chave]
+            return valor
+        if padrao is _AUSENTE:
+            raise KeyError(chave)
+        return padrao
+
+    def setdefault(self, chave, padrao=None):
+        valor = self.get(chave, _AUSENTE)
+        if valor is _AUSENTE:
+            self[chave] = valor = padrao
+        return valor
+
+    def clear(self):
+        self._distribuir((), 0)
+        if self._ordem is not None:
+            self._ordem = ListaCOW()
+
+    def _podar_ordem(self):
+        # Chaves removidas ficam na ordem até ela ter o dobro do necessário
+        if len(self._ordem) > 2 * self._n + 16:
+            self._ordem = ListaCOW(list(self))
+
+    def __iter__(self) -> Iterator:
+        if self._ordem is None:
+            return chain.from_iterable(self._frags[:])
+        if len(self._ordem) == self._n:
+            return iter(self._ordem)
+        return self._iter_ordem()
+
+    def _iter_ordem(self) -> Iterator:
+        vistas = set()
+        for chave in self._ordem:
+            if chave not in vistas and chave in self:
+                vistas.add(chave)
+                yield chave
+
+    def items(self) -> ItemsView:
+        return _Itens(self)
+
+    def values(self) -> ValuesView:
+        return _Valores(self)
+
+    def _itens(self) -> Iterator:
+        if self._ordem is None:
+            return chain.from_iterable(f.items() for f in self._frags[:])
+        return ((chave, self[chave]) for chave in self)
+
+    def copy(self) -> "MapaCOW":
+        novo = self._compartilhar()
+        novo._ordem = None if self._ordem is None else self._ordem.copy()
+        return novo
+
+    def __repr__(self) -> str:
+        return f"MapaCOW({dict(self._itens())!r})"
+
+
+class _Itens(ItemsView):
+    def __iter__(self):
+        return self._mapping._itens()
+
+
+class _Valores(ValuesView):
+    def __iter__(self):
+        return (valor for _, valor in self._mapping._itens())
+
+
+class ConjuntoCOW(_Fragmentado, MutableSet):
+    """set com copy() em O(√n) e escrita copiando só um fragmento."""
+
+    __slots__ = ("_frags", "_donos", "_mascara", "_n")
+
+    def __init__(self, itens: Iterable = ()):
+        self._distribuir(set(itens))
+
+    def _distribuir(self, itens: set):
+        frags = [set() for _ in range(1 << _bits_para(len(itens)))]
+        mascara = len(frags) - 1
+        for item in itens:
+            h = hash(item)
+            frags[(h ^ h >> 4) & mascara].add(item)
+        self._montar(frags, len(itens))
+
+    def __contains__(self, item) -> bool:
+        h = hash(item)
+        return item in self._frags[(h ^ h >> 4) & self._mascara]
+
+    def add(self, item):
+        i = self._indice(item)
+        if item in self._frags[i]:
+            return
+        f = self._frags[i] if self._donos[i] else self._copiar_fragmento(i)
+        f.add(item)
+        self._n += 1
+        if self._cheio():
+            self._distribuir(set(self))
+
+    def discard(self, item):
+        i = self._indice(item)
+        if item not in self._frags[i]:
+            return
+        f = self._frags[i] if self._donos[i] else self._copiar_fragmento(i)
+        f.discard(item)
+        self._n -= 1
+
+    def __iter__(self) -> Iterator:
+        return chain.from_iterable(self._frags[:])
+
+    def copy(self) -> "ConjuntoCOW":
+        return self._compartilhar()
+
+    def __repr__(self) -> str:
+        return f"ConjuntoCOW({set(self)!r})"
+
+
+class ListaCOW(Sequence):
+    """
+    list em blocos de ~√n itens com copy() em O(√n): append, pop() do fim
+    e lista[i] = x copiam só o bloco tocado. Todos os blocos, menos o
+    último, estão cheios, então o índice é só deslocamento e máscara.
+    """
+
+    __slots__ = ("_blocos", "_donos", "_bits", "_n")
+
+    def __init__(self, itens: Iterable = ()):
+        self._rebloquear(list(itens))
+
+    def _rebloquear(self, itens: List):
+        self._bits = _bits_para(len(itens))
+        tam = 1 << self._bits
+        self._blocos = [itens[i:i + tam] for i in range(0, len(itens), tam)]
+        self._donos = bytearray(b"\x01") * len(self._blocos)
+        self._n = len(itens)
+
+    def _bloco_proprio(self, j: int) -> List:
+        if self._donos[j]:
+            return self._blocos[j]
+        bloco = self._blocos[j] = self._blocos[j][:]
+        self._donos[j] = 1
+        return bloco
+
+    def _posicao(self, i: int) -> int:
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError("índice fora da lista")
+        return i
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return list(self)[i]
+        i = self._posicao(i)
+        return self._blocos[i >> self._bits][i & ((1 << self._bits) - 1)]
+
+    def __setitem__(self, i: int, valor):
+        i = self._posicao(i)
+        self._bloco_proprio(i >> self._bits)[i & ((1 << self._bits) - 1)] = valor
+
+    def append(self, valor):
+        if self._n > 2 << (2 * self._bits):
+            self._rebloquear(list(self))
+        if self._blocos and len(self._blocos[-1]) < 1 << self._bits:
+            self._bloco_proprio(len(self._blocos) - 1).append(valor)
+        else:
+            self._blocos.append([valor])
+            self._donos.append(1)
+        self._n += 1
+
+    def extend(self, valores: Iterable):
+        for valor in valores:
+            self.append(valor)
+
+    def pop(self):
+        if not self._n:
+            raise IndexError("pop de lista vazia")
+        j = len(self._blocos) - 1
+        bloco = self._bloco_proprio(j)
+        valor = bloco.pop()
+        if not bloco:
+            del self._blocos[j]
+            del self._donos[j]
+        self._n -= 1
+        return valor
+
+    def __iter__(self) -> Iterator:
+        return chain.from_iterable(self._blocos[:])
+
+    def __eq__(self, outro) -> bool:
+        if isinstance(outro, (ListaCOW, list)):
+            return len(self) == len(outro) and all(a == b for a, b in zip(self, outro))
+        return NotImplemented
+
+    def copy(self) -> "ListaCOW":
+        novo = object.__new__(ListaCOW)
+        novo._blocos = self._blocos[:]
+        novo._bits = self._bits
+        novo._n = self._n
+        novo._donos = bytearray(len(self._blocos))
+        self._donos = bytearray(len(self._blocos))
+        return novo
+
+    def __repr__(self) -> str:
+        return f"ListaCOW({list(self)!r})"
@@ -54,7 +54,10 @@ class EstadoDialogo:
         self.papel: str = "neutro"
         self.profundidade: int = 0
         self.historico: List[Turno] = []
-        self.area_tematica: Optional[str] = None  # fisica, matematica, etc
+        self.area_tematica: Optional[str] = None  # componente do grafo do conceito em foco
+        self.mudou_area: bool = False  # vale só para o turno em curso
+        # Próximos tópicos sugeridos pelo grafo (já ranqueados); só o turno em curso
+        self.relacionados: List[str] = []
     
     def registrar_turno(self, entrada: str, saida: str, topico: Optional[str] = None):
         """Registra um turno de conversa."""
@@ -75,6 +78,26 @@ class EstadoDialogo:
                 self.topico_atual = topico
                 self.profundidade = 1
                 self.papel = "neutro"
+        self.mudou_area = False
+        self.relacionados = []
+    
+    def atualizar_area(self, area: str, mesma_area: bool):
+        """
+        Registra a área temática do conceito em foco.
+        
+        A área é a componente conexa do conceito no grafo TRQ. Quem diz se
+        ela é a mesma da anterior é o grafo (o representante da componente
+        muda quando o grafo cresce), por isso `mesma_area` vem de fora.
+        """
+        self.mudou_area = self.area_tematica is not None and not mesma_area
+        self.area_tematica = area
+
+    def sugerir_relacionados(self, conceitos: List[str]):
+        """
+        Registra os conceitos relacionados ao tópico, já ranqueados pelo
+        grafo (PageRank personalizado). Não ranqueia nada aqui.
+        """
+        self.relacionados = list(conceitos)
     
     def inferir_papel(self, conceito: Optional[str] = None) -> str:
         """
@@ -135,6 +158,8 @@ class EstadoDialogo:
         self.papel = "neutro"
         self.profundidade = 0
         self.area_tematica = None
+        self.mudou_area = False
+        self.relacionados = []
         self.historico.clear()
     
     def gerar_gesto_final(self) -> str:
@@ -151,19 +176,31 @@ class EstadoDialogo:
         - se há tópico estabelecido
         - APENAS como convite estrutural, não social
         """
-        if not self.precisa_continuar():
+        if not self.precisa_continuar() or self.mudou_area:
             return ""
         
         if self.papel == "exploradora":
             # Convite baseado no grafo (não na sociabilidade)
+            if self.topico_atual and self.relacionados:
+                proximos = self._listar(self.relacionados[:3])
+                return f"\n\nPosso explorar mais sobre {self.topico_atual} ou seguir para {proximos}?"
             if self.topico_atual:
                 return f"\n\nPosso explorar mais sobre {self.topico_atual} ou seguir para conceitos relacionados?"
             return "\n\nPosso expandir essas conexões ou mudar o foco?"
         
         if self.papel == "explicadora":
+            if self.relacionados:
+                return f"\n\nQuer mais detalhes ou seguimos para {self.relacionados[0]}?"
             return "\n\nQuer mais detalhes ou seguimos adiante?"
         
         return ""
+
+    @staticmethod
+    def _listar(itens: List[str]) -> str:
+        """["a", "b", "c"] -> "a, b ou c"."""
+        if len(itens) <= 1:
+            return "".join(itens)
+        return ", ".join(itens[:-1]) + " ou " + itens[-1]
     
     def __repr__(self) -> str:
         return (
@@ -171,6 +208,7 @@ class EstadoDialogo:
             f"topico={self.topico_atual}, "
             f"papel={self.papel}, "
             f"profundidade={self.profundidade}, "
+            f"area={self.area_tematica}, "
             f"turnos={len(self.historico)})"
         )
 
@@ -1,29 +1,44 @@
 import json
+import os
+import threading
 from pathlib import Path
 from typing import Any, Dict, Optional
+from core import json_stream
+from core.json_stream import Progresso
 from core.tokenizer import normalize
 
 class DictionaryStore:
     # JSON com chave normalizada; 'forma' é a grafia original para exibir bonito.
-    def __init__(self, path: str):
+    def __init__(self, path: str, progresso: Optional[Progresso] = None):
         self.path = Path(path)
         self.data: Dict[str, Dict[str, Any]] = {}
-        self.load()
+        # save() pode rodar no thread de persistência (core.persistencia)
+        self._trava = threading.Lock()
+        self._gravacao = threading.Lock()
+        self.load(progresso)
 
-    def load(self):
+    def load(self, progresso: Optional[Progresso] = None):
+        # Streaming: um verbete por vez, sem o texto inteiro na memória
+        self.data = {}
         if self.path.exists():
-            self.data = json.loads(self.path.read_text(encoding="utf-8"))
-        else:
-            self.data = {}
+            for caminho, entry in json_stream.itens(self.path, nivel=1, progresso=progresso):
+                self.data[caminho[0]] = entry
 
     def lookup(self, word: str) -> Optional[Dict[str, Any]]:
         return self.data.get(normalize(word))
 
     def save(self):
-        self.path.write_text(
-            json.dumps(self.data, ensure_ascii=False, indent=2),
-            encoding="utf-8",
-        )
+        # Cópia rasa sob a trava (verbetes são trocados, nunca editados):
+        # a serialização não bloqueia add(). Temporário + rename = atômico.
+        with self._gravacao:
+            with self._trava:
+                dados = dict(self.data)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(
+                json.dumps(dados, ensure_ascii=False, indent=2),
+                encoding="utf-8",
+            )
+            os.replace(tmp, self.path)
 
     def add(
         self,
@@ -34,11 +49,12 @@ class DictionaryStore:
         *,
         save: bool = True,
     ):
-        self.data[normalize(word)] = {
-            "forma": word.strip(),
-            "classe": classe.strip(),
-            "definicao": definicao.strip(),
-            "relacoes": relacoes or []
-        }
+        with self._trava:
+            self.data[normalize(word)] = {
+                "forma": word.strip(),
+                "classe": classe.strip(),
+                "definicao": definicao.strip(),
+                "relacoes": relacoes or []
+            }
         if save:
             self.save()
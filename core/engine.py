@@ -1,6 +1,9 @@
+import itertools
 import json
 from pathlib import Path
 from core.dictionary_store import DictionaryStore
+from core.persistencia import GravadorAdiado
+from core import trq_query
 from core.trq_graph import TRQGraph
 from core.intent_parser import parse_intent
 from core.templates import (
@@ -42,7 +45,26 @@ class Antonia:
         self.kb = self._load_kb()
         
         # Grafo TRQ - malha explícita de conceitos e relações
-        self.graph = TRQGraph(str(DATA_DIR / "trq_graph.json"))
+        # journal=True: /add e /relacionar só anexam ao log (custo constante)
+        # adiar=True: o append sai do request e vai para o thread de persistência
+        self.graph = TRQGraph(str(DATA_DIR / "trq_graph.json"), journal=True, adiar=True)
+
+        # Gravação em segundo plano, no máximo a cada 500 ms por alvo
+        self.persistencia = GravadorAdiado(intervalo_ms=500)
+        self.persistencia.registrar("grafo", self.graph.flush)
+        self.persistencia.registrar("dicionario", self.dict_store.save)
+
+        # Estruturas derivadas do grafo mantidas fora do request, no mesmo
+        # thread: PageRank (empurra só os resíduos que /add e /relacionar
+        # deixaram), componentes (remontadas só depois de remoções) e
+        # conceitos relacionados (PageRank personalizado, só dos conceitos
+        # já consultados; a tabela gravada é reaproveitada se é da mesma
+        # versão do grafo). Jobs sem disco: fechar() só para o thread.
+        self.relacionados = GravadorAdiado(intervalo_ms=2000, gravar_ao_sair=False)
+        self.relacionados.registrar("centralidade", self.graph.atualizar_centralidade)
+        self.relacionados.registrar("componentes", self.graph.atualizar_componentes)
+        self.relacionados.registrar("grafo", self.graph.recalcular_relacionados)
+        self._marcar_derivados()
         
         # Estado conversacional (um por sessão)
         # Mapeia session_id -> EstadoDialogo
@@ -63,6 +85,16 @@ class Antonia:
         elif USE_VERBALIZER:
             print("[Antonia] Verbalizador RWKV não disponível: módulo ausente.")
 
+    def _marcar_derivados(self):
+        """Agenda a atualização das estruturas derivadas do grafo."""
+        for alvo in ("centralidade", "componentes", "grafo"):
+            self.relacionados.marcar(alvo)
+
+    def fechar(self):
+        """Para o job das estruturas derivadas e grava o que estiver pendente (dicionário e grafo)."""
+        self.relacionados.fechar()
+        self.persistencia.fechar()
+
     def _load_kb(self):
         if self.kb_path.exists():
             return json.loads(self.kb_path.read_text(encoding="utf-8"))
@@ -207,6 +239,7 @@ class Antonia:
             intent.kind = "definicao"
             intent.subject = (user_text or "").strip()
             estado.papel = estado.inferir_papel(intent.subject)
+            self._atualizar_area(estado, intent.subject)
             resp = self._respond_with_role(intent, ctx="", estado=estado, tipo_pergunta=tipo_pergunta, profile_id=prof.id)
 
             if self.verbalizer and prof.id != "trq_duro":
@@ -235,11 +268,12 @@ class Antonia:
         ctx, scored = select_top(cands, user_text, metadata, prof.tsmp.top_k, prof.tsmp.max_chars)
 
         # Atualiza papel conversacional baseado em contexto
-        if intent.kind in {"definicao","explicacao","como","porque","listar","exemplo"} and intent.subject:
+        if intent.kind in {"definicao","explicacao","como","porque","listar","exemplo","relacao"} and intent.subject:
             conceito = intent.subject
         else:
             conceito = None
         estado.papel = estado.inferir_papel(conceito)
+        self._atualizar_area(estado, conceito)
         
         # Gera resposta com consciência de papel
         resp = self._respond_with_role(intent, ctx, estado, tipo_pergunta, prof.id)
@@ -271,6 +305,23 @@ class Antonia:
         self._remember(sess, user_text, resp)
         return resp
 
+    def _atualizar_area(self, estado: EstadoDialogo, conceito: str):
+        """Área temática = componente conexa do conceito no grafo (sem percurso por turno)."""
+        if not conceito:
+            return
+        grafo = self.graph.snapshot()
+        conceito_id = normalize(conceito)
+        area = grafo.component_of(conceito_id)
+        if area is None:
+            return
+        anterior = estado.area_tematica
+        estado.atualizar_area(area, anterior is not None and grafo.same_component(anterior, conceito_id))
+        # Tabela mantida pelo job (grafo vivo: ele a troca fora das versões
+        # publicadas); um conceito fora dela é calculado na hora e entra na
+        # próxima rodada
+        estado.sugerir_relacionados(self.graph.related_concepts(conceito_id, k=3))
+        self.relacionados.marcar("grafo")
+
     def _remember(self, sess, user_text: str, resp: str):
         sess.episodic_memory.append({"role": "user", "text": user_text})
         sess.episodic_memory.append({"role": "antonia", "text": resp})
@@ -292,7 +343,8 @@ class Antonia:
         if not palavra or not classe or not definicao:
             return False, resposta_ensinar_uso()
 
-        self.dict_store.add(palavra, classe, definicao, relacoes)
+        self.dict_store.add(palavra, classe, definicao, relacoes, save=False)
+        self.persistencia.marcar("dicionario")
         
         # Adiciona nó ao grafo TRQ também
         self.graph.add_node(
@@ -303,6 +355,8 @@ class Antonia:
             peso_estabilidade=1.0,  # Máxima estabilidade (entrada humana)
             peso_confianca=1.0       # Máxima confiança (entrada humana)
         )
+        self.persistencia.marcar("grafo")
+        self._marcar_derivados()
         
         return True, resposta_ensinar_ok(palavra)
     
@@ -333,7 +387,12 @@ class Antonia:
         if not self.graph.get_node(conceito2):
             return f"Conceito '{conceito2}' não existe no grafo. Use /add primeiro."
         
+        ja_existia = self.graph.has_edge(conceito1, conceito2, tipo)
         ok = self.graph.add_edge(conceito1, conceito2, tipo)
+        self.persistencia.marcar("grafo")
+        self._marcar_derivados()
+        if ok and ja_existia:
+            return f"Relação já existia: {conceito1} → {conceito2} ({tipo}) (peso/origem atualizados)"
         if ok:
             return f"Relação criada: {conceito1} → {conceito2} ({tipo})"
         return "Erro ao criar relação."
@@ -343,11 +402,16 @@ class Antonia:
         Comandos do grafo TRQ.
         /graph stats - estatísticas
         /graph ver conceito - ver nó e vizinhos
+        /graph compactar - dobra o journal num novo snapshot (e as arestas inversas gravadas)
+        /graph consulta <padrão> - ex.: X -causa-> ? -parte_de-> energia
         """
         cmd = payload.strip().lower()
+
+        if cmd.startswith("consulta "):
+            return self._consultar_grafo(payload.strip()[len("consulta "):])
         
         if cmd == "stats":
-            stats = self.graph.stats()
+            stats = self.graph.snapshot().stats()
             return (
                 f"Grafo TRQ:\n"
                 f"- Nós: {stats['total_nodos']}\n"
@@ -356,18 +420,24 @@ class Antonia:
                 f"- Tipos usados: {', '.join(stats['tipos_relacao']) if stats['tipos_relacao'] else 'nenhum'}"
             )
         
+        if cmd == "compactar":
+            # Migração embutida: inversas gravadas (composto_por...) voltam a ser virtuais
+            dobradas = self.graph.fold_inverse_edges(save=False)["dobradas"]
+            pendentes = self.graph.compact()
+            resp = f"Grafo compactado: {pendentes} mutações do journal dobradas no snapshot."
+            if dobradas:
+                resp += f"\n{dobradas} arestas inversas dobradas nas relações diretas."
+            return resp
+
         if cmd.startswith("ver "):
             conceito = normalize(cmd[4:].strip())
-            node = self.graph.get_node(conceito)
+            grafo = self.graph.snapshot()
+            node = grafo.get_node(conceito)
             if not node:
                 return f"Conceito '{conceito}' não existe no grafo."
             
-            vizinhos = self.graph.neighbors(conceito)
-            relacoes = []
-            for v in vizinhos:
-                rels = self.graph.related(conceito, v)
-                for r in rels:
-                    relacoes.append(f"  → {r['para']} ({r['tipo']})" if r['de'] == conceito else f"  ← {r['de']} ({r['tipo']})")
+            relacoes = [f"  → {r['para']} ({r['tipo']})" for r in grafo.edges(conceito, "out")]
+            relacoes += [f"  ← {r['de']} ({r['tipo']})" for r in grafo.edges(conceito, "in")]
             
             resp = f"Nó: {node['id']}\n"
             resp += f"Definição: {node['definicao_curta']}\n"
@@ -378,7 +448,25 @@ class Antonia:
                 resp += "Sem relações."
             return resp
         
-        return "Comandos: /graph stats | /graph ver <conceito>"
+        return "Comandos: /graph stats | /graph ver <conceito> | /graph compactar | /graph consulta <padrão>"
+
+    def _consultar_grafo(self, padrao: str, limite: int = 20) -> str:
+        """Executa um padrão de core.trq_query e lista os caminhos encontrados."""
+        grafo = self.graph.snapshot()
+        try:
+            consulta = trq_query.parse(padrao, normalizar=normalize)
+        except ValueError as exc:
+            return f"Consulta inválida: {exc}\nEx.: /graph consulta X -causa-> ? -parte_de-> energia"
+        plano = trq_query.planejar(grafo, consulta)
+        casamentos = list(itertools.islice(trq_query.executar(grafo, consulta, plano), limite + 1))
+        if not casamentos:
+            return "Nenhum resultado."
+        linhas = [trq_query.formatar(c) for c in casamentos[:limite]]
+        if len(casamentos) > limite:
+            linhas.append(f"... (mostrando os {limite} primeiros)")
+        inicio = consulta["termos"][plano["inicio"]]
+        origem = inicio["id"] if "id" in inicio else "varredura"
+        return "\n".join(linhas) + f"\n[plano: início em {origem}, custo {plano['custo']}]"
 
     def _respond_with_role(self, intent, ctx: str, estado: EstadoDialogo, tipo_pergunta: str, profile_id: str) -> str:
         """
@@ -423,7 +511,7 @@ class Antonia:
                 resp += self._expandir_com_grafo(normalize(alvo), "explicadora")
                 return resp
 
-            node = self.graph.get_node(normalize(alvo))
+            node = self.graph.snapshot().get_node(normalize(alvo))
             if node:
                 resp = f"{node['id']}: {node['definicao_curta']}"
                 resp += self._expandir_com_grafo(normalize(alvo), "explicadora")
@@ -472,6 +560,9 @@ class Antonia:
         if intent.kind == "listar":
             itens = self.kb.get("listas", {}).get(subject, [])
             return resposta_lista(subject, itens)
+
+        if intent.kind == "relacao":
+            return self._responder_relacao(clean_term(subject), clean_term(intent.payload), profile_id)
         
         if intent.kind == "explicacao":
             # "Fale sobre X", "explique X" - sempre expande (modo explicadora)
@@ -485,7 +576,7 @@ class Antonia:
 
             if not entry:
                 # Tenta buscar no grafo pelo sujeito completo primeiro (termo composto)
-                node = self.graph.get_node(conceito_id)
+                node = self.graph.snapshot().get_node(conceito_id)
                 if node:
                     resp = f"{node['id']}: {node['definicao_curta']}"
                     resp += self._expandir_com_grafo(conceito_id, "explicadora")
@@ -497,7 +588,7 @@ class Antonia:
                     lookup_key = head
                     conceito_id = normalize(head)
                     if not entry:
-                        node = self.graph.get_node(conceito_id)
+                        node = self.graph.snapshot().get_node(conceito_id)
                         if node:
                             resp = f"{node['id']}: {node['definicao_curta']}"
                             resp += self._expandir_com_grafo(conceito_id, "explicadora")
@@ -544,11 +635,7 @@ class Antonia:
             # Exploradora busca causas no grafo
             if estado.papel == "exploradora" and subject:
                 subject_norm = normalize(subject)
-                causas = []
-                for vizinho in self.graph.neighbors(subject_norm):
-                    for e in self.graph.related(subject_norm, vizinho):
-                        if e.get("tipo") == "causa" and e.get("de") == subject_norm:
-                            causas.append(e)
+                causas = self.graph.snapshot().edges(subject_norm, "out", tipo="causa")
                 if causas:
                     resp += "\n\nRelações causais que conheço:\n"
                     for c in causas[:3]:
@@ -579,19 +666,22 @@ class Antonia:
         - explicadora: mostra vizinhos diretos
         - exploradora: navega 2 níveis, mostra padrões
         """
-        node = self.graph.get_node(conceito_id)
+        # Versão imutável: escritas concorrentes (/add, /relacionar) não interferem
+        grafo = self.graph.snapshot()
+        node = grafo.get_node(conceito_id)
         if not node:
             return ""
         
-        vizinhos = self.graph.neighbors(conceito_id)
+        vizinhos = grafo.neighbors(conceito_id)
         if not vizinhos:
             return ""
         
         if papel == "explicadora":
             # Mostra relações diretas (1 nível)
             rels = []
-            for v in vizinhos[:3]:  # Limita a 3 para não sobrecarregar
-                edges = self.graph.related(conceito_id, v)
+            # Os 3 vizinhos mais centrais (PageRank), não a ordem de hash
+            for v in grafo.top_neighbors(conceito_id, k=3, direcao="out"):
+                edges = grafo.related(conceito_id, v)
                 for e in edges:
                     if e['de'] == conceito_id:
                         rels.append(f"- {e['tipo']}: {e['para']}")
@@ -600,24 +690,55 @@ class Antonia:
                 return "\n\nConexões diretas:\n" + "\n".join(rels)
         
         elif papel == "exploradora":
-            # Explora 2 níveis, mostra estrutura
+            # Explora 2 níveis (DFS para agrupar o 2º nível sob o 1º), custo limitado
             rels = []
-            for v in vizinhos[:5]:
-                edges = self.graph.related(conceito_id, v)
-                for e in edges:
-                    if e['de'] == conceito_id:
-                        rels.append(f"- {e['tipo']}: {e['para']}")
-                        
-                        # Segundo nível
-                        vizinhos_2 = self.graph.neighbors(v)
-                        if len(vizinhos_2) > 1:  # Tem mais conexões
-                            rels.append(f"  └─ {e['para']} conecta a {len(vizinhos_2)-1} outros conceitos")
+            passos = grafo.traverse(
+                conceito_id, profundidade=2, direcao="out",
+                fanout=(5, 2), max_nodos=8, estrategia="dfs",
+            )
+            for passo in passos:
+                e = passo["aresta"]
+                prefixo = "-" if passo["profundidade"] == 1 else "  └─"
+                rels.append(f"{prefixo} {e['tipo']}: {e['para']}")
             
             if rels:
-                return "\n\nEstrutura conceitual:\n" + "\n".join(rels[:8])  # Limita output
+                return "\n\nEstrutura conceitual:\n" + "\n".join(rels)
         
         return ""
     
+    def _responder_relacao(self, a: str, b: str, profile_id: str) -> str:
+        """
+        Explica como dois conceitos se conectam usando os caminhos mais
+        fortes do grafo TRQ (produto dos pesos das relações).
+        """
+        a_id, b_id = normalize(a), normalize(b)
+        grafo = self.graph.snapshot()
+        for alvo, alvo_id in ((a, a_id), (b, b_id)):
+            if not grafo.get_node(alvo_id):
+                if profile_id == "trq_duro":
+                    return resposta_nao_encontrei(alvo)
+                return f"Ainda não tenho **{alvo}** no grafo. Para ensinar: /add {alvo} | substantivo | <definicao>"
+
+        caminhos = grafo.paths(a_id, b_id, k=3)
+        if not caminhos:
+            return f"Não encontrei ligação entre **{a}** e **{b}** no grafo."
+
+        linhas = [f"Como **{a}** se conecta a **{b}**:"]
+        for c in caminhos:
+            linhas.append(f"- {self._formatar_caminho(c)} (força {c['peso']:.2f})")
+        return "\n".join(linhas)
+
+    @staticmethod
+    def _formatar_caminho(caminho) -> str:
+        """energia —causa→ movimento ←exemplo— calor"""
+        partes = [caminho["nodos"][0]]
+        for atual, proximo, e in zip(caminho["nodos"], caminho["nodos"][1:], caminho["arestas"]):
+            if e["de"] == atual:
+                partes.append(f"—{e['tipo']}→ {proximo}")
+            else:
+                partes.append(f"←{e['tipo']}— {proximo}")
+        return " ".join(partes)
+
     def _buscar_exemplos(self, subject: str):
         """
         Retorna exemplos associados a um conceito a partir do dicionário ou do grafo TRQ.
@@ -635,12 +756,8 @@ class Antonia:
                 exemplos.append(ex)
         
         # Procura relações do tipo "exemplo" no grafo
-        node = self.graph.get_node(subject_norm)
-        if node:
-            for vizinho in self.graph.neighbors(subject_norm):
-                for e in self.graph.related(subject_norm, vizinho):
-                    if e.get("tipo") == "exemplo" and e.get("de") == subject_norm:
-                        exemplos.append(e.get("para"))
+        for e in self.graph.snapshot().edges(subject_norm, "out", tipo="exemplo"):
+            exemplos.append(e.get("para"))
         
         # Remove duplicados preservando ordem
         vistos = set()
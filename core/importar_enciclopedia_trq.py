@@ -106,6 +106,10 @@ def _coerce_card(raw: Dict[str, Any]) -> Optional[Card]:
     )
 
 
+class _Simulacao(Exception):
+    """Desfaz o lote do grafo no --dry-run."""
+
+
 def _load_kb(kb_path: Path) -> Dict[str, Any]:
     if kb_path.exists():
         try:
@@ -162,127 +166,129 @@ def main() -> int:
     skipped_edges = 0
     invalid_edges = 0
 
-    # Para evitar duplicatas no direct (TRQGraph nao deduplica)
-    existing_edge_keys = {
-        (e.get("de", ""), e.get("para", ""), e.get("tipo", "")) for e in graph.data.get("arestas", [])
-    }
-
-    for card in cards:
-        word_norm = normalize(card.id)
-
-        already = ds.lookup(card.id)
-        if already and not args.force:
-            skipped_words += 1
-        else:
-            # dicionario armazena relacoes como lista de referencias simples (strings)
-            rels = []
-            for r in card.relacoes:
-                if not isinstance(r, dict):
-                    continue
-                p = str(r.get("para") or "").strip()
-                if p:
-                    rels.append(normalize(p))
-            # remove duplicatas preservando ordem
-            seen = set()
-            rels_dedup = []
-            for r in rels:
-                if r not in seen:
-                    seen.add(r)
-                    rels_dedup.append(r)
-            ds.add(card.id, card.classe, card.definicao_curta or "", rels_dedup, save=False)
-            added_words += 1
-
-        # grafo (nodo)
-        ok = graph.add_node(
-            node_id=word_norm,
-            definicao=card.definicao_curta or "",
-            regiao=card.regiao,
-            origem=origin,
-            peso_estabilidade=0.9,
-            peso_confianca=0.9,
-            save=False,
-        )
-        if ok:
-            added_nodes += 1
-        else:
-            skipped_nodes += 1
-
-        if args.store_resumo and kb is not None:
-            resumo = (card.resumo or "").strip()
-            exs = [x.strip() for x in card.exemplos if x.strip()]
-            parts = []
-            if resumo:
-                parts.append(resumo)
-            if exs:
-                parts.append("Exemplos: " + "; ".join(exs[:3]))
-            if parts:
-                note = f"[enciclopedia:{origin}] {word_norm}: " + " | ".join(parts)
-                kb.setdefault("notas", [])
-                if note not in kb["notas"]:
-                    kb["notas"].append(note)
-
-        # relacoes (arestas)
-        if args.edges == "skip":
-            continue
-
-        quarantine_candidates: List[QuarantineCandidate] = []
-        for r in card.relacoes:
-            if not isinstance(r, dict):
-                invalid_edges += 1
-                continue
-            para = str(r.get("para") or "").strip()
-            tipo = str(r.get("tipo") or "").strip().lower()
-            if not para or not tipo:
-                invalid_edges += 1
-                continue
-            if tipo not in TIPOS_VALIDOS:
-                invalid_edges += 1
-                continue
-            peso_raw = r.get("peso", r.get("confianca", 0.8))
-            try:
-                peso = float(peso_raw)
-            except Exception:
-                peso = 0.8
-            peso = max(0.0, min(1.0, peso))
-
-            de_id = str(r.get("de") or word_norm).strip()
-            de_id = normalize(de_id)
-            para_id = normalize(para)
-
-            if args.edges == "quarantine":
-                quarantine_candidates.append(
-                    QuarantineCandidate(
-                        de=de_id,
-                        para=para_id,
-                        tipo=tipo,
-                        confianca=peso,
-                        contexto=card.regiao,
-                        evidencia=(card.resumo or "")[:240],
-                        origem=f"enciclopedia:{origin}",
-                    )
+    # Um único lote: o grafo é gravado uma vez só no fim e, se algo falhar no
+    # meio, volta ao estado anterior em vez de ficar meio importado. No dry
+    # run o lote é desfeito de propósito, depois de contar o que entraria.
+    try:
+        with graph.batch():
+            for card in cards:
+                word_norm = normalize(card.id)
+
+                already = ds.lookup(card.id)
+                if already and not args.force:
+                    skipped_words += 1
+                else:
+                    # dicionario armazena relacoes como lista de referencias simples (strings)
+                    rels = []
+                    for r in card.relacoes:
+                        if not isinstance(r, dict):
+                            continue
+                        p = str(r.get("para") or "").strip()
+                        if p:
+                            rels.append(normalize(p))
+                    # remove duplicatas preservando ordem
+                    seen = set()
+                    rels_dedup = []
+                    for r in rels:
+                        if r not in seen:
+                            seen.add(r)
+                            rels_dedup.append(r)
+                    ds.add(card.id, card.classe, card.definicao_curta or "", rels_dedup, save=False)
+                    added_words += 1
+
+                # grafo (nodo)
+                ok = graph.add_node(
+                    node_id=word_norm,
+                    definicao=card.definicao_curta or "",
+                    regiao=card.regiao,
+                    origem=origin,
+                    peso_estabilidade=0.9,
+                    peso_confianca=0.9,
                 )
-                continue
+                if ok:
+                    added_nodes += 1
+                else:
+                    skipped_nodes += 1
+
+                if args.store_resumo and kb is not None:
+                    resumo = (card.resumo or "").strip()
+                    exs = [x.strip() for x in card.exemplos if x.strip()]
+                    parts = []
+                    if resumo:
+                        parts.append(resumo)
+                    if exs:
+                        parts.append("Exemplos: " + "; ".join(exs[:3]))
+                    if parts:
+                        note = f"[enciclopedia:{origin}] {word_norm}: " + " | ".join(parts)
+                        kb.setdefault("notas", [])
+                        if note not in kb["notas"]:
+                            kb["notas"].append(note)
+
+                # relacoes (arestas)
+                if args.edges == "skip":
+                    continue
 
-            # direct
-            k = (de_id, para_id, tipo)
-            if k in existing_edge_keys:
-                skipped_edges += 1
-                continue
-            if de_id not in graph.data.get("nodos", {}) or para_id not in graph.data.get("nodos", {}):
-                skipped_edges += 1
-                continue
-            if graph.add_edge(de_id, para_id, tipo, peso=peso, origem=f"enciclopedia:{origin}", save=False):
-                existing_edge_keys.add(k)
-                added_edges += 1
-            else:
-                invalid_edges += 1
-
-        if quarantine_candidates:
-            if not args.dry_run:
-                res = upsert_candidates(quarantine_dir, word_norm, quarantine_candidates)
-                queued_edges += int(res.get("_added", 0))
-            else:
-                queued_edges += len(quarantine_candidates)
+                quarantine_candidates: List[QuarantineCandidate] = []
+                for r in card.relacoes:
+                    if not isinstance(r, dict):
+                        invalid_edges += 1
+                        continue
+                    para = str(r.get("para") or "").strip()
+                    tipo = str(r.get("tipo") or "").strip().lower()
+                    if not para or not tipo:
+                        invalid_edges += 1
+                        continue
+                    if tipo not in TIPOS_VALIDOS:
+                        invalid_edges += 1
+                        continue
+                    peso_raw = r.get("peso", r.get("confianca", 0.8))
+                    try:
+                        peso = float(peso_raw)
+                    except Exception:
+                        peso = 0.8
+                    peso = max(0.0, min(1.0, peso))
+
+                    de_id = str(r.get("de") or word_norm).strip()
+                    de_id = normalize(de_id)
+                    para_id = normalize(para)
+
+                    if args.edges == "quarantine":
+                        quarantine_candidates.append(
+                            QuarantineCandidate(
+                                de=de_id,
+                                para=para_id,
+                                tipo=tipo,
+                                confianca=peso,
+                                contexto=card.regiao,
+                                evidencia=(card.resumo or "")[:240],
+                                origem=f"enciclopedia:{origin}",
+                            )
+                        )
+                        continue
+
+                    # direct (TRQGraph deduplica por (de, para, tipo))
+                    if graph.has_edge(de_id, para_id, tipo):
+                        skipped_edges += 1
+                        continue
+                    if de_id not in graph.data.get("nodos", {}) or para_id not in graph.data.get("nodos", {}):
+                        skipped_edges += 1
+                        continue
+                    if graph.add_edge(de_id, para_id, tipo, peso=peso, origem=f"enciclopedia:{origin}"):
+                        added_edges += 1
+                    else:
+                        invalid_edges += 1
+
+                if quarantine_candidates:
+                    if not args.dry_run:
+                        res = upsert_candidates(quarantine_dir, word_norm, quarantine_candidates)
+                        queued_edges += int(res.get("_added", 0))
+                    else:
+                        queued_edges += len(quarantine_candidates)
+
+            if args.dry_run:
+                raise _Simulacao()
+    except _Simulacao:
+        pass
 
     if args.dry_run:
         print("DRY RUN")
@@ -297,7 +303,6 @@ def main() -> int:
         return 0
 
     ds.save()
-    graph.save()
     if args.store_resumo and kb is not None:
         _save_kb(kb_path, kb)
 
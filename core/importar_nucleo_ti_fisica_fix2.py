@@ -28,7 +28,7 @@ if str(_ROOT) not in sys.path:
 import argparse
 import json
 from pathlib import Path
-from typing import Dict, Any, Set, Tuple
+from typing import Dict, Any
 
 def _find_project_data_dir() -> Path:
     # Tenta seguir o padrão do projeto: core/engine.py define DATA_DIR = <repo>/data
@@ -77,68 +77,72 @@ def main() -> int:
     ds = DictionaryStore(str(dict_path))
     g = TRQGraph(str(graph_path))
 
-    # Índice de arestas já existentes para evitar duplicação
-    existing_edges: Set[Tuple[str, str, str]] = set()
-    for e in g.data.get("arestas", []):
-        existing_edges.add((e.get("de",""), e.get("para",""), e.get("tipo","")))
-
     added_words = 0
     skipped_words = 0
     added_nodes = 0
     added_edges = 0
     skipped_edges = 0
 
-    for c in cards:
-        wid = c["id"]
-        word = c.get("word", wid)
-        classe = c.get("classe","substantivo")
-        definicao = c.get("definicao","").strip()
-        regiao = c.get("regiao","geral:humano:1")
-        origem = c.get("origem","nucleo")
-
-        # Dicionário (texto + classe)
-        already = ds.lookup(word)  # lookup normaliza internamente
-        if already and not args.force:
-            skipped_words += 1
-        else:
-            # "relacoes" do dicionário são apenas referências simples (strings)
-            rels = []
-            for r in c.get("relacoes", []):
-                p = r.get("para")
-                if p and p not in rels:
-                    rels.append(p)
-            ds.add(word, classe, definicao, rels)
-            added_words += 1
-
-        # Grafo (estrutura)
-        ok = g.add_node(
-            node_id=wid,
-            definicao=definicao,
-            regiao=regiao,
-            origem=origem,
-            peso_estabilidade=float(c.get("peso_estabilidade", 0.9)),
-            peso_confianca=float(c.get("peso_confianca", 0.95)),
-        )
-        if ok:
-            added_nodes += 1
-
-    for e in edges:
-        key = (e["de"], e["para"], e["tipo"])
-        if key in existing_edges:
-            skipped_edges += 1
-            continue
-
-        ok = g.add_edge(
-            de=e["de"],
-            para=e["para"],
-            tipo=e["tipo"],
-            peso=float(e.get("peso", 0.8)),
-            origem=e.get("origem","nucleo"),
-            bidirecional=False
-        )
-        if ok:
-            existing_edges.add(key)
-            added_edges += 1
+    # Um único lote: grava o grafo uma vez só e desfaz tudo se falhar no meio.
+    # O dicionário acompanha: fica em memória até o lote confirmar e volta à
+    # cópia (rasa: verbetes são trocados, nunca editados) se o lote desfizer.
+    dicionario_antes = dict(ds.data)
+    try:
+        with g.batch():
+            for c in cards:
+                wid = c["id"]
+                word = c.get("word", wid)
+                classe = c.get("classe","substantivo")
+                definicao = c.get("definicao","").strip()
+                regiao = c.get("regiao","geral:humano:1")
+                origem = c.get("origem","nucleo")
+
+                # Dicionário (texto + classe)
+                already = ds.lookup(word)  # lookup normaliza internamente
+                if already and not args.force:
+                    skipped_words += 1
+                else:
+                    # "relacoes" do dicionário são apenas referências simples (strings)
+                    rels = []
+                    for r in c.get("relacoes", []):
+                        p = r.get("para")
+                        if p and p not in rels:
+                            rels.append(p)
+                    ds.add(word, classe, definicao, rels, save=False)
+                    added_words += 1
+
+                # Grafo (estrutura)
+                ok = g.add_node(
+                    node_id=wid,
+                    definicao=definicao,
+                    regiao=regiao,
+                    origem=origem,
+                    peso_estabilidade=float(c.get("peso_estabilidade", 0.9)),
+                    peso_confianca=float(c.get("peso_confianca", 0.95)),
+                )
+                if ok:
+                    added_nodes += 1
+
+            for e in edges:
+                # TRQGraph mantém índice (de, para, tipo): evita duplicação sem varrer arestas
+                if g.has_edge(e["de"], e["para"], e["tipo"]):
+                    skipped_edges += 1
+                    continue
+
+                ok = g.add_edge(
+                    de=e["de"],
+                    para=e["para"],
+                    tipo=e["tipo"],
+                    peso=float(e.get("peso", 0.8)),
+                    origem=e.get("origem","nucleo"),
+                    bidirecional=False
+                )
+                if ok:
+                    added_edges += 1
+    except BaseException:
+        ds.data = dicionario_antes
+        raise
+    ds.save()
 
     print("\n=== Importação concluída ===")
     print(f"Dicionário: {added_words} adicionadas/atualizadas, {skipped_words} puladas")
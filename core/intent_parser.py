@@ -1,3 +1,4 @@
+import re
 from dataclasses import dataclass
 from core.tokenizer import normalize, tokenize
 
@@ -29,6 +30,24 @@ def _strip_continuation_prefix(t: str) -> str:
                 changed = True
     return t
 
+# Perguntas de relação entre dois conceitos (texto já normalizado).
+# subject = primeiro conceito, payload = segundo conceito.
+_ART = r"(?:(?:o|a|os|as|um|uma) )?"
+_RELACAO_PATTERNS = (
+    re.compile(rf"(?:relacao|ligacao|conexao|relacionam|ligam|conectam) entre {_ART}(.+?) e {_ART}(.+)$"),
+    re.compile(rf"^(?:como |de que forma |de que jeito )?{_ART}(.+?) se (?:relaciona|liga|conecta) (?:com|a|ao) {_ART}(.+)$"),
+    re.compile(rf"(?:relacao|ligacao|conexao) (?:de|do|da|dos|das) {_ART}(.+?) com {_ART}(.+)$"),
+)
+
+def _match_relacao(t: str):
+    for pat in _RELACAO_PATTERNS:
+        m = pat.search(t)
+        if m:
+            a, b = m.group(1).strip(), m.group(2).strip()
+            if a and b:
+                return a, b
+    return None
+
 def _strip_leading_articles(t: str) -> str:
     t = (t or "").strip()
     for art in ("o ", "a ", "os ", "as "):
@@ -70,6 +89,11 @@ def parse_intent(user_text: str) -> Intent:
 
     t = _strip_continuation_prefix(t0)
 
+    # Relação entre dois conceitos ("como energia se relaciona com movimento")
+    par = _match_relacao(t)
+    if par:
+        return Intent(kind="relacao", subject=par[0], payload=par[1])
+
     # Perguntas estruturais "onde fica ..." (nao e definicao)
     if t.startswith(("onde ", "aonde ")):
         toks = tokenize(t)
@@ -0,0 +1,169 @@
+# core/json_stream.py
+"""
+Leitura incremental (streaming) de arquivos JSON grandes.
+
+Em vez de json.loads(path.read_text()) — texto inteiro + objeto inteiro na
+memória ao mesmo tempo — o arquivo é lido em blocos e os containers do
+topo são percorridos item a item: cada item (um nó, uma aresta, um verbete)
+é decodificado sozinho pelo scanner do módulo json e entregue ao chamador,
+que o guarda direto na estrutura final. O pico de memória fica perto do
+tamanho final dos dados mais um bloco de leitura.
+
+    for caminho, valor in itens(path, nivel=2):
+        ...  # caminho = ("nodos", "energia") ou ("arestas", 0)
+"""
+import codecs
+import json
+import re
+import sys
+from json import scanner
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Tuple, Union
+
+# progresso(bytes_lidos, bytes_totais)
+Progresso = Callable[[int, int], None]
+
+TAMANHO_BLOCO = 1 << 20
+_NAO_ESPACO = re.compile(r"[^ \t\r\n]")
+
+
+class _Leitor:
+    """Buffer de texto sobre o arquivo, reabastecido em blocos."""
+
+    def __init__(self, fh, total: int, progresso: Optional[Progresso], bloco: int):
+        self.fh = fh
+        self.total = total
+        self.progresso = progresso
+        self.bloco = bloco
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        # Chaves repetidas ("de", "para", "peso"...) compartilham a mesma
+        # string, como faria um json.loads do arquivo inteiro
+        chaves: dict = {}
+        self.scan = scanner.make_scanner(json.JSONDecoder(
+            object_pairs_hook=lambda pares: {chaves.setdefault(k, k): v for k, v in pares}
+        ))
+        self.buf = ""
+        self.pos = 0
+        self.lidos = 0
+        self.fim = False
+
+    def _ler(self) -> bool:
+        if self.fim:
+            return False
+        dados = self.fh.read(self.bloco)
+        self.lidos += len(dados)
+        self.fim = not dados
+        # Descarta o que já foi consumido antes de crescer o buffer
+        self.buf = self.buf[self.pos:] + self.decoder.decode(dados, final=self.fim)
+        self.pos = 0
+        if self.progresso is not None:
+            self.progresso(self.lidos, self.total)
+        return True
+
+    def caractere(self) -> str:
+        """Próximo caractere significativo (sem consumir); "" no fim do arquivo."""
+        while True:
+            m = _NAO_ESPACO.search(self.buf, self.pos)
+            if m is not None:
+                self.pos = m.start()
+                return self.buf[self.pos]
+            self.pos = len(self.buf)
+            if not self._ler():
+                return ""
+
+    def consumir(self, esperado: str):
+        c = self.caractere()
+        if c != esperado:
+            raise ValueError(f"JSON inválido: esperado {esperado!r}, encontrado {c!r} (byte ~{self.lidos})")
+        self.pos += 1
+
+    def valor(self):
+        """Decodifica um valor JSON completo a partir da posição atual."""
+        self.caractere()
+        while True:
+            try:
+                obj, fim = self.scan(self.buf, self.pos)
+            except (StopIteration, json.JSONDecodeError) as exc:
+                if self._ler():
+                    continue
+                if isinstance(exc, StopIteration):
+                    raise json.JSONDecodeError("Valor esperado", self.buf, self.pos) from None
+                raise
+            # Um número perto do fim do buffer pode estar cortado ("1" | "5",
+            # "1." | "5", "2e-" | "3"): o scanner para antes do ".", "e" ou
+            # sinal sem dígito depois. Lê mais e repete.
+            if not self.fim and len(self.buf) - fim < 3 and type(obj) in (int, float):
+                self._ler()
+                continue
+            self.pos = fim
+            return obj
+
+
+def _percorrer(leitor: _Leitor, caminho: Tuple, nivel: int) -> Iterator[Tuple[Tuple, object]]:
+    c = leitor.caractere()
+    if len(caminho) >= nivel or c not in ("{", "["):
+        yield caminho, leitor.valor()
+        return
+    fecha = "}" if c == "{" else "]"
+    leitor.consumir(c)
+    indice = 0
+    if leitor.caractere() == fecha:
+        leitor.consumir(fecha)
+        return
+    while True:
+        if c == "{":
+            chave = leitor.valor()
+            leitor.consumir(":")
+        else:
+            chave = indice
+            indice += 1
+        yield from _percorrer(leitor, caminho + (chave,), nivel)
+        if leitor.caractere() == ",":
+            leitor.consumir(",")
+            continue
+        leitor.consumir(fecha)
+        return
+
+
+def itens(
+    path: Union[str, Path],
+    nivel: int = 1,
+    progresso: Optional[Progresso] = None,
+    bloco: int = TAMANHO_BLOCO,
+) -> Iterator[Tuple[Tuple, object]]:
+    """
+    Percorre um arquivo JSON entregando os valores que estão `nivel`
+    containers abaixo da raiz, um por vez.
+
+    Args:
+        path: Arquivo JSON
+        nivel: Profundidade dos itens (1 = membros do objeto raiz)
+        progresso: Callback (bytes_lidos, bytes_totais) a cada bloco lido
+        bloco: Bytes lidos por vez
+
+    Yields:
+        (caminho, valor) — caminho é a tupla de chaves/índices até o valor.
+        Valores escalares acima de `nivel` saem com caminho mais curto.
+    """
+    path = Path(path)
+    with path.open("rb") as fh:
+        leitor = _Leitor(fh, path.stat().st_size, progresso, bloco)
+        yield from _percorrer(leitor, (), nivel)
+        if leitor.caractere() != "":
+            raise ValueError("JSON inválido: conteúdo após o valor raiz")
+
+
+def progresso_terminal(rotulo: str, passo: float = 0.1) -> Progresso:
+    """
+    Callback de progresso que imprime a cada `passo` (fração) lido, em
+    stderr: a saída padrão fica para o resultado (ex.: o patch de trq_diff).
+    """
+    marca = [0.0]
+
+    def _reportar(lidos: int, total: int):
+        fracao = lidos / total if total else 1.0
+        if fracao >= marca[0] + passo or fracao >= 1.0 > marca[0]:
+            marca[0] = 1.0 if fracao >= 1.0 else fracao
+            print(f"[{rotulo}] {lidos / 1e6:.1f}/{total / 1e6:.1f} MB ({fracao:.0%})", file=sys.stderr)
+
+    return _reportar
@@ -0,0 +1,148 @@
+# core/persistencia.py
+"""
+Persistência adiada do grafo e do dicionário.
+
+Quem muda o estado só marca o alvo como sujo (O(1)) e segue. Um thread em
+segundo plano grava os alvos sujos no máximo a cada `intervalo_ms`, e
+mudanças próximas são coalescidas numa única gravação. Cada alvo grava do
+seu jeito, sempre de forma atômica: arquivo temporário + rename no
+dicionário, append com fsync no journal do grafo. Assim a latência de
+/add não depende do tamanho dos arquivos.
+
+    gravador = GravadorAdiado(intervalo_ms=500)
+    gravador.registrar("dicionario", dict_store.save)
+    gravador.marcar("dicionario")   # depois de cada mudança
+    gravador.fechar()               # grava o que faltar (também no atexit)
+
+Métrica: atraso de durabilidade (`metricas()["atraso_ms"]`), ou seja, há
+quanto tempo existe uma mudança aceita que ainda não está em disco.
+"""
+import atexit
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class GravadorAdiado:
+    """Thread de gravação com debounce; alvos são funções sem argumentos."""
+
+    def __init__(self, intervalo_ms: int = 500, *, gravar_ao_sair: bool = True):
+        self.intervalo_ms = intervalo_ms
+        # False: alvos que só valem enquanto o processo vive (jobs de
+        # recálculo); fechar() apenas para o thread, sem rodada final
+        self.gravar_ao_sair = gravar_ao_sair
+        self._gravar: Dict[str, Callable[[], object]] = {}
+        # alvo -> instante (monotonic) da primeira mudança ainda não gravada
+        self._sujos: Dict[str, float] = {}
+        self._em_voo: Dict[str, float] = {}
+        self._ultima_rodada = 0.0
+        self._cond = threading.Condition()
+        # Uma rodada de gravação por vez (thread de fundo ou descarregar())
+        self._serial = threading.Lock()
+        self._fechado = False
+        self._gravacoes = 0
+        self._erros = 0
+        self._ultimo_erro: Optional[str] = None
+        self._ultimo_atraso = 0.0
+        self._maior_atraso = 0.0
+        self._thread = threading.Thread(target=self._laco, name="persistencia", daemon=True)
+        self._thread.start()
+        if gravar_ao_sair:
+            atexit.register(self.fechar)
+
+    def registrar(self, alvo: str, gravar: Callable[[], object]):
+        """Associa um nome a uma função que grava o alvo inteiro no disco."""
+        with self._cond:
+            self._gravar[alvo] = gravar
+
+    def marcar(self, alvo: str):
+        """
+        Indica que `alvo` mudou. Não grava na hora, a menos que o gravador já
+        tenha sido fechado (e grave ao sair).
+
+        Raises:
+            KeyError: se o alvo não foi registrado
+        """
+        with self._cond:
+            if alvo not in self._gravar:
+                raise KeyError(f"Alvo de persistência não registrado: {alvo!r}")
+            self._sujos.setdefault(alvo, time.monotonic())
+            fechado = self._fechado
+            self._cond.notify()
+        if fechado and self.gravar_ao_sair:
+            self.descarregar()
+
+    def descarregar(self) -> int:
+        """Grava agora, no thread de quem chama, todos os alvos sujos. Retorna quantos."""
+        with self._serial:
+            with self._cond:
+                lote, self._sujos = self._sujos, {}
+                self._em_voo = dict(lote)
+                self._ultima_rodada = time.monotonic()
+            gravados = 0
+            for alvo, desde in lote.items():
+                try:
+                    self._gravar[alvo]()
+                except Exception as exc:
+                    # Continua sujo (com o instante original) e tenta na próxima rodada
+                    with self._cond:
+                        self._sujos[alvo] = min(desde, self._sujos.get(alvo, desde))
+                        self._em_voo.pop(alvo, None)
+                        self._erros += 1
+                        self._ultimo_erro = f"{alvo}: {exc}"
+                    print(f"[persistencia] falha ao gravar {alvo}: {exc}")
+                    continue
+                atraso = time.monotonic() - desde
+                with self._cond:
+                    self._em_voo.pop(alvo, None)
+                    self._gravacoes += 1
+                    self._ultimo_atraso = atraso
+                    self._maior_atraso = max(self._maior_atraso, atraso)
+                gravados += 1
+            return gravados
+
+    def fechar(self):
+        """
+        Para o thread e grava o que estiver pendente (só o thread, se
+        gravar_ao_sair=False). Pode ser chamado mais de uma vez.
+        """
+        with self._cond:
+            self._fechado = True
+            self._cond.notify()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+        if self.gravar_ao_sair:
+            self.descarregar()
+
+    def _laco(self):
+        while True:
+            with self._cond:
+                while not self._sujos and not self._fechado:
+                    self._cond.wait()
+                if self._fechado:
+                    return
+                espera = self._ultima_rodada + self.intervalo_ms / 1000.0 - time.monotonic()
+                if espera > 0:
+                    # Debounce: acumula o que chegar até a janela abrir
+                    self._cond.wait(espera)
+                    continue
+            self.descarregar()
+
+    def metricas(self) -> Dict:
+        """
+        Estado da persistência: atraso_ms (idade da mudança mais antiga ainda
+        não gravada; 0 = tudo em disco), alvos pendentes e contadores.
+        """
+        with self._cond:
+            agora = time.monotonic()
+            pendentes = list(self._sujos.values()) + list(self._em_voo.values())
+            return {
+                "atraso_ms": round((agora - min(pendentes)) * 1000, 1) if pendentes else 0.0,
+                "pendentes": sorted(set(self._sujos) | set(self._em_voo)),
+                "intervalo_ms": self.intervalo_ms,
+                "gravacoes": self._gravacoes,
+                "erros": self._erros,
+                "ultimo_erro": self._ultimo_erro,
+                "ultimo_atraso_ms": round(self._ultimo_atraso * 1000, 1),
+                "maior_atraso_ms": round(self._maior_atraso * 1000, 1),
+            }
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Diff e patch entre dois arquivos do grafo TRQ.
+
+O diff é linear em nós + arestas: os nós são comparados pelo ID (lookup no
+dict) e as arestas pela chave (de, para, tipo), com um dict montado numa
+única passada sobre cada lista. Nada de comparar aresta com aresta.
+
+Formato do patch (JSON):
+  {"versao": 1,
+   "nodos":   {"adicionados": {id: nó}, "removidos": [id], "alterados": {id: nó}},
+   "arestas": {"adicionadas": [aresta], "removidas": [[de, para, tipo]],
+               "alteradas": [aresta]}}
+
+Registros alterados vão completos (estado final). O patch é aplicado com
+TRQGraph.apply_patch, que confere todas as pré-condições antes de mudar
+qualquer coisa — ou entra inteiro, ou o grafo fica como estava.
+
+  python core/trq_diff.py diff data/antigo.json data/trq_graph.json --out patch.json
+  python core/trq_diff.py patch data/trq_graph.json patch.json
+"""
+
+from __future__ import annotations
+
+# --- bootstrap path ---
+import sys
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parents[1]
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+# ----------------------
+
+import argparse
+import json
+from typing import Dict, List, Tuple
+
+from core.json_stream import progresso_terminal
+from core.trq_graph import TRQGraph
+
+VERSAO_PATCH = 1
+
+
+def _por_chave(arestas: List[Dict]) -> Dict[Tuple[str, str, str], Dict]:
+    """Índice (de, para, tipo) -> aresta; a primeira ocorrência vence, como no TRQGraph."""
+    indice: Dict[Tuple[str, str, str], Dict] = {}
+    for e in arestas:
+        indice.setdefault((e["de"], e["para"], e["tipo"]), e)
+    return indice
+
+
+def calcular_diff(a: TRQGraph, b: TRQGraph) -> Dict:
+    """
+    Patch que leva o grafo `a` ao estado do grafo `b`.
+
+    Args:
+        a: Grafo de origem (de preferência um snapshot())
+        b: Grafo de destino
+
+    Returns:
+        Patch no formato descrito no cabeçalho do módulo
+    """
+    nodos_a, nodos_b = a.data["nodos"], b.data["nodos"]
+    arestas_a, arestas_b = _por_chave(a.data["arestas"]), _por_chave(b.data["arestas"])
+
+    return {
+        "versao": VERSAO_PATCH,
+        "nodos": {
+            "adicionados": {nid: n for nid, n in nodos_b.items() if nid not in nodos_a},
+            "removidos": [nid for nid in nodos_a if nid not in nodos_b],
+            "alterados": {
+                nid: n for nid, n in nodos_b.items()
+                if nid in nodos_a and nodos_a[nid] != n
+            },
+        },
+        "arestas": {
+            "adicionadas": [dict(e) for k, e in arestas_b.items() if k not in arestas_a],
+            "removidas": [list(k) for k in arestas_a if k not in arestas_b],
+            "alteradas": [
+                dict(e) for k, e in arestas_b.items()
+                if k in arestas_a and arestas_a[k] != e
+            ],
+        },
+    }
+
+
+def resumo(patch: Dict) -> Dict[str, int]:
+    """Quantidade de mudanças por categoria (mesmas chaves de apply_patch)."""
+    nodos, arestas = patch.get("nodos", {}), patch.get("arestas", {})
+    return {
+        "nodos_adicionados": len(nodos.get("adicionados", {})),
+        "nodos_removidos": len(nodos.get("removidos", [])),
+        "nodos_alterados": len(nodos.get("alterados", {})),
+        "arestas_adicionadas": len(arestas.get("adicionadas", [])),
+        "arestas_removidas": len(arestas.get("removidas", [])),
+        "arestas_alteradas": len(arestas.get("alteradas", [])),
+    }
+
+
+def vazio(patch: Dict) -> bool:
+    return not any(resumo(patch).values())
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    d = sub.add_parser("diff", help="gera o patch que leva ANTIGO a NOVO")
+    d.add_argument("antigo")
+    d.add_argument("novo")
+    d.add_argument("--out", help="arquivo do patch (padrão: stdout)")
+
+    p = sub.add_parser("patch", help="aplica um patch a um grafo, atomicamente")
+    p.add_argument("graph")
+    p.add_argument("patch")
+
+    args = ap.parse_args()
+
+    if args.cmd == "diff":
+        a = TRQGraph(args.antigo, progresso=progresso_terminal("antigo"))
+        b = TRQGraph(args.novo, progresso=progresso_terminal("novo"))
+        patch = calcular_diff(a, b)
+        texto = json.dumps(patch, ensure_ascii=False, indent=2)
+        if args.out:
+            Path(args.out).write_text(texto, encoding="utf-8")
+            print("=== Diff do grafo TRQ ===")
+            for k, v in resumo(patch).items():
+                print(f"{k}: {v}")
+            print(f"patch: {args.out}")
+        else:
+            print(texto)
+        return 0
+
+    patch = json.loads(Path(args.patch).read_text(encoding="utf-8"))
+    if patch.get("versao", VERSAO_PATCH) != VERSAO_PATCH:
+        print(f"[ERRO] versão de patch não suportada: {patch.get('versao')}")
+        return 1
+    g = TRQGraph(args.graph, progresso=progresso_terminal("grafo"))
+    try:
+        res = g.apply_patch(patch)
+    except ValueError as exc:
+        print(f"[ERRO] {exc}")
+        return 1
+    print("=== Patch aplicado ===")
+    for k, v in res.items():
+        print(f"{k}: {v}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,9 +3,145 @@
 Grafo TRQ - Malha explícita de conceitos (NQCs) e relações.
 Conhecimento não é texto, é estrutura.
 """
+import hashlib
+import heapq
 import json
+import math
+import os
+import sys
+import threading
+from collections import deque
+from collections.abc import Mapping, MutableMapping
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Sequence, Set, Tuple, Union
+
+from core import json_stream
+from core.cow import ConjuntoCOW, ListaCOW, MapaCOW, para_json
+from core.json_stream import Progresso
+
+_CAMPOS_ARESTA = ("de", "para", "tipo", "peso", "origem")
+_AUSENTE = object()
+
+
+# Pesos repetidos (0.8, 0.9...) também são compartilhados, até este limite
+_PESOS: Dict[float, float] = {}
+_MAX_PESOS = 4096
+
+
+_MASCARA_64 = (1 << 64) - 1
+
+
+def _impressao(*partes) -> int:
+    """Hash estável de 64 bits (não depende de PYTHONHASHSEED)."""
+    dados = "\x1f".join(map(repr, partes)).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(dados, digest_size=8).digest(), "little")
+
+
+def _internar(valor):
+    if type(valor) is str:
+        return sys.intern(valor)
+    if type(valor) is float and (valor in _PESOS or len(_PESOS) < _MAX_PESOS):
+        return _PESOS.setdefault(valor, valor)
+    return valor
+
+
+class Aresta(MutableMapping):
+    """
+    Registro compacto de aresta: __slots__ no lugar de um dict por aresta.
+    
+    Os textos (ids, tipo, origem) são internados, então as milhares de
+    arestas com tipo "relacionado" ou origem "nucleo_ti_fisica_v1" apontam
+    para a mesma string. Para quem consome, continua sendo o mapeamento
+    {"de", "para", "tipo", "peso", "origem"} de sempre: e["peso"],
+    e.get(...), dict(e), ==, json.dumps(..., default=dict). Campos extras
+    (arquivos de outras versões) ficam num dict à parte, criado sob demanda.
+    """
+
+    __slots__ = _CAMPOS_ARESTA + ("_extra",)
+
+    def __init__(self, registro: Mapping = ()):
+        self._extra = None
+        for chave, valor in (registro.items() if isinstance(registro, Mapping) else registro):
+            self[chave] = valor
+
+    def __getitem__(self, chave):
+        if chave in _CAMPOS_ARESTA:
+            try:
+                return getattr(self, chave)
+            except AttributeError:
+                raise KeyError(chave) from None
+        if self._extra is not None and chave in self._extra:
+            return self._extra[chave]
+        raise KeyError(chave)
+
+    def get(self, chave, padrao=None):
+        if chave in _CAMPOS_ARESTA:
+            return getattr(self, chave, padrao)
+        return self._extra.get(chave, padrao) if self._extra is not None else padrao
+
+    def __setitem__(self, chave, valor):
+        if chave in _CAMPOS_ARESTA:
+            setattr(self, chave, _internar(valor))
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[chave] = valor
+
+    def __delitem__(self, chave):
+        if chave in _CAMPOS_ARESTA:
+            try:
+                delattr(self, chave)
+            except AttributeError:
+                raise KeyError(chave) from None
+        elif self._extra is not None and chave in self._extra:
+            del self._extra[chave]
+        else:
+            raise KeyError(chave)
+
+    def __contains__(self, chave):
+        if chave in _CAMPOS_ARESTA:
+            return hasattr(self, chave)
+        return self._extra is not None and chave in self._extra
+
+    def __iter__(self):
+        for chave in _CAMPOS_ARESTA:
+            if hasattr(self, chave):
+                yield chave
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __eq__(self, outro):
+        if isinstance(outro, Aresta):
+            return self._valores() == outro._valores()
+        return Mapping.__eq__(self, outro)
+
+    __hash__ = None
+
+    def _valores(self) -> Tuple:
+        return tuple(getattr(self, c, _AUSENTE) for c in _CAMPOS_ARESTA) + (self._extra or None,)
+
+    def copy(self) -> "Aresta":
+        nova = Aresta()
+        for chave in _CAMPOS_ARESTA:
+            if hasattr(self, chave):
+                setattr(nova, chave, getattr(self, chave))
+        if self._extra:
+            nova._extra = dict(self._extra)
+        return nova
+
+    def clear(self):
+        for chave in _CAMPOS_ARESTA:
+            if hasattr(self, chave):
+                delattr(self, chave)
+        self._extra = None
+
+    def __repr__(self):
+        return repr(dict(self))
+
 
 class TRQGraph:
     """
@@ -20,26 +156,641 @@ class TRQGraph:
     """
     
     TIPOS_VALIDOS = {"definicao", "parte_de", "causa", "relacionado", "exemplo"}
+    # Tipos inversos são virtuais: "energia composto_por trabalho" é a aresta
+    # "trabalho parte_de energia" lida ao contrário, pelo índice de entrada
+    TIPOS_INVERSOS = {
+        "definido_por": "definicao",
+        "composto_por": "parte_de",
+        "causado_por": "causa",
+        "exemplificado_por": "exemplo",
+    }
+
+    # PageRank: amortecimento e resíduo abaixo do qual um nó não é empurrado
+    _AMORTECIMENTO = 0.85
+    _PR_EPS = 1e-3
+
+    # Operações que podem aparecer no journal (reaplicadas por load())
+    OPS_JOURNAL = {
+        "add_node", "add_edge", "apply_patch", "remove_origin",
+        "remove_node", "remove_edge", "update_node", "update_edge_weight",
+        "fold_inverse_edges",
+    }
     
-    def __init__(self, path: str):
+    def __init__(
+        self,
+        path: str,
+        journal: bool = False,
+        progresso: Optional[Progresso] = None,
+        adiar: bool = False,
+    ):
+        """
+        Args:
+            path: Arquivo JSON do snapshot do grafo
+            journal: Se True, mutações com save=True vão para um log
+                append-only (<path>.wal) em vez de reescrever o snapshot.
+                O log é dobrado no snapshot por compact()/save().
+            progresso: Callback (bytes_lidos, bytes_totais) durante o load
+            adiar: Se True, mutações com save=True só acumulam em memória
+                e vão para o disco em flush() (ver core.persistencia)
+        """
         self.path = Path(path)
+        self.journal = journal
+        self.journal_path = Path(str(self.path) + ".wal")
+        self.relacionados_path = Path(str(self.path) + ".rel")
+        self.adiar = adiar
+        # Registros aceitos e ainda não gravados (só com adiar=True)
+        self._pendentes: List[Dict] = []
         self.data = {"nodos": {}, "arestas": []}
-        self.load()
+        # Índices de adjacência: nó -> tipo -> arestas que saem / chegam nele
+        self._out: Dict[str, Dict[str, List[Dict]]] = {}
+        self._in: Dict[str, Dict[str, List[Dict]]] = {}
+        # Índice de chaves: (de, para, tipo) -> aresta
+        self._chaves: Dict[Tuple[str, str, str], Dict] = {}
+        # Índice de regiões: nome -> campo -> nivel -> ids dos nós
+        self._regioes: Dict[str, Dict[str, Dict[int, Set[str]]]] = {}
+        # Centralidade: grau e grau ponderado incrementais. O PageRank é
+        # mantido por push (ver _propagar_pagerank): _pagerank guarda a
+        # estimativa y de y = 1 + d·A·y (PageRank = y / Σy) e _pr_residuos o
+        # resíduo r = 1 - y + d·A·y de cada nó. Uma mutação só corrige o
+        # resíduo em volta do nó tocado (O(grau)) e enfileira quem passou de
+        # _PR_EPS; o job atualizar_centralidade() empurra a fila.
+        self._grau: Dict[str, int] = {}
+        self._grau_ponderado: Dict[str, float] = {}
+        self._peso_saida: Dict[str, float] = {}
+        self._pagerank: Dict[str, float] = {}
+        self._pagerank_soma = 0.0
+        # Resíduos e fila: só o escritor usa (snapshots não os consultam)
+        self._pr_residuos: Dict[str, float] = {}
+        self._pr_fila: deque = deque()
+        self._pr_na_fila: Set[str] = set()
+        # Conceitos relacionados: nó -> tupla dos top-k por PageRank
+        # personalizado, mantida por recalcular_relacionados() só para os nós
+        # já consultados. Os tocados por mutações desde a última rodada ficam
+        # em _rel_sujos; os consultados fora da tabela, em _rel_pedidos
+        # (compartilhado com os snapshots, que também pedem).
+        self._relacionados: Optional[Dict[str, Tuple[str, ...]]] = None
+        self._rel_sujos: Set[str] = set()
+        self._rel_pedidos: Set[str] = set()
+        self._trava_relacionados = threading.Lock()
+        # Versão do conteúdo: soma (mod 2^64) de um hash estável por nó e por
+        # aresta, mantida nas mutações. A tabela de relacionados gravada em
+        # <path>.rel só é reaproveitada se foi calculada para a versão carregada.
+        self._assinatura = 0
+        self._assinatura_carregada = 0
+        self._rel_gravada: Optional[int] = None
+        # Contadores de stats(), mantidos nas mutações (stats em O(1))
+        self._por_tipo: Dict[str, int] = {}
+        self._por_regiao: Dict[str, int] = {}
+        self._por_origem: Dict[str, int] = {}
+        self._hist_grau: Dict[str, int] = {}
+        # Componentes conexas (union-find) por tipo de relação; None = todos
+        # os tipos. Mantidas nas inserções; union-find não desfaz uniões,
+        # então uma remoção marca a estrutura como suja e o job
+        # atualizar_componentes() a remonta. Tipos consultados em snapshots
+        # que ainda não têm estrutura entram em _tipos_pedidos para o job.
+        self._componentes: Dict[Optional[str], Dict[str, Dict]] = {}
+        self._componentes_sujos: Set[Optional[str]] = set()
+        self._tipos_pedidos: Set[Optional[str]] = {None}
+        # Arestas inseridas enquanto o job remonta (None fora do job)
+        self._uniao_novas: Optional[List[Tuple]] = None
+        # Proveniência: fonte -> {"nodos": ids, "arestas": chaves (de, para, tipo)}.
+        # Origens acumuladas ("a+b") entram em cada fonte. Como as componentes,
+        # é montado na primeira consulta (None até lá) e mantido depois.
+        self._origens: Optional[Dict[str, Dict[str, Set]]] = None
+        # id(aresta) -> posição em data["arestas"], para remover sem varrer a
+        # lista. Montado na primeira remoção; None = ainda não montado.
+        self._posicoes: Optional[Dict[int, int]] = None
+        # Durante a carga em massa o histograma é contado uma vez só, no fim
+        self._carregando = False
+        # Transação aberta por batch(): registros do journal + ações de desfazer
+        self._lote: Optional[Dict[str, List]] = None
+        # Copy-on-write: snapshot() publica uma versão imutável; escritores
+        # copiam (uma vez por versão) os containers que ela compartilha. Os
+        # grandes (nós, arestas, índices) são de core.cow: a cópia é só do
+        # fragmento tocado, então uma escrita não paga O(n) pelo snapshot
+        self._trava = threading.RLock()
+        self._somente_leitura = False
+        self._publicado: Optional["TRQGraph"] = None
+        self._compartilhado = False
+        self._proprios: Dict[int, object] = {}
+        self.load(progresso)
+
+    def load(self, progresso: Optional[Progresso] = None):
+        """
+        Carrega grafo do disco se existir (snapshot + journal pendente).
+        
+        O snapshot é lido em streaming: cada nó/aresta é decodificado e
+        indexado assim que lido, sem manter o texto inteiro na memória.
+        """
+        with self._escrita():
+            self.data = {"nodos": {}, "arestas": []}
+            self._reindexar()
+            if self.path.exists():
+                self._carregando = True
+                try:
+                    self._carregar_snapshot(progresso)
+                except Exception:
+                    self.data = {"nodos": {}, "arestas": []}
+                    self._reindexar()
+                finally:
+                    self._carregando = False
+                self._recontar_histograma()
+            self._fragmentar()
+            self._reiniciar_pagerank()
+            self._replay_journal()
+            # A tabela em disco (se válida) já cobre o que foi carregado
+            self._assinatura_carregada = self._assinatura
+            self._rel_sujos = set()
+
+    def _carregar_snapshot(self, progresso: Optional[Progresso]):
+        nodos, arestas = self.data["nodos"], self.data["arestas"]
+        for caminho, valor in json_stream.itens(self.path, nivel=2, progresso=progresso):
+            secao = caminho[0] if caminho else None
+            if secao == "nodos" and len(caminho) == 2:
+                nid = sys.intern(caminho[1])
+                nodos[nid] = valor
+                self._indexar_nodo(nid, valor)
+            elif secao == "arestas" and len(caminho) == 2:
+                e = Aresta(valor)
+                arestas.append(e)
+                self._indexar_aresta(e)
+            elif len(caminho) == 1:
+                self.data[secao] = valor
+            elif isinstance(caminho[1], int):
+                self.data.setdefault(secao, []).append(valor)
+            else:
+                self.data.setdefault(secao, {})[caminho[1]] = valor
+
+    def snapshot(self) -> "TRQGraph":
+        """
+        Versão imutável do grafo para leitura, sem travas.
+        
+        Retorna um TRQGraph somente leitura com a mesma API de consulta.
+        Enquanto não há escrita nova, todas as chamadas devolvem a mesma
+        versão (custo O(1)). Escritas posteriores não alteram snapshots já
+        entregues: o escritor copia o que ainda é compartilhado e publica a
+        próxima versão trocando um ponteiro.
+        """
+        if self._somente_leitura:
+            return self
+        versao = self._publicado
+        if versao is None:
+            with self._trava:
+                if self._publicado is None:
+                    self._publicado = self._congelar()
+                versao = self._publicado
+        return versao
+
+    def _congelar(self) -> "TRQGraph":
+        """Vista somente leitura do estado atual; tudo passa a ser compartilhado."""
+        versao = object.__new__(type(self))
+        versao.__dict__.update(self.__dict__)
+        versao._somente_leitura = True
+        versao._lote = None
+        versao._publicado = None
+        versao._proprios = {}
+        self._compartilhado = True
+        self._proprios = {}
+        return versao
 
-    def load(self):
-        """Carrega grafo do disco se existir."""
-        if self.path.exists():
+    @contextmanager
+    def _escrita(self):
+        """Serializa escritores; ao final invalida a versão publicada."""
+        if self._somente_leitura:
+            raise TypeError("Snapshot do grafo TRQ é somente leitura.")
+        with self._trava:
             try:
-                self.data = json.loads(self.path.read_text(encoding="utf-8"))
-            except Exception:
-                self.data = {"nodos": {}, "arestas": []}
+                yield
+            finally:
+                # Dentro de batch() os leitores continuam na versão anterior
+                if self._lote is None:
+                    self._publicado = None
+
+    def _proprio(self, obj):
+        """Copy-on-write: devolve uma cópia privada se `obj` é compartilhado."""
+        if not self._compartilhado or id(obj) in self._proprios:
+            return obj
+        novo = obj.copy()
+        self._proprios[id(novo)] = novo
+        return novo
+
+    def _novo(self, obj):
+        """Registra um container criado pelo escritor como privado."""
+        if self._compartilhado:
+            self._proprios[id(obj)] = obj
+        return obj
+
+    def _filho(self, pai: Dict, chave, fabrica=dict):
+        """pai[chave] como container privado (criado se não existir); pai já privado."""
+        atual = pai.get(chave)
+        filho = self._novo(fabrica()) if atual is None else self._proprio(atual)
+        if filho is not atual:
+            pai[chave] = filho
+        return filho
+
+    def _nodos_mutaveis(self) -> Dict[str, Dict]:
+        self.data = self._proprio(self.data)
+        return self._filho(self.data, "nodos", lambda: MapaCOW(ordenado=True))
+
+    def _arestas_mutaveis(self) -> List[Dict]:
+        self.data = self._proprio(self.data)
+        return self._filho(self.data, "arestas", ListaCOW)
+
+    def _replay_journal(self) -> int:
+        """
+        Reaplica o journal sobre o snapshot carregado. Retorna nº de registros.
+        
+        Tolera registros que já estão no snapshot (queda entre o rename do
+        snapshot e o unlink do journal em save()): um registro sem efeito
+        passa se já está refletido no grafo (ver _registro_ja_aplicado).
+        Qualquer outra falha interrompe o load com ValueError indicando o
+        registro, em vez de seguir com um grafo que não é o gravado.
+        """
+        if not self.journal_path.exists():
+            return 0
+        aplicados = 0
+        with self.journal_path.open("r", encoding="utf-8") as fh:
+            for n, linha in enumerate(fh, 1):
+                try:
+                    reg = json.loads(linha)
+                except json.JSONDecodeError:
+                    # Última linha incompleta (queda durante a escrita): descarta
+                    break
+                op, args = reg.get("op"), reg.get("args", {})
+                if op not in self.OPS_JOURNAL:
+                    raise ValueError(f"Journal {self.journal_path}, registro {n}: operação desconhecida {op!r}")
+                try:
+                    efeito = getattr(self, op)(**args, save=False)
+                except Exception as exc:
+                    if op == "apply_patch" and isinstance(exc, ValueError) and self._registro_ja_aplicado(op, args):
+                        continue
+                    raise ValueError(f"Journal {self.journal_path}, registro {n} ({op}): {exc}") from exc
+                if efeito is False:
+                    if not self._registro_ja_aplicado(op, args):
+                        raise ValueError(
+                            f"Journal {self.journal_path}, registro {n} ({op}): "
+                            f"sem efeito e não refletido no grafo ({args})"
+                        )
+                    continue
+                aplicados += 1
+        return aplicados
+
+    def _registro_ja_aplicado(self, op: str, args: Dict) -> bool:
+        """
+        Se um registro do journal que não teve efeito já está no grafo:
+        inserção do que já existe, remoção (ou atualização) de alvo ausente,
+        patch cujo estado final já vale.
+        """
+        if op == "add_node":
+            return args["node_id"] in self.data["nodos"]
+        if op == "add_edge":
+            return self.has_edge(args["de"], args["para"], args["tipo"])
+        if op in ("remove_node", "update_node"):
+            return args["node_id"] not in self.data["nodos"]
+        if op in ("remove_edge", "update_edge_weight"):
+            return not self.has_edge(args["de"], args["para"], args["tipo"])
+        if op == "apply_patch":
+            nodos, arestas = args["patch"].get("nodos", {}), args["patch"].get("arestas", {})
+            existentes = self.data["nodos"]
+            presentes = [self._chave_aresta(e) for e in arestas.get("adicionadas", []) + arestas.get("alteradas", [])]
+            return (
+                all(nid in existentes for nid in {**nodos.get("adicionados", {}), **nodos.get("alterados", {})})
+                and not any(nid in existentes for nid in nodos.get("removidos", []))
+                and all(chave in self._chaves for chave in presentes)
+                and not any(
+                    tuple(k) in self._chaves for k in arestas.get("removidas", []) if tuple(k) not in presentes
+                )
+            )
+        return False
+
+    def _reindexar(self):
+        """Reconstrói os índices de adjacência a partir de data["arestas"]."""
+        self._out = {}
+        self._in = {}
+        self._chaves = {}
+        self._regioes = {}
+        self._grau = {}
+        self._grau_ponderado = {}
+        self._peso_saida = {}
+        self._por_tipo = {}
+        self._por_regiao = {}
+        self._por_origem = {}
+        self._hist_grau = {}
+        self._componentes = {}
+        self._componentes_sujos = set()
+        self._origens = None
+        self._posicoes = None
+        self._relacionados = None
+        self._rel_sujos = set()
+        self._rel_pedidos = set()
+        self._rel_gravada = None
+        self._assinatura = 0
+        carregando, self._carregando = self._carregando, True
+        try:
+            for nid, ndata in self.data.get("nodos", {}).items():
+                self._indexar_nodo(nid, ndata)
+            for e in self.data.get("arestas", []):
+                self._indexar_aresta(e)
+        finally:
+            self._carregando = carregando
+        self._recontar_histograma()
+        self._reiniciar_pagerank()
+
+    def _fragmentar(self):
+        """
+        Passa nós, arestas e índices montados na carga em massa (dicts e
+        listas comuns, mais rápidos de preencher) para os containers de
+        core.cow, em que a cópia de um snapshot é por fragmento.
+        """
+        self.data["nodos"] = MapaCOW(self.data["nodos"], ordenado=True)
+        self.data["arestas"] = ListaCOW(self.data["arestas"])
+        for nome in ("_out", "_in", "_chaves", "_grau", "_grau_ponderado", "_peso_saida"):
+            setattr(self, nome, MapaCOW(getattr(self, nome)))
+
+    def _recontar_histograma(self):
+        hist: Dict[str, int] = {}
+        for nid in self.data["nodos"]:
+            faixa = self._faixa_grau(self._grau.get(nid, 0))
+            hist[faixa] = hist.get(faixa, 0) + 1
+        self._hist_grau = hist
+
+    def _indexar_nodo(self, node_id: str, ndata: Dict):
+        r = self._regiao_do_nodo(ndata)
+        self._regioes = self._proprio(self._regioes)
+        campos = self._filho(self._regioes, r["nome"])
+        self._filho(self._filho(campos, r["campo"]), r["nivel"], ConjuntoCOW).add(node_id)
+        self._contar("_por_regiao", r["nome"], 1)
+        self._contar("_por_origem", ndata.get("origem", ""), 1)
+        self._indexar_origem("nodos", node_id, ndata.get("origem", ""))
+        self._assinar(1, "n", node_id)
+        self._tocar_relacionados(node_id)
+        if not self._carregando:
+            self._contar("_hist_grau", self._faixa_grau(self._grau.get(node_id, 0)), 1)
+            self._pr_entrar(node_id)
+
+    def _assinar(self, sinal: int, *partes):
+        self._assinatura = (self._assinatura + sinal * _impressao(*partes)) & _MASCARA_64
+
+    def _contar(self, contador: str, chave, delta: int):
+        """Ajusta um contador de stats() (copy-on-write); zera = remove a chave."""
+        valores = self._proprio(getattr(self, contador))
+        setattr(self, contador, valores)
+        total = valores.get(chave, 0) + delta
+        if total:
+            valores[chave] = total
+        else:
+            valores.pop(chave, None)
+
+    @staticmethod
+    def _fontes(origem: str) -> List[str]:
+        """Fontes de uma origem acumulada: "humano+nucleo" -> ["humano", "nucleo"]."""
+        return [f for f in (origem or "").split("+") if f]
+
+    def _indice_origens(self) -> Dict[str, Dict[str, Set]]:
+        """Índice de proveniência, montado numa passada na primeira consulta."""
+        if self._origens is None:
+            origens: Dict[str, Dict[str, Set]] = {}
+            for nid, ndata in self.data["nodos"].items():
+                for fonte in self._fontes(ndata.get("origem", "")):
+                    origens.setdefault(fonte, {}).setdefault("nodos", set()).add(nid)
+            for chave, e in self._chaves.items():
+                for fonte in self._fontes(e.get("origem", "")):
+                    origens.setdefault(fonte, {}).setdefault("arestas", set()).add(chave)
+            for grupo in origens.values():
+                for secao, membros in grupo.items():
+                    grupo[secao] = ConjuntoCOW(membros)
+            # Novo dict: snapshots já publicados continuam sem índice
+            self._origens = origens
+        return self._origens
+
+    def _indexar_origem(self, secao: str, chave, origem: str):
+        fontes = self._fontes(origem)
+        if self._origens is None or not fontes:
+            return
+        self._origens = self._proprio(self._origens)
+        for fonte in fontes:
+            self._filho(self._filho(self._origens, fonte), secao, ConjuntoCOW).add(chave)
+
+    def _trocar_origem(self, secao: str, chave, antiga: str, nova: str):
+        saem = set(self._fontes(antiga)) - set(self._fontes(nova))
+        self._desindexar_origem(secao, chave, "+".join(saem))
+        self._indexar_origem(secao, chave, nova)
+
+    def _desindexar_origem(self, secao: str, chave, origem: str):
+        if self._origens is None:
+            return
+        fontes = [f for f in self._fontes(origem) if f in self._origens]
+        if not fontes:
+            return
+        self._origens = self._proprio(self._origens)
+        for fonte in fontes:
+            grupo = self._filho(self._origens, fonte)
+            membros = self._filho(grupo, secao, ConjuntoCOW)
+            membros.discard(chave)
+            if not membros:
+                del grupo[secao]
+            if not grupo:
+                del self._origens[fonte]
+
+    @staticmethod
+    def _faixa_grau(grau: int) -> str:
+        """Faixa do histograma de grau: "0", "1", "2-3", "4-7", "8-15", ..."""
+        if grau <= 1:
+            return str(grau)
+        base = 1 << (grau.bit_length() - 1)
+        return f"{base}-{2 * base - 1}"
+
+    def _mudar_grau(self, node_id: str, delta: int):
+        """Atualiza grau de um nó e, se ele existe, o histograma de grau."""
+        antigo = self._grau.get(node_id, 0)
+        novo = antigo + delta
+        if novo > 0:
+            self._grau[node_id] = novo
+        else:
+            self._grau.pop(node_id, None)
+        if not self._carregando and node_id in self.data["nodos"]:
+            self._contar("_hist_grau", self._faixa_grau(antigo), -1)
+            self._contar("_hist_grau", self._faixa_grau(max(novo, 0)), 1)
+
+    @classmethod
+    def _regiao_do_nodo(cls, ndata: Dict) -> Dict:
+        """Região estruturada de um nó (arquivos antigos guardam regiao como string)."""
+        regiao = ndata.get("regiao") or "geral"
+        if isinstance(regiao, dict):
+            return {
+                "nome": regiao.get("nome", "geral"),
+                "campo": regiao.get("campo", "geral"),
+                "nivel": int(regiao.get("nivel", 1)),
+            }
+        return cls.estruturar_regiao(regiao)
+
+    def _indexar_aresta(self, e: Dict):
+        self._pr_contribuir(e["de"], -1.0)
+        self._out = self._proprio(self._out)
+        self._in = self._proprio(self._in)
+        self._filho(self._filho(self._out, e["de"]), e["tipo"], list).append(e)
+        self._filho(self._filho(self._in, e["para"]), e["tipo"], list).append(e)
+        # Arquivos antigos podem ter duplicatas: a primeira ocorrência é a canônica
+        chave = (e["de"], e["para"], e["tipo"])
+        self._chaves = self._proprio(self._chaves)
+        self._chaves.setdefault(chave, e)
+        self._indexar_origem("arestas", chave, e.get("origem", ""))
+        self._grau = self._proprio(self._grau)
+        self._grau_ponderado = self._proprio(self._grau_ponderado)
+        peso = e.get("peso", 0.0)
+        for nid in (e["de"], e["para"]):
+            self._mudar_grau(nid, 1)
+            self._grau_ponderado[nid] = self._grau_ponderado.get(nid, 0.0) + peso
+        self._peso_saida = self._proprio(self._peso_saida)
+        self._peso_saida[e["de"]] = self._peso_saida.get(e["de"], 0.0) + peso
+        self._contar("_por_tipo", e["tipo"], 1)
+        self._assinar(1, "a", e["de"], e["para"], e["tipo"], peso)
+        self._tocar_relacionados(e.de, e.para)
+        if self._componentes:
+            self._componentes = self._proprio(self._componentes)
+            for tipo in list(self._componentes):
+                if tipo is None or tipo == e.tipo:
+                    uf = self._filho(self._componentes, tipo)
+                    self._unir(self._filho(uf, "pai"), self._filho(uf, "tamanho"), e.de, e.para)
+        if self._uniao_novas is not None:
+            self._uniao_novas.append((e.tipo, e.de, e.para))
+        self._pr_contribuir(e["de"], 1.0)
 
     def save(self):
-        """Persiste grafo no disco."""
-        self.path.write_text(
-            json.dumps(self.data, ensure_ascii=False, indent=2),
-            encoding="utf-8"
-        )
+        """Persiste grafo no disco (snapshot completo; zera o journal)."""
+        if self._somente_leitura:
+            raise TypeError("Snapshot do grafo TRQ é somente leitura.")
+        # Só trava escritores: leitores seguem nas versões publicadas
+        with self._trava:
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(
+                json.dumps(self.data, ensure_ascii=False, indent=2, default=para_json),
+                encoding="utf-8"
+            )
+            os.replace(tmp, self.path)
+            # O snapshot já contém tudo que estava no journal (e o pendente)
+            if self.journal_path.exists():
+                self.journal_path.unlink()
+            self._pendentes = []
+
+    def flush(self) -> int:
+        """
+        Grava as mutações acumuladas com adiar=True: um único append com
+        fsync no journal ou, sem journal, um snapshot completo.
+        
+        Returns:
+            Número de registros gravados
+        """
+        with self._trava:
+            pendentes = self._pendentes
+            if not pendentes:
+                return 0
+            if self.journal:
+                self._anexar_journal(pendentes)
+            else:
+                self.save()
+            self._pendentes = []
+            return len(pendentes)
+
+    def compact(self) -> int:
+        """
+        Dobra o journal num novo snapshot e põe o PageRank em dia (sob a
+        trava de escrita, publicando a versão resultante).
+        
+        Returns:
+            Número de registros que estavam no journal
+        """
+        with self._trava:
+            pendentes = 0
+            if self.journal_path.exists():
+                with self.journal_path.open("rb") as fh:
+                    pendentes = sum(1 for _ in fh)
+            self.save()
+            self.atualizar_centralidade()
+        return pendentes
+
+    def export_csr(self, destino: str) -> Dict:
+        """
+        Exporta um snapshot binário CSR somente leitura (ver core.trq_snapshot).
+        Para servir, abra com TRQSnapshot(destino).
+        """
+        from core.trq_snapshot import exportar_snapshot
+        return exportar_snapshot(self.snapshot(), Path(destino))
+
+    def export_shards(self, destino: str) -> Dict:
+        """
+        Divide o grafo em um arquivo por região (ver core.trq_shards).
+        Para servir com carga sob demanda, abra com TRQGraphShards(destino).
+        """
+        from core.trq_shards import fragmentar
+        return fragmentar(self.snapshot(), Path(destino))
+
+    def _persistir(self, registros: List[Dict]):
+        """Persiste mutações: journal (um append + fsync) ou snapshot completo."""
+        if self.adiar:
+            self._pendentes.extend(registros)
+            return
+        if not self.journal:
+            self.save()
+            return
+        self._anexar_journal(registros)
+
+    def _anexar_journal(self, registros: List[Dict]):
+        linhas = "".join(json.dumps(r, ensure_ascii=False, default=dict) + "\n" for r in registros)
+        with self.journal_path.open("a", encoding="utf-8") as fh:
+            fh.write(linhas)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def _registrar_mutacao(self, op: str, args: Dict, save: bool):
+        """Dentro de batch() acumula o registro; fora, persiste se save=True."""
+        if self._lote is not None:
+            self._lote["registros"].append({"op": op, "args": args})
+        elif save:
+            self._persistir([{"op": op, "args": args}])
+
+    def _ao_desfazer(self, acao: Callable[[], None]):
+        if self._lote is not None:
+            self._lote["desfazer"].append(acao)
+
+    @contextmanager
+    def batch(self):
+        """
+        Transação de mutações em lote.
+        
+            with graph.batch():
+                graph.add_node(...)
+                graph.add_edge(...)
+        
+        As mutações são aplicadas em memória na hora (leituras dentro do lote
+        já as enxergam), mas a persistência é adiada: no commit o grafo é
+        gravado uma única vez (um append no journal ou um snapshot). Se
+        ocorrer exceção, tudo é desfeito em ordem reversa e nada é gravado.
+        Lotes aninhados participam do lote externo. Durante o lote, leitores
+        de snapshot() continuam vendo a versão anterior a ele.
+        """
+        if self._somente_leitura:
+            raise TypeError("Snapshot do grafo TRQ é somente leitura.")
+        with self._trava:
+            if self._lote is not None:
+                yield self
+                return
+            if self._publicado is None:
+                self._publicado = self._congelar()
+            self._lote = {"registros": [], "desfazer": []}
+            try:
+                yield self
+            except BaseException:
+                lote, self._lote = self._lote, None
+                for acao in reversed(lote["desfazer"]):
+                    acao()
+                raise
+            lote, self._lote = self._lote, None
+            try:
+                if lote["registros"]:
+                    self._persistir(lote["registros"])
+            finally:
+                self._publicado = None
 
     def add_node(
         self, 
@@ -66,29 +817,43 @@ class TRQGraph:
         Returns:
             True se nó foi adicionado, False se já existia
         """
-        if node_id not in self.data["nodos"]:
-            # Extrai campo e nível da região (formato: "campo:nome:nivel")
-            partes_regiao = regiao.split(":")
-            regiao_estruturada = {
-                "nome": partes_regiao[0] if len(partes_regiao) >= 1 else regiao,
-                "campo": partes_regiao[1] if len(partes_regiao) >= 2 else "geral",
-                "nivel": int(partes_regiao[2]) if len(partes_regiao) >= 3 else 1
-            }
+        with self._escrita():
+            if node_id not in self.data["nodos"]:
+                node_id = sys.intern(node_id)
+                regiao_estruturada = self.estruturar_regiao(regiao)
             
-            self.data["nodos"][node_id] = {
-                "id": node_id,
-                "definicao_curta": definicao,
-                "peso": {
-                    "estabilidade": min(max(peso_estabilidade, 0.0), 1.0),
-                    "confianca": min(max(peso_confianca, 0.0), 1.0)
-                },
-                "origem": origem,
-                "regiao": regiao_estruturada
-            }
-            if save:
-                self.save()
-            return True
-        return False
+                self._nodos_mutaveis()[node_id] = {
+                    "id": node_id,
+                    "definicao_curta": definicao,
+                    "peso": {
+                        "estabilidade": min(max(peso_estabilidade, 0.0), 1.0),
+                        "confianca": min(max(peso_confianca, 0.0), 1.0)
+                    },
+                    "origem": origem,
+                    "regiao": regiao_estruturada
+                }
+                self._indexar_nodo(node_id, self.data["nodos"][node_id])
+                self._ao_desfazer(lambda: self._remover_nodo_isolado(node_id))
+                self._registrar_mutacao("add_node", {
+                    "node_id": node_id,
+                    "definicao": definicao,
+                    "regiao": regiao,
+                    "origem": origem,
+                    "peso_estabilidade": peso_estabilidade,
+                    "peso_confianca": peso_confianca,
+                }, save)
+                return True
+            return False
+
+    @staticmethod
+    def estruturar_regiao(regiao: str) -> Dict:
+        """Extrai nome, campo e nível da região (formato: "nome:campo:nivel")."""
+        partes_regiao = regiao.split(":")
+        return {
+            "nome": partes_regiao[0] if len(partes_regiao) >= 1 else regiao,
+            "campo": partes_regiao[1] if len(partes_regiao) >= 2 else "geral",
+            "nivel": int(partes_regiao[2]) if len(partes_regiao) >= 3 else 1
+        }
 
     def add_edge(
         self, 
@@ -100,52 +865,638 @@ class TRQGraph:
         bidirecional: bool = False,
         *,
         save: bool = True,
+        upsert: bool = True,
     ) -> bool:
         """
         Adiciona aresta (relação) ao grafo.
         
+        Arestas são únicas por (de, para, tipo). Se a relação já existe, com
+        upsert=True ela é mesclada (maior peso, origens acumuladas); com
+        upsert=False a repetição é ignorada.
+        
         Args:
             de: Nó origem
             para: Nó destino
             tipo: Tipo de relação (deve estar em TIPOS_VALIDOS)
             peso: Densidade informacional/estabilidade (0.0 a 1.0)
             origem: Fonte da relação
-            bidirecional: Se True, cria relação inversa também
+            bidirecional: Se True, cria relação inversa também (só para
+                tipos simétricos; inversos como composto_por são virtuais)
+            upsert: Se True, mescla peso/origem numa aresta já existente
+        
+        Um tipo inverso (ex.: composto_por) é gravado como o tipo direto, com
+        de e para trocados.
         
         Returns:
-            True se aresta foi adicionada, False se tipo inválido
+            True se aresta foi adicionada ou mesclada, False se tipo inválido,
+            nó ausente ou duplicata com upsert=False
         """
-        if tipo not in self.TIPOS_VALIDOS:
-            return False
+        with self._escrita():
+            de, para, tipo = self._relacao_armazenada(de, para, tipo)
+            if tipo not in self.TIPOS_VALIDOS:
+                return False
             
-        # Garante que ambos os nós existem
-        if de not in self.data["nodos"] or para not in self.data["nodos"]:
-            return False
+            # Garante que ambos os nós existem
+            if de not in self.data["nodos"] or para not in self.data["nodos"]:
+                return False
             
-        self.data["arestas"].append({
-            "de": de,
-            "para": para,
-            "tipo": tipo,
-            "peso": min(max(peso, 0.0), 1.0),  # Clamp entre 0 e 1
-            "origem": origem
-        })
-        
-        # Adiciona relação inversa se solicitado
-        if bidirecional:
-            tipo_inverso = self._get_tipo_inverso(tipo)
-            self.data["arestas"].append({
-                "de": para,
-                "para": de,
-                "tipo": tipo_inverso,
-                "peso": min(max(peso, 0.0), 1.0),
+            peso = min(max(peso, 0.0), 1.0)  # Clamp entre 0 e 1
+            if not self._upsert_aresta(de, para, tipo, peso, origem, upsert):
+                return False
+        
+            # Relação inversa: só tipos simétricos viram aresta; os demais
+            # (composto_por, causado_por...) saem do índice de entrada
+            if bidirecional:
+                tipo_inverso = self._get_tipo_inverso(tipo)
+                if tipo_inverso in self.TIPOS_VALIDOS:
+                    self._upsert_aresta(para, de, tipo_inverso, peso, origem, upsert)
+        
+            self._registrar_mutacao("add_edge", {
+                "de": de,
+                "para": para,
+                "tipo": tipo,
+                "peso": peso,
+                "origem": origem,
+                "bidirecional": bidirecional,
+                "upsert": upsert,
+            }, save)
+            return True
+
+    def remove_node(self, node_id: str, *, save: bool = True) -> bool:
+        """
+        Remove um nó e, em cascata, todas as arestas que o tocam.
+        
+        Custa O(grau): as arestas vêm do índice de adjacência e saem da
+        lista sem varredura. Vira um único registro no journal; dentro de
+        batch(), uma falha desfaz a cascata inteira.
+        
+        Returns:
+            True se o nó foi removido, False se não existia
+        """
+        with self._escrita():
+            if node_id not in self.data["nodos"]:
+                return False
+            for e in {id(e): e for e in self.edges(node_id)}.values():
+                self._remover_aresta(e)
+                self._ao_desfazer(lambda e=e: self._reinserir_aresta(e))
+            ndata = self.data["nodos"][node_id]
+            self._remover_nodo_isolado(node_id)
+            self._ao_desfazer(lambda: self._inserir_nodo(node_id, ndata))
+            self._registrar_mutacao("remove_node", {"node_id": node_id}, save)
+            return True
+
+    def remove_edge(
+        self,
+        de: str,
+        para: str,
+        tipo: str,
+        bidirecional: bool = False,
+        *,
+        save: bool = True,
+    ) -> bool:
+        """
+        Remove a relação (de, para, tipo); com bidirecional=True remove
+        também a inversa (como em add_edge), se existir.
+        
+        Returns:
+            True se a relação existia e foi removida, False caso contrário
+        """
+        with self._escrita():
+            de, para, tipo = self._relacao_armazenada(de, para, tipo)
+            e = self._chaves.get((de, para, tipo))
+            if e is None:
+                return False
+            self._remover_aresta(e)
+            self._ao_desfazer(lambda: self._reinserir_aresta(e))
+            if bidirecional:
+                inversa = self._chaves.get(self._relacao_armazenada(para, de, self._get_tipo_inverso(tipo)))
+                if inversa is not None:
+                    self._remover_aresta(inversa)
+                    self._ao_desfazer(lambda: self._reinserir_aresta(inversa))
+            self._registrar_mutacao("remove_edge", {
+                "de": de,
+                "para": para,
+                "tipo": tipo,
+                "bidirecional": bidirecional,
+            }, save)
+            return True
+
+    def update_node(
+        self,
+        node_id: str,
+        definicao: Optional[str] = None,
+        regiao: Optional[str] = None,
+        origem: Optional[str] = None,
+        peso_estabilidade: Optional[float] = None,
+        peso_confianca: Optional[float] = None,
+        *,
+        save: bool = True,
+    ) -> bool:
+        """
+        Altera campos de um nó existente; os argumentos None ficam como
+        estão. Arestas não são tocadas, só os índices do próprio nó
+        (região, origem, contadores).
+        
+        Returns:
+            True se o nó existe, False caso contrário
+        """
+        with self._escrita():
+            antigo = self.data["nodos"].get(node_id)
+            if antigo is None:
+                return False
+            novo = dict(antigo)
+            novo["peso"] = dict(antigo.get("peso", {}))
+            if definicao is not None:
+                novo["definicao_curta"] = definicao
+            if regiao is not None:
+                novo["regiao"] = self.estruturar_regiao(regiao)
+            if origem is not None:
+                novo["origem"] = origem
+            if peso_estabilidade is not None:
+                novo["peso"]["estabilidade"] = min(max(peso_estabilidade, 0.0), 1.0)
+            if peso_confianca is not None:
+                novo["peso"]["confianca"] = min(max(peso_confianca, 0.0), 1.0)
+            self._trocar_nodo(node_id, novo)
+            self._ao_desfazer(lambda: self._trocar_nodo(node_id, antigo))
+            self._registrar_mutacao("update_node", {
+                "node_id": node_id,
+                **{
+                    k: v for k, v in (
+                        ("definicao", definicao),
+                        ("regiao", regiao),
+                        ("origem", origem),
+                        ("peso_estabilidade", peso_estabilidade),
+                        ("peso_confianca", peso_confianca),
+                    ) if v is not None
+                },
+            }, save)
+            return True
+
+    def update_edge_weight(
+        self, de: str, para: str, tipo: str, peso: float, *, save: bool = True
+    ) -> bool:
+        """
+        Troca o peso da relação (de, para, tipo), sem a regra de "maior
+        peso vence" do upsert. Grau ponderado acompanha na hora.
+        
+        Returns:
+            True se a relação existe, False caso contrário
+        """
+        with self._escrita():
+            de, para, tipo = self._relacao_armazenada(de, para, tipo)
+            e = self._chaves.get((de, para, tipo))
+            if e is None:
+                return False
+            peso = min(max(peso, 0.0), 1.0)
+            e = self._aresta_propria(e)
+            antigo_peso, origem = e.get("peso", 0.0), e.get("origem", "")
+            self._ajustar_peso(e, peso)
+            self._ao_desfazer(lambda: self._restaurar_aresta(e, antigo_peso, origem))
+            self._registrar_mutacao("update_edge_weight", {
+                "de": de,
+                "para": para,
+                "tipo": tipo,
+                "peso": peso,
+            }, save)
+            return True
+
+    def query(self, padrao: str, limite: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Casamentos de um padrão como "X -causa-> ? -parte_de-> energia"
+        (ver core.trq_query), gerados sob demanda sobre um snapshot.
+        
+        Raises:
+            ValueError: se o padrão não segue a gramática
+        """
+        from core.trq_query import consultar
+        return consultar(self.snapshot(), padrao, limite)
+
+    def diff(self, outro: "TRQGraph") -> Dict:
+        """Patch que transforma este grafo em `outro` (ver core.trq_diff)."""
+        from core.trq_diff import calcular_diff
+        return calcular_diff(self.snapshot(), outro.snapshot())
+
+    def apply_patch(self, patch: Dict, *, save: bool = True) -> Dict:
+        """
+        Aplica um patch de core.trq_diff de forma atômica.
+        
+        Todas as pré-condições são conferidas antes de mudar qualquer coisa
+        (nó a remover existe, aresta a adicionar ainda não existe...); se
+        alguma falhar, levanta ValueError e o grafo fica intacto. O patch
+        vai inteiro para o journal como um único registro.
+        
+        Returns:
+            Contagem de mudanças aplicadas por categoria
+        """
+        with self._trava:
+            externo = self._lote is not None
+            with self.batch():
+                conflitos = self._conflitos_patch(patch)
+                if conflitos:
+                    raise ValueError("Patch não se aplica a este grafo: " + "; ".join(conflitos[:5]))
+                nodos, arestas = patch.get("nodos", {}), patch.get("arestas", {})
+                for de, para, tipo in arestas.get("removidas", []):
+                    e = self._chaves[(de, para, tipo)]
+                    self._remover_aresta(e)
+                    self._ao_desfazer(lambda e=e: self._reinserir_aresta(e))
+                for nid in nodos.get("removidos", []):
+                    antigo = self.data["nodos"][nid]
+                    self._remover_nodo_isolado(nid)
+                    self._ao_desfazer(lambda nid=nid, antigo=antigo: self._inserir_nodo(nid, antigo))
+                for nid, ndata in nodos.get("adicionados", {}).items():
+                    self._inserir_nodo(nid, ndata)
+                    self._ao_desfazer(lambda nid=nid: self._remover_nodo_isolado(nid))
+                for nid, ndata in nodos.get("alterados", {}).items():
+                    antigo = self.data["nodos"][nid]
+                    self._trocar_nodo(nid, ndata)
+                    self._ao_desfazer(lambda nid=nid, antigo=antigo: self._trocar_nodo(nid, antigo))
+                for e in arestas.get("adicionadas", []):
+                    nova = Aresta(e)
+                    self._append_aresta(nova)
+                    self._ao_desfazer(lambda nova=nova: self._remover_aresta(nova))
+                for e in arestas.get("alteradas", []):
+                    chave = self._chave_aresta(e)
+                    antigo = dict(self._chaves[chave])
+                    self._regravar_aresta(chave, dict(e))
+                    self._ao_desfazer(lambda chave=chave, antigo=antigo: self._regravar_aresta(chave, antigo))
+                if save or externo:
+                    self._registrar_mutacao("apply_patch", {"patch": patch}, True)
+        from core.trq_diff import resumo
+        return resumo(patch)
+
+    def _conflitos_patch(self, patch: Dict) -> List[str]:
+        """Pré-condições de apply_patch que este grafo não satisfaz."""
+        nodos, arestas = patch.get("nodos", {}), patch.get("arestas", {})
+        existentes = self.data["nodos"]
+        conflitos = [f"nó '{n}' já existe" for n in nodos.get("adicionados", {}) if n in existentes]
+        conflitos += [
+            f"nó '{n}' não existe"
+            for n in list(nodos.get("removidos", [])) + list(nodos.get("alterados", {}))
+            if n not in existentes
+        ]
+        removidas = {tuple(k) for k in arestas.get("removidas", [])}
+        conflitos += [f"aresta {k} não existe" for k in removidas if k not in self._chaves]
+        conflitos += [
+            f"aresta {self._chave_aresta(e)} não existe"
+            for e in arestas.get("alteradas", []) if self._chave_aresta(e) not in self._chaves
+        ]
+        conflitos += [
+            f"aresta {self._chave_aresta(e)} já existe"
+            for e in arestas.get("adicionadas", [])
+            if self._chave_aresta(e) in self._chaves and self._chave_aresta(e) not in removidas
+        ]
+        # Nenhuma aresta pode ficar apontando para um nó ausente
+        saem = set(nodos.get("removidos", []))
+        for nid in saem:
+            for e in self.edges(nid):
+                if self._chave_aresta(e) not in removidas:
+                    conflitos.append(f"nó '{nid}' ainda tem a aresta {self._chave_aresta(e)}")
+        entram = nodos.get("adicionados", {})
+        for e in arestas.get("adicionadas", []):
+            for nid in (e["de"], e["para"]):
+                if nid not in entram and (nid not in existentes or nid in saem):
+                    conflitos.append(f"aresta {self._chave_aresta(e)} aponta para nó ausente '{nid}'")
+        return conflitos
+
+    def _inserir_nodo(self, node_id: str, ndata: Dict):
+        node_id = sys.intern(node_id)
+        self._nodos_mutaveis()[node_id] = ndata
+        self._indexar_nodo(node_id, ndata)
+
+    def _trocar_nodo(self, node_id: str, ndata: Dict):
+        """Troca os dados de um nó que continua no grafo (arestas e PageRank intactos)."""
+        y, r = self._pagerank.get(node_id), self._pr_residuos.get(node_id)
+        self._remover_nodo_isolado(node_id)
+        self._inserir_nodo(node_id, ndata)
+        if y is not None:
+            # A estrutura não mudou: devolve a estimativa e o resíduo de antes
+            self._pr_sair(node_id)
+            self._pr_fixar(node_id, y)
+            self._pr_contribuir(node_id, 1.0)
+            self._pr_residuo(node_id, r or 0.0)
+
+    def _regravar_aresta(self, chave: Tuple[str, str, str], registro: Dict):
+        """Troca o conteúdo da aresta `chave` por `registro` (mesmos de/para/tipo)."""
+        e = self._aresta_propria(self._chaves[chave])
+        antiga = e.get("origem", "")
+        self._ajustar_peso(e, registro.get("peso", 0.0))
+        e.clear()
+        e.update(registro)
+        self._trocar_origem("arestas", chave, antiga, e.get("origem", ""))
+
+    def origins(self) -> Dict[str, Dict[str, int]]:
+        """Fonte -> {"nodos": n, "arestas": m} pelo índice de proveniência."""
+        return {
+            fonte: {"nodos": len(grupo.get("nodos", ())), "arestas": len(grupo.get("arestas", ()))}
+            for fonte, grupo in sorted(self._indice_origens().items())
+        }
+
+    def remove_origin(self, origem: str, *, save: bool = True) -> Dict[str, int]:
+        """
+        Desfaz tudo que veio de uma fonte (ex.: "enciclopedia:cards.json").
+        
+        Usa o índice de proveniência: o trabalho nos índices é O(k) no que a
+        fonte trouxe; a lista de arestas é compactada numa única passada. Registros com origem acumulada ("a+b") só
+        perdem a fonte removida e continuam no grafo. Nós removidos levam
+        junto as arestas que ainda os tocam, de qualquer origem. Tudo
+        acontece num único lote: uma gravação (ou um registro no journal)
+        e nada muda se algo falhar no meio.
+        
+        Returns:
+            Contagem: nodos_removidos, nodos_alterados, arestas_removidas,
+            arestas_alteradas, arestas_orfas (de outras origens, presas a
+            nós removidos)
+        """
+        res = dict.fromkeys(
+            ("nodos_removidos", "nodos_alterados", "arestas_removidas", "arestas_alteradas", "arestas_orfas"), 0
+        )
+        removidas: Dict[int, Dict] = {}
+        trocadas: Dict[int, Dict] = {}
+
+        def remover(e: Dict):
+            self._remover_aresta(e, da_lista=False)
+            self._ao_desfazer(lambda: self._indexar_aresta(e))
+            removidas[id(e)] = e
+
+        with self._trava:
+            externo = self._lote is not None
+            with self.batch():
+                grupo = self._indice_origens().get(origem, {})
+                for chave in list(grupo.get("arestas", ())):
+                    e = self._chaves.get(chave)
+                    # Duplicatas antigas da mesma chave são promovidas uma a uma
+                    while e is not None and origem in self._fontes(e.get("origem", "")):
+                        restantes = [f for f in self._fontes(e.get("origem", "")) if f != origem]
+                        if restantes:
+                            antigo = dict(e)
+                            # Cópia privada (se compartilhada) só nos índices; a lista vai no fim
+                            nova = self._aresta_propria(e, da_lista=False)
+                            if nova is not e:
+                                trocadas[id(e)] = nova
+                                self._ao_desfazer(lambda e=e, nova=nova: self._trocar_nos_indices(nova, e))
+                            self._regravar_aresta(chave, dict(e, origem="+".join(restantes)))
+                            self._ao_desfazer(lambda chave=chave, antigo=antigo: self._regravar_aresta(chave, antigo))
+                            res["arestas_alteradas"] += 1
+                            break
+                        remover(e)
+                        res["arestas_removidas"] += 1
+                        e = self._chaves.get(chave)
+                for nid in list(grupo.get("nodos", ())):
+                    ndata = self.data["nodos"].get(nid)
+                    if ndata is None or origem not in self._fontes(ndata.get("origem", "")):
+                        continue
+                    restantes = [f for f in self._fontes(ndata.get("origem", "")) if f != origem]
+                    if restantes:
+                        self._trocar_nodo(nid, dict(ndata, origem="+".join(restantes)))
+                        self._ao_desfazer(lambda nid=nid, ndata=ndata: self._trocar_nodo(nid, ndata))
+                        res["nodos_alterados"] += 1
+                        continue
+                    for e in {id(e): e for e in self.edges(nid)}.values():
+                        remover(e)
+                        res["arestas_orfas"] += 1
+                    self._remover_nodo_isolado(nid)
+                    self._ao_desfazer(lambda nid=nid, ndata=ndata: self._inserir_nodo(nid, ndata))
+                    res["nodos_removidos"] += 1
+                if removidas or trocadas:
+                    # Os índices já mudaram aresta a aresta; a lista é refeita numa passada
+                    antiga = self.data["arestas"]
+                    self._trocar_lista_arestas(self._novo(ListaCOW(
+                        e for e in (trocadas.get(id(e), e) for e in antiga) if id(e) not in removidas
+                    )))
+                    self._ao_desfazer(lambda: self._trocar_lista_arestas(antiga))
+                if save or externo:
+                    self._registrar_mutacao("remove_origin", {"origem": origem}, True)
+        return res
+
+    def _trocar_lista_arestas(self, arestas: List[Dict]):
+        self.data = self._proprio(self.data)
+        self.data["arestas"] = arestas
+        self._posicoes = None
+
+    def has_edge(self, de: str, para: str, tipo: str) -> bool:
+        """Indica se a relação (de, para, tipo) já existe no grafo (tipos inversos inclusos)."""
+        return self._relacao_armazenada(de, para, tipo) in self._chaves
+
+    def _upsert_aresta(
+        self, de: str, para: str, tipo: str, peso: float, origem: str, upsert: bool
+    ) -> bool:
+        existente = self._chaves.get((de, para, tipo))
+        if existente is None:
+            e = Aresta({
+                "de": de,
+                "para": para,
+                "tipo": tipo,
+                "peso": peso,
                 "origem": origem
             })
-        
-        if save:
-            self.save()
+            self._append_aresta(e)
+            self._ao_desfazer(lambda: self._remover_aresta(e))
+            return True
+        if not upsert:
+            return False
+        existente = self._aresta_propria(existente)
+        antigo_peso, antiga_origem = existente.get("peso", 0.0), existente.get("origem", "")
+        self._ao_desfazer(lambda: self._restaurar_aresta(existente, antigo_peso, antiga_origem))
+        self._ajustar_peso(existente, max(antigo_peso, peso))
+        existente["origem"] = self._mesclar_origem(antiga_origem, origem)
+        self._indexar_origem("arestas", self._chave_aresta(existente), existente["origem"])
         return True
-    
-    def _get_tipo_inverso(self, tipo: str) -> str:
+
+    def _aresta_propria(self, e: Dict, da_lista: bool = True) -> Dict:
+        """
+        Copy-on-write de um registro de aresta: se ele pertence a um snapshot,
+        troca-o por uma cópia em data e em todos os índices. Com
+        da_lista=False, data["arestas"] fica a cargo de quem chama.
+        """
+        nova = self._proprio(e)
+        if nova is e:
+            return e
+        if da_lista:
+            lista, posicoes = self._arestas_mutaveis(), self._posicoes_mutaveis()
+            i = posicoes.pop(id(e))
+            lista[i] = nova
+            posicoes[id(nova)] = i
+        self._trocar_nos_indices(e, nova)
+        return nova
+
+    def _trocar_nos_indices(self, antigo: Dict, novo: Dict):
+        """Troca o registro `antigo` por `novo` em _out, _in e _chaves."""
+        for indice, nid in (("_out", antigo["de"]), ("_in", antigo["para"])):
+            setattr(self, indice, self._proprio(getattr(self, indice)))
+            lista = self._filho(self._filho(getattr(self, indice), nid), antigo["tipo"], list)
+            self._substituir(lista, antigo, novo)
+        chave = self._chave_aresta(antigo)
+        if self._chaves.get(chave) is antigo:
+            self._chaves = self._proprio(self._chaves)
+            self._chaves[chave] = novo
+
+    @staticmethod
+    def _substituir(lista: List[Dict], antigo: Dict, novo: Dict):
+        """Troca `antigo` (por identidade) por `novo`; busca a partir do fim."""
+        for i in range(len(lista) - 1, -1, -1):
+            if lista[i] is antigo:
+                lista[i] = novo
+                return
+
+    def _ajustar_peso(self, e: Dict, peso: float):
+        """Troca o peso de uma aresta (já privada) mantendo o grau ponderado em dia."""
+        antigo = e.get("peso", 0.0)
+        delta = peso - antigo
+        if not delta:
+            e["peso"] = peso
+            return
+        self._pr_contribuir(e["de"], -1.0)
+        e["peso"] = peso
+        self._assinar(-1, "a", e["de"], e["para"], e["tipo"], antigo)
+        self._assinar(1, "a", e["de"], e["para"], e["tipo"], peso)
+        self._grau_ponderado = self._proprio(self._grau_ponderado)
+        for nid in (e["de"], e["para"]):
+            self._grau_ponderado[nid] = self._grau_ponderado.get(nid, 0.0) + delta
+        self._peso_saida = self._proprio(self._peso_saida)
+        self._peso_saida[e["de"]] = self._peso_saida.get(e["de"], 0.0) + delta
+        self._tocar_relacionados(e["de"], e["para"])
+        self._pr_contribuir(e["de"], 1.0)
+
+    def _restaurar_aresta(self, e: Dict, peso: float, origem: str):
+        e = self._aresta_propria(e)
+        self._ajustar_peso(e, peso)
+        antiga, e["origem"] = e.get("origem", ""), origem
+        self._trocar_origem("arestas", self._chave_aresta(e), antiga, origem)
+
+    @staticmethod
+    def _descartar(lista: List[Dict], item: Dict):
+        """Remove `item` (por identidade) de uma lista; busca a partir do fim."""
+        for i in range(len(lista) - 1, -1, -1):
+            if lista[i] is item:
+                del lista[i]
+                return
+
+    def _remover_aresta(self, e: Dict, da_lista: bool = True):
+        """
+        Remove uma aresta de data e de todos os índices. Com da_lista=False
+        a lista data["arestas"] fica a cargo de quem chama (remoção em massa
+        compacta a lista uma vez só, em vez de uma busca por aresta).
+        """
+        self._pr_contribuir(e["de"], -1.0)
+        if da_lista:
+            self._retirar_da_lista(e)
+        for nome, nid in (("_out", e["de"]), ("_in", e["para"])):
+            indice = self._proprio(getattr(self, nome))
+            setattr(self, nome, indice)
+            por_tipo = self._filho(indice, nid)
+            lista = self._filho(por_tipo, e["tipo"], list)
+            self._descartar(lista, e)
+            if not lista:
+                por_tipo.pop(e["tipo"], None)
+            if not por_tipo:
+                indice.pop(nid, None)
+        chave = (e["de"], e["para"], e["tipo"])
+        if self._chaves.get(chave) is e:
+            self._chaves = self._proprio(self._chaves)
+            del self._chaves[chave]
+            # Duplicata antiga com a mesma chave passa a ser a canônica
+            for outra in self._out.get(e["de"], {}).get(e["tipo"], []):
+                if outra["para"] == e["para"]:
+                    self._chaves[chave] = outra
+                    self._trocar_origem("arestas", chave, e.get("origem", ""), outra.get("origem", ""))
+                    break
+        self._grau = self._proprio(self._grau)
+        self._grau_ponderado = self._proprio(self._grau_ponderado)
+        peso = e.get("peso", 0.0)
+        for nid in (e["de"], e["para"]):
+            self._mudar_grau(nid, -1)
+            self._grau_ponderado[nid] = self._grau_ponderado.get(nid, 0.0) - peso
+            if nid not in self._grau:
+                self._grau_ponderado.pop(nid, None)
+        self._peso_saida = self._proprio(self._peso_saida)
+        if e["de"] in self._out:
+            self._peso_saida[e["de"]] = self._peso_saida.get(e["de"], 0.0) - peso
+        else:
+            self._peso_saida.pop(e["de"], None)
+        self._contar("_por_tipo", e["tipo"], -1)
+        self._assinar(-1, "a", e["de"], e["para"], e["tipo"], peso)
+        self._tocar_relacionados(e["de"], e["para"])
+        # Union-find não desfaz uniões: a estrutura fica suja até o job remontá-la
+        self._componentes_sujos = self._componentes_sujos | {
+            t for t in set(self._componentes) | self._tipos_pedidos if t is None or t == e["tipo"]
+        }
+        if chave not in self._chaves:
+            self._desindexar_origem("arestas", chave, e.get("origem", ""))
+        self._pr_contribuir(e["de"], 1.0)
+
+    def _remover_nodo_isolado(self, node_id: str):
+        """Remove um nó de data e do índice de regiões (arestas à parte)."""
+        if node_id not in self.data["nodos"]:
+            return
+        self._pr_sair(node_id)
+        ndata = self._nodos_mutaveis().pop(node_id)
+        r = self._regiao_do_nodo(ndata)
+        self._contar("_por_regiao", r["nome"], -1)
+        self._contar("_por_origem", ndata.get("origem", ""), -1)
+        self._desindexar_origem("nodos", node_id, ndata.get("origem", ""))
+        self._assinar(-1, "n", node_id)
+        self._tocar_relacionados(node_id)
+        self._contar("_hist_grau", self._faixa_grau(self._grau.get(node_id, 0)), -1)
+        self._regioes = self._proprio(self._regioes)
+        campos = self._filho(self._regioes, r["nome"])
+        niveis = self._filho(campos, r["campo"])
+        ids = self._filho(niveis, r["nivel"], ConjuntoCOW)
+        ids.discard(node_id)
+        if not ids:
+            del niveis[r["nivel"]]
+        if not niveis:
+            del campos[r["campo"]]
+        if not campos:
+            del self._regioes[r["nome"]]
+
+    @staticmethod
+    def _mesclar_origem(atual: str, nova: str) -> str:
+        """Acumula origens distintas no formato "a+b" (sem repetir)."""
+        if not atual:
+            return nova
+        if not nova or nova in atual.split("+"):
+            return atual
+        return f"{atual}+{nova}"
+
+    def _append_aresta(self, e: Dict):
+        self._arestas_mutaveis().append(self._novo(e))
+        self._posicionar_e_indexar(e)
+
+    def _reinserir_aresta(self, e: Dict):
+        """
+        Desfazer de uma remoção: devolve o mesmo registro (os desfazer
+        anteriores do lote o procuram por identidade) sem marcá-lo como
+        privado — se ele pertence a um snapshot, continua compartilhado.
+        """
+        self._arestas_mutaveis().append(e)
+        self._posicionar_e_indexar(e)
+
+    def _posicionar_e_indexar(self, e: Dict):
+        lista = self.data["arestas"]
+        if self._posicoes is not None:
+            self._posicoes_mutaveis()[id(e)] = len(lista) - 1
+        self._indexar_aresta(e)
+
+    def _posicoes_mutaveis(self) -> Dict[int, int]:
+        if self._posicoes is None:
+            self._posicoes = self._novo(MapaCOW((id(e), i) for i, e in enumerate(self.data["arestas"])))
+        self._posicoes = self._proprio(self._posicoes)
+        return self._posicoes
+
+    def _retirar_da_lista(self, e: Dict):
+        """
+        Tira `e` de data["arestas"] em O(1): a última aresta ocupa o lugar
+        dela. A ordem da lista não é significativa (as chaves são).
+        """
+        lista, posicoes = self._arestas_mutaveis(), self._posicoes_mutaveis()
+        i = posicoes.pop(id(e))
+        ultima = lista.pop()
+        if ultima is not e:
+            lista[i] = ultima
+            posicoes[id(ultima)] = i
+
+    @staticmethod
+    def _get_tipo_inverso(tipo: str) -> str:
         """Retorna o tipo inverso de uma relação."""
         inversos = {
             "definicao": "definido_por",
@@ -160,10 +1511,113 @@ class TRQGraph:
         }
         return inversos.get(tipo, tipo)
 
+    @classmethod
+    def _relacao_armazenada(cls, de: str, para: str, tipo: str) -> Tuple[str, str, str]:
+        """(de, para, tipo) como fica gravado: tipo inverso vira o direto, ao contrário."""
+        direto = cls.TIPOS_INVERSOS.get(tipo)
+        return (para, de, direto) if direto else (de, para, tipo)
+
+    @classmethod
+    def _vista_inversa(cls, e: Dict) -> Aresta:
+        """Aresta gravada lida no sentido inverso (registro avulso, fora do grafo)."""
+        vista = Aresta(e)
+        vista["de"], vista["para"], vista["tipo"] = e["para"], e["de"], cls._get_tipo_inverso(e["tipo"])
+        return vista
+
+    def fold_inverse_edges(self, *, save: bool = True) -> Dict[str, int]:
+        """
+        Migração: dobra arestas inversas gravadas (composto_por, causado_por...)
+        de volta na aresta direta, agora que os inversos são virtuais.
+        
+        Se a aresta direta já existe, fica o maior peso e as origens são
+        acumuladas; senão ela é criada com peso e origem da inversa. Tudo
+        num único lote.
+        
+        Returns:
+            {"dobradas": inversas removidas, "mescladas": quantas já tinham a direta}
+        """
+        res = {"dobradas": 0, "mescladas": 0}
+        with self._trava:
+            if not any(tipo in self._por_tipo for tipo in self.TIPOS_INVERSOS):
+                return res
+            externo = self._lote is not None
+            with self.batch():
+                inversas = [e for e in self.data["arestas"] if e.tipo in self.TIPOS_INVERSOS]
+                for e in inversas:
+                    chave = self._relacao_armazenada(e.de, e.para, e.tipo)
+                    direta = self._chaves.get(chave)
+                    if direta is not None:
+                        antigo = dict(direta)
+                        self._regravar_aresta(chave, dict(
+                            direta,
+                            peso=max(direta.get("peso", 0.0), e.get("peso", 0.0)),
+                            origem=self._mesclar_origem(direta.get("origem", ""), e.get("origem", "")),
+                        ))
+                        self._ao_desfazer(lambda chave=chave, antigo=antigo: self._regravar_aresta(chave, antigo))
+                        res["mescladas"] += 1
+                    else:
+                        nova = Aresta(dict(e, de=chave[0], para=chave[1], tipo=chave[2]))
+                        self._append_aresta(nova)
+                        self._ao_desfazer(lambda nova=nova: self._remover_aresta(nova))
+                    self._remover_aresta(e)
+                    self._ao_desfazer(lambda e=e: self._reinserir_aresta(e))
+                    res["dobradas"] += 1
+                if save or externo:
+                    self._registrar_mutacao("fold_inverse_edges", {}, True)
+        return res
+
     def get_node(self, node_id: str) -> Optional[Dict]:
         """Retorna nó pelo ID ou None se não existir."""
         return self.data["nodos"].get(node_id)
 
+    def edges(
+        self,
+        node_id: str,
+        direcao: Optional[str] = None,
+        tipo: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Retorna as arestas de um nó, consultando o índice (nó, direção, tipo).
+        
+        Args:
+            node_id: ID do nó
+            direcao: "out" (arestas que saem), "in" (que chegam) ou None (ambas)
+            tipo: Filtrar por tipo de relação (opcional); um tipo inverso
+                (ex.: composto_por) é respondido pelas arestas do tipo direto
+                no sentido oposto, devolvidas já invertidas
+        
+        Returns:
+            Lista de arestas (registros completos)
+        """
+        if tipo in self.TIPOS_INVERSOS:
+            if direcao not in (None, "out", "in"):
+                raise ValueError(f"Direção inválida: {direcao!r} (use 'out', 'in' ou None)")
+            oposta = {"out": "in", "in": "out", None: None}[direcao]
+            return [
+                self._vista_inversa(e)
+                for e in self.edges(node_id, oposta, self.TIPOS_INVERSOS[tipo])
+            ]
+
+        indices = []
+        if direcao in (None, "out"):
+            indices.append(self._out)
+        if direcao in (None, "in"):
+            indices.append(self._in)
+        if not indices:
+            raise ValueError(f"Direção inválida: {direcao!r} (use 'out', 'in' ou None)")
+
+        arestas: List[Dict] = []
+        for indice in indices:
+            por_tipo = indice.get(node_id)
+            if not por_tipo:
+                continue
+            if tipo:
+                arestas.extend(por_tipo.get(tipo, ()))
+            else:
+                for lista in por_tipo.values():
+                    arestas.extend(lista)
+        return arestas
+
     def related(self, a: str, b: str) -> List[Dict]:
         """
         Retorna todas as relações entre dois nós.
@@ -175,61 +1629,869 @@ class TRQGraph:
         Returns:
             Lista de arestas conectando a e b (em qualquer direção)
         """
-        return [
-            e for e in self.data["arestas"]
-            if (e["de"] == a and e["para"] == b) or (e["de"] == b and e["para"] == a)
-        ]
+        rels = [e for e in self.edges(a, "out") if e.para == b]
+        if a != b:
+            rels.extend(e for e in self.edges(b, "out") if e.para == a)
+        return rels
 
-    def neighbors(self, node_id: str, tipo: Optional[str] = None) -> List[str]:
+    def neighbors(
+        self,
+        node_id: str,
+        tipo: Optional[str] = None,
+        direcao: Optional[str] = None,
+        regiao: Optional[str] = None,
+    ) -> List[str]:
         """
         Retorna vizinhos de um nó.
         
         Args:
             node_id: ID do nó
             tipo: Filtrar por tipo de relação (opcional)
+            direcao: "out", "in" ou None para ambas as direções
+            regiao: Só vizinhos da região "nome[:campo[:nivel_max]]" (opcional)
         
         Returns:
             Lista de IDs de nós vizinhos
         """
         vizinhos = []
-        for e in self.data["arestas"]:
-            if tipo and e["tipo"] != tipo:
+        if direcao in (None, "out"):
+            vizinhos.extend(e.para for e in self.edges(node_id, "out", tipo))
+        if direcao in (None, "in"):
+            vizinhos.extend(e.de for e in self.edges(node_id, "in", tipo))
+
+        vizinhos = list(dict.fromkeys(vizinhos))  # Remove duplicatas (ordem estável)
+        if regiao:
+            filtro = self._parse_filtro_regiao(regiao)
+            vizinhos = [v for v in vizinhos if self._na_regiao(v, *filtro)]
+        return vizinhos
+
+    @staticmethod
+    def _parse_filtro_regiao(regiao: str) -> Tuple[str, Optional[str], Optional[int]]:
+        """"nome[:campo[:nivel_max]]" -> (nome, campo, nivel_max)."""
+        partes = regiao.split(":")
+        nome = partes[0]
+        campo = partes[1] if len(partes) >= 2 and partes[1] else None
+        nivel_max = int(partes[2]) if len(partes) >= 3 and partes[2] else None
+        return nome, campo, nivel_max
+
+    def _na_regiao(
+        self, node_id: str, nome: str, campo: Optional[str] = None, nivel_max: Optional[int] = None
+    ) -> bool:
+        ndata = self.data["nodos"].get(node_id)
+        if ndata is None:
+            return False
+        r = self._regiao_do_nodo(ndata)
+        if r["nome"] != nome or (campo is not None and r["campo"] != campo):
+            return False
+        return nivel_max is None or r["nivel"] <= nivel_max
+
+    def region_nodes(
+        self,
+        nome: str,
+        campo: Optional[str] = None,
+        nivel_max: Optional[int] = None,
+        nivel_min: Optional[int] = None,
+    ) -> List[str]:
+        """
+        Retorna os nós de uma região pelo índice (nome -> campo -> nivel).
+        
+        Ex.: region_nodes("fisica", "mecanica", nivel_max=2)
+        """
+        campos = self._regioes.get(nome, {})
+        if campo is not None:
+            campos = {campo: campos[campo]} if campo in campos else {}
+        nodos: List[str] = []
+        for niveis in campos.values():
+            for nivel, ids in niveis.items():
+                if nivel_max is not None and nivel > nivel_max:
+                    continue
+                if nivel_min is not None and nivel < nivel_min:
+                    continue
+                nodos.extend(ids)
+        return nodos
+
+    def traverse(
+        self,
+        inicio: str,
+        profundidade: int = 2,
+        tipos: Optional[Iterable[str]] = None,
+        peso_min: float = 0.0,
+        fanout: Optional[Union[int, Sequence[int]]] = None,
+        max_nodos: Optional[int] = None,
+        direcao: Optional[str] = "out",
+        estrategia: str = "bfs",
+    ) -> Iterator[Dict]:
+        """
+        Percorre o grafo a partir de um nó (BFS ou DFS) até `profundidade`,
+        de forma preguiçosa: cada nó novo descoberto gera um passo.
+        
+        Args:
+            inicio: ID do nó inicial
+            profundidade: Número máximo de saltos
+            tipos: Tipos de relação permitidos (None = todos)
+            peso_min: Ignora arestas com peso menor
+            fanout: Máximo de arestas expandidas por nó; int para todos os
+                níveis ou sequência por nível (o último vale para os demais).
+                Quando corta, mantém as arestas de maior peso.
+            max_nodos: Orçamento total de nós descobertos
+            direcao: "out", "in" ou None (ambas)
+            estrategia: "bfs" ou "dfs"
+        
+        Yields:
+            {"nodo", "aresta", "caminho", "profundidade"} — `caminho` é a
+            lista de IDs do início até `nodo`; `aresta` liga os dois últimos.
+        """
+        if estrategia not in ("bfs", "dfs"):
+            raise ValueError(f"Estratégia inválida: {estrategia!r} (use 'bfs' ou 'dfs')")
+        if inicio not in self.data["nodos"] or profundidade <= 0:
+            return
+        if isinstance(tipos, str):
+            tipos = (tipos,)
+        tipos = tuple(tipos) if tipos else (None,)
+        direcoes = ("out", "in") if direcao is None else (direcao,)
+        visitados = {inicio}
+
+        def limite(nivel: int) -> Optional[int]:
+            if fanout is None or isinstance(fanout, int):
+                return fanout
+            return fanout[min(nivel, len(fanout) - 1)] if fanout else None
+
+        def expandir(no: str, nivel: int) -> List[Tuple[Dict, str]]:
+            candidatos = []
+            for d in direcoes:
+                for tipo in tipos:
+                    for e in self.edges(no, d, tipo):
+                        viz = e.para if d == "out" else e.de
+                        if viz in visitados or getattr(e, "peso", 0.0) < peso_min:
+                            continue
+                        candidatos.append((e, viz))
+            cap = limite(nivel)
+            if cap is not None and len(candidatos) > cap:
+                candidatos = heapq.nlargest(cap, candidatos, key=lambda par: getattr(par[0], "peso", 0.0))
+            return candidatos
+
+        descobertos = 0
+        if estrategia == "bfs":
+            fila = deque([(inicio, (inicio,), 0)])
+            while fila:
+                no, caminho, nivel = fila.popleft()
+                for e, viz in expandir(no, nivel):
+                    if viz in visitados:
+                        continue
+                    visitados.add(viz)
+                    novo = caminho + (viz,)
+                    yield {"nodo": viz, "aresta": e, "caminho": list(novo), "profundidade": nivel + 1}
+                    descobertos += 1
+                    if max_nodos is not None and descobertos >= max_nodos:
+                        return
+                    if nivel + 1 < profundidade:
+                        fila.append((viz, novo, nivel + 1))
+            return
+
+        pilha = [((inicio,), 0, iter(expandir(inicio, 0)))]
+        while pilha:
+            caminho, nivel, pendentes = pilha[-1]
+            for e, viz in pendentes:
+                if viz in visitados:
+                    continue
+                visitados.add(viz)
+                novo = caminho + (viz,)
+                yield {"nodo": viz, "aresta": e, "caminho": list(novo), "profundidade": nivel + 1}
+                descobertos += 1
+                if max_nodos is not None and descobertos >= max_nodos:
+                    return
+                if nivel + 1 < profundidade:
+                    pilha.append((novo, nivel + 1, iter(expandir(viz, nivel + 1))))
+                break
+            else:
+                pilha.pop()
+
+    def ego_network(
+        self,
+        centro: str,
+        raio: int = 1,
+        max_nodos: int = 200,
+        max_arestas: int = 1000,
+        tipos: Optional[Iterable[str]] = None,
+        direcao: Optional[str] = None,
+    ) -> Iterator[Dict]:
+        """
+        Subgrafo induzido pelos nós a até `raio` saltos de `centro`, gerado
+        item a item (para serializar em streaming, sem montar a resposta).
+        
+        A ordem é estável: BFS por nível, vizinhos da aresta mais forte para
+        a mais fraca. Cada nó sai antes das arestas que o ligam a nós já
+        emitidos, e cada aresta sai uma única vez.
+        
+        Args:
+            centro: ID do nó central
+            raio: Número máximo de saltos
+            max_nodos: Teto de nós emitidos
+            max_arestas: Teto de arestas emitidas
+            tipos: Tipos de relação considerados (None = todos)
+            direcao: "out", "in" ou None (ambas) ao expandir
+        
+        Yields:
+            {"item": "nodo", "id", "distancia", "nodo"},
+            {"item": "aresta", "aresta"} e, por último,
+            {"item": "fim", "nodos", "arestas", "truncado"}
+        """
+        if centro not in self.data["nodos"]:
+            return
+        if isinstance(tipos, str):
+            tipos = (tipos,)
+        tipos = tuple(tipos) if tipos else (None,)
+        direcoes = ("out", "in") if direcao is None else (direcao,)
+        emitidos: Set[str] = set()
+        n_arestas = 0
+        truncado = False
+        nivel = [centro]
+        vistos = {centro}
+        distancia = 0
+        while nivel and not truncado:
+            proximo: List[str] = []
+            for no in nivel:
+                if len(emitidos) >= max_nodos:
+                    truncado = True
+                    break
+                emitidos.add(no)
+                yield {"item": "nodo", "id": no, "distancia": distancia, "nodo": self.data["nodos"].get(no)}
+                # Arestas até nós já emitidos (laços saem pelo lado "out")
+                for d in ("out", "in"):
+                    for tipo in tipos:
+                        for e in self.edges(no, d, tipo):
+                            outro = e.para if d == "out" else e.de
+                            if outro not in emitidos or (d == "in" and outro == no):
+                                continue
+                            if n_arestas >= max_arestas:
+                                truncado = True
+                                break
+                            n_arestas += 1
+                            yield {"item": "aresta", "aresta": dict(e)}
+                if truncado:
+                    break
+                if distancia < raio:
+                    candidatos = [
+                        (e, e.para if d == "out" else e.de)
+                        for d in direcoes for tipo in tipos for e in self.edges(no, d, tipo)
+                    ]
+                    candidatos.sort(key=lambda par: -getattr(par[0], "peso", 0.0))
+                    for _, viz in candidatos:
+                        if viz not in vistos and viz in self.data["nodos"]:
+                            vistos.add(viz)
+                            proximo.append(viz)
+            nivel = proximo
+            distancia += 1
+        yield {"item": "fim", "nodos": len(emitidos), "arestas": n_arestas, "truncado": truncado}
+
+    # Desempate por número de saltos entre caminhos de mesmo peso
+    _CUSTO_SALTO = 1e-6
+
+    def paths(
+        self,
+        a: str,
+        b: str,
+        k: int = 1,
+        tipos: Optional[Iterable[str]] = None,
+        direcao: Optional[str] = None,
+        max_visitados: int = 100_000,
+    ) -> List[Dict]:
+        """
+        Caminhos de explicação entre dois conceitos, do mais forte ao mais fraco.
+        
+        O custo de cada aresta é -log(peso): o melhor caminho é o de maior
+        produto de pesos. Usa Dijkstra bidirecional para o melhor caminho e
+        o algoritmo de Yen para os k melhores (sem ciclos).
+        
+        Args:
+            a: ID do nó de partida
+            b: ID do nó de chegada
+            k: Número de caminhos desejados
+            tipos: Tipos de relação permitidos (None = todos)
+            direcao: "out" segue o sentido das arestas; None ignora o sentido
+            max_visitados: Orçamento de nós expandidos por busca
+        
+        Returns:
+            Lista de {"nodos", "arestas", "custo", "peso"}
+        """
+        if a not in self.data["nodos"] or b not in self.data["nodos"] or k <= 0:
+            return []
+        if isinstance(tipos, str):
+            tipos = (tipos,)
+        tipos = tuple(tipos) if tipos else (None,)
+
+        primeiro = self._menor_caminho(a, b, tipos, direcao, set(), set(), max_visitados)
+        if primeiro is None:
+            return []
+        encontrados = [primeiro]
+        candidatos: List[Tuple[float, int, Dict]] = []
+        vistos = {tuple(primeiro["nodos"])}
+        seq = 0
+        while len(encontrados) < k:
+            anterior = encontrados[-1]
+            for i in range(len(anterior["nodos"]) - 1):
+                raiz_nodos = anterior["nodos"][: i + 1]
+                raiz_arestas = anterior["arestas"][:i]
+                arestas_proibidas = {
+                    self._chave_aresta(p["arestas"][i])
+                    for p in encontrados
+                    if p["nodos"][: i + 1] == raiz_nodos and len(p["arestas"]) > i
+                }
+                nos_proibidos = set(raiz_nodos[:-1])
+                desvio = self._menor_caminho(
+                    raiz_nodos[-1], b, tipos, direcao, nos_proibidos, arestas_proibidas, max_visitados
+                )
+                if desvio is None:
+                    continue
+                total = self._montar_caminho(raiz_nodos[:-1] + desvio["nodos"], raiz_arestas + desvio["arestas"])
+                chave = tuple(total["nodos"])
+                if chave in vistos:
+                    continue
+                vistos.add(chave)
+                seq += 1
+                heapq.heappush(candidatos, (total["custo"], seq, total))
+            if not candidatos:
+                break
+            encontrados.append(heapq.heappop(candidatos)[2])
+        return encontrados
+
+    @staticmethod
+    def _chave_aresta(e: Dict) -> Tuple[str, str, str]:
+        return (e["de"], e["para"], e["tipo"])
+
+    @classmethod
+    def _custo_aresta(cls, e: Aresta) -> float:
+        return -math.log(getattr(e, "peso", 0.0)) + cls._CUSTO_SALTO
+
+    @classmethod
+    def _montar_caminho(cls, nodos: List[str], arestas: List[Dict]) -> Dict:
+        custo = sum(cls._custo_aresta(e) for e in arestas)
+        peso = 1.0
+        for e in arestas:
+            peso *= e.get("peso", 0.0)
+        return {"nodos": nodos, "arestas": arestas, "custo": custo, "peso": peso}
+
+    def _passos_ponderados(self, no: str, direcao: Optional[str], tipos: Tuple) -> Iterator[Tuple[Dict, str]]:
+        for d in ("out", "in") if direcao is None else (direcao,):
+            for tipo in tipos:
+                for e in self.edges(no, d, tipo):
+                    if getattr(e, "peso", 0.0) > 0.0:
+                        yield e, (e.para if d == "out" else e.de)
+
+    def _menor_caminho(
+        self,
+        a: str,
+        b: str,
+        tipos: Tuple,
+        direcao: Optional[str],
+        nos_proibidos: Set[str],
+        arestas_proibidas: Set[Tuple[str, str, str]],
+        max_visitados: int,
+    ) -> Optional[Dict]:
+        """Dijkstra bidirecional de a até b com custo -log(peso)."""
+        if a == b:
+            return self._montar_caminho([a], [])
+        reverso = {"out": "in", "in": "out", None: None}
+        sentidos = (direcao, reverso[direcao])
+        dist: List[Dict[str, float]] = [{a: 0.0}, {b: 0.0}]
+        pred: List[Dict[str, Tuple[str, Dict]]] = [{}, {}]
+        fechados: List[Set[str]] = [set(), set()]
+        filas: List[List[Tuple[float, str]]] = [[(0.0, a)], [(0.0, b)]]
+        melhor = math.inf
+        meio: Optional[str] = None
+        visitados = 0
+
+        while filas[0] and filas[1]:
+            if filas[0][0][0] + filas[1][0][0] >= melhor:
+                break
+            lado = 0 if filas[0][0][0] <= filas[1][0][0] else 1
+            d, no = heapq.heappop(filas[lado])
+            if no in fechados[lado]:
+                continue
+            fechados[lado].add(no)
+            visitados += 1
+            if visitados > max_visitados:
+                break
+            for e, viz in self._passos_ponderados(no, sentidos[lado], tipos):
+                if viz in nos_proibidos or self._chave_aresta(e) in arestas_proibidas:
+                    continue
+                nd = d + self._custo_aresta(e)
+                if nd < dist[lado].get(viz, math.inf):
+                    dist[lado][viz] = nd
+                    pred[lado][viz] = (no, e)
+                    heapq.heappush(filas[lado], (nd, viz))
+                outro = dist[1 - lado].get(viz)
+                if outro is not None and dist[lado][viz] + outro < melhor:
+                    melhor = dist[lado][viz] + outro
+                    meio = viz
+
+        if meio is None:
+            return None
+        nodos = [meio]
+        arestas: List[Dict] = []
+        atual = meio
+        while atual in pred[0]:
+            atual, e = pred[0][atual]
+            nodos.insert(0, atual)
+            arestas.insert(0, e)
+        atual = meio
+        while atual in pred[1]:
+            atual, e = pred[1][atual]
+            nodos.append(atual)
+            arestas.append(e)
+        return self._montar_caminho(nodos, arestas)
+
+    def _reiniciar_pagerank(self):
+        """Estimativa zerada: resíduo 1 em todo nó (y = 0 satisfaz r = 1 - y + d·A·y)."""
+        nodos = self.data["nodos"]
+        self._pagerank = MapaCOW()
+        self._pagerank_soma = 0.0
+        self._pr_residuos = dict.fromkeys(nodos, 1.0)
+        self._pr_fila = deque(nodos)
+        self._pr_na_fila = set(nodos)
+
+    def _pr_residuo(self, node_id: str, delta: float):
+        r = self._pr_residuos.get(node_id, 0.0) + delta
+        self._pr_residuos[node_id] = r
+        if abs(r) >= self._PR_EPS and node_id not in self._pr_na_fila:
+            self._pr_fila.append(node_id)
+            self._pr_na_fila.add(node_id)
+
+    def _pr_fixar(self, node_id: str, y: float):
+        self._pagerank = self._proprio(self._pagerank)
+        self._pagerank_soma += y - self._pagerank.get(node_id, 0.0)
+        self._pagerank[node_id] = y
+
+    def _pr_contribuir(self, node_id: str, sinal: float):
+        """
+        Soma (sinal=1) ou retira (-1) dos resíduos a parcela d·y·peso/peso_saida
+        que `node_id` repassa a cada vizinho de saída. Quem muda as arestas
+        de saída de um nó retira antes e soma depois: O(grau de saída).
+        """
+        y = self._pagerank.get(node_id)
+        total = self._peso_saida.get(node_id, 0.0)
+        if not y or total <= 0.0 or self._carregando:
+            return
+        fator = sinal * self._AMORTECIMENTO * y / total
+        nodos = self.data["nodos"]
+        for lista in self._out.get(node_id, {}).values():
+            for e in lista:
+                if e.para in nodos:
+                    self._pr_residuo(e.para, fator * getattr(e, "peso", 0.0))
+
+    def _pr_entrar(self, node_id: str):
+        """Nó novo: y = 0, resíduo 1 mais o que as arestas de entrada já repassam."""
+        # Descarta o que o push deixou para o id enquanto ele não existia
+        self._pr_residuos.pop(node_id, None)
+        r = 1.0
+        for e in self.edges(node_id, "in"):
+            y = self._pagerank.get(e.de)
+            total = self._peso_saida.get(e.de, 0.0)
+            if y and total > 0.0:
+                r += self._AMORTECIMENTO * y * getattr(e, "peso", 0.0) / total
+        self._pr_residuo(node_id, r)
+
+    def _pr_sair(self, node_id: str):
+        self._pr_contribuir(node_id, -1.0)
+        if node_id in self._pagerank:
+            self._pagerank = self._proprio(self._pagerank)
+            self._pagerank_soma -= self._pagerank.pop(node_id)
+        self._pr_residuos.pop(node_id, None)
+        self._pr_na_fila.discard(node_id)
+
+    def _propagar_pagerank(self, limite: Optional[int] = None) -> int:
+        """
+        Forward push (Gauss-Southwell): move o resíduo de cada nó da fila
+        para a estimativa dele e repassa d·r·peso/peso_saida aos vizinhos de
+        saída, até nenhum resíduo passar de _PR_EPS ou `limite` nós. Nós sem
+        saída só acumulam; a normalização y / Σy equivale a redistribuir a
+        massa deles uniformemente, como no PageRank clássico.
+
+        Returns:
+            Número de nós empurrados
+        """
+        fila, na_fila, residuos = self._pr_fila, self._pr_na_fila, self._pr_residuos
+        nodos, d, eps = self.data["nodos"], self._AMORTECIMENTO, self._PR_EPS
+        if fila:
+            self._pagerank = self._proprio(self._pagerank)
+        pagerank = self._pagerank
+        feitos = 0
+        while fila and (limite is None or feitos < limite):
+            u = fila.popleft()
+            if u not in na_fila:
+                continue
+            na_fila.discard(u)
+            ru = residuos.pop(u, 0.0)
+            if abs(ru) < eps:
+                if ru:
+                    residuos[u] = ru
+                continue
+            if u not in nodos:
+                continue
+            pagerank[u] = pagerank.get(u, 0.0) + ru
+            self._pagerank_soma += ru
+            feitos += 1
+            total = self._peso_saida.get(u, 0.0)
+            if total <= 0.0:
+                continue
+            fator = d * ru / total
+            # Alvo ausente (aresta legada) é descartado ao sair da fila
+            for lista in self._out.get(u, {}).values():
+                for e in lista:
+                    v = e.para
+                    rv = residuos.get(v, 0.0) + fator * getattr(e, "peso", 0.0)
+                    residuos[v] = rv
+                    if abs(rv) >= eps and v not in na_fila:
+                        fila.append(v)
+                        na_fila.add(v)
+        return feitos
+
+    def atualizar_centralidade(self, fatia: int = 5000) -> int:
+        """
+        Job do PageRank: empurra a fila de resíduos em fatias de `fatia` nós,
+        cada uma sob a trava de escrita e publicando uma versão nova ao fim.
+        O custo acompanha o que mudou desde a rodada anterior, não o tamanho
+        do grafo. Leitores nunca calculam: snapshots servem a estimativa da
+        última versão publicada.
+
+        Returns:
+            Número de nós empurrados
+        """
+        total = 0
+        while True:
+            with self._escrita():
+                feitos = self._propagar_pagerank(fatia)
+                pendente = bool(self._pr_fila)
+            total += feitos
+            if not pendente:
+                return total
+
+    def recalcular_centralidade(self) -> int:
+        """Descarta a estimativa e recalcula o PageRank do zero (mesmo job, fila cheia)."""
+        with self._escrita():
+            self._reiniciar_pagerank()
+        return self.atualizar_centralidade()
+
+    def _pagerank_em_dia(self):
+        # No grafo vivo a consulta empurra a fila (quem chama escolheu pagar);
+        # num snapshot vale o que o job já publicou
+        if not self._somente_leitura and self._pr_fila:
+            self.atualizar_centralidade()
+
+    def centralidade(self, node_id: str) -> Dict:
+        """Retorna {"grau", "grau_ponderado", "pagerank"} de um nó."""
+        self._pagerank_em_dia()
+        soma = self._pagerank_soma
+        return {
+            "grau": self._grau.get(node_id, 0),
+            "grau_ponderado": self._grau_ponderado.get(node_id, 0.0),
+            "pagerank": self._pagerank.get(node_id, 0.0) / soma if soma > 0 else 0.0,
+        }
+
+    def top_neighbors(
+        self,
+        node_id: str,
+        k: int = 3,
+        por: str = "pagerank",
+        tipo: Optional[str] = None,
+        direcao: Optional[str] = None,
+    ) -> List[str]:
+        """
+        Os k vizinhos mais centrais de um nó (ordem determinística).
+        
+        Args:
+            por: "pagerank", "grau" ou "grau_ponderado"
+        """
+        if por == "pagerank":
+            # y não normalizado: a ordem é a mesma do PageRank
+            self._pagerank_em_dia()
+            score = self._pagerank
+        elif por == "grau":
+            score = self._grau
+        elif por == "grau_ponderado":
+            score = self._grau_ponderado
+        else:
+            raise ValueError(f"Critério inválido: {por!r}")
+        vizinhos = self.neighbors(node_id, tipo=tipo, direcao=direcao)
+        return heapq.nsmallest(k, vizinhos, key=lambda v: (-score.get(v, 0.0), v))
+
+    def _tocar_relacionados(self, *nodos: str):
+        # Só o job lê este conjunto (sob a trava); snapshots não o consultam
+        if not self._carregando:
+            self._rel_sujos.update(nodos)
+
+    def _ppr(self, origem: str, alfa: float = 0.15, eps: float = 1e-4) -> Dict[str, float]:
+        """
+        PageRank personalizado a partir de `origem` por forward push
+        (Andersen, Chung e Lang), tratando as arestas como não dirigidas e
+        ponderadas. Só empurra resíduo acima de eps * grau ponderado, então
+        o trabalho é O(1 / (alfa * eps)), independente do tamanho do grafo.
+        """
+        p: Dict[str, float] = {}
+        r: Dict[str, float] = {origem: 1.0}
+        fila = deque([origem])
+        na_fila = {origem}
+        while fila:
+            u = fila.popleft()
+            na_fila.discard(u)
+            ru = r.pop(u, 0.0)
+            grau = self._grau_ponderado.get(u, 0.0)
+            if grau <= 0.0:
+                # Sem saída: a massa fica no próprio nó
+                p[u] = p.get(u, 0.0) + ru
                 continue
-                
-            if e["de"] == node_id:
-                vizinhos.append(e["para"])
-            elif e["para"] == node_id:
-                vizinhos.append(e["de"])
-                
-        return list(set(vizinhos))  # Remove duplicatas
+            p[u] = p.get(u, 0.0) + alfa * ru
+            resto = (1.0 - alfa) * ru / grau
+            for e in self.edges(u):
+                v = e.para if e.de == u else e.de
+                rv = r.get(v, 0.0) + resto * getattr(e, "peso", 0.0)
+                r[v] = rv
+                if v not in na_fila and rv >= eps * self._grau_ponderado.get(v, 0.0):
+                    fila.append(v)
+                    na_fila.add(v)
+        return p
+
+    def _top_relacionados(self, node_id: str, k: int) -> Tuple[str, ...]:
+        p = self._ppr(node_id)
+        p.pop(node_id, None)
+        nodos = self.data["nodos"]
+        return tuple(heapq.nsmallest(k, (v for v in p if v in nodos), key=lambda v: (-p[v], v)))
+
+    def recalcular_relacionados(self, completo: bool = False, k: int = 10, *, save: bool = True) -> int:
+        """
+        Job que mantém a tabela dos k conceitos mais relacionados (PageRank
+        personalizado) dos nós já consultados, para related_concepts()
+        servir em O(1).
+        
+        Na primeira vez parte da tabela gravada em <path>.rel, se ela foi
+        calculada para a versão carregada do grafo (senão, de uma tabela
+        vazia). Cada rodada calcula os nós pedidos por consultas fora da
+        tabela e recalcula os da tabela tocados por mutações desde a rodada
+        anterior (ou vizinhos diretos de um tocado). Com completo=True
+        calcula todos os nós. Trabalha sobre um snapshot, então pode rodar
+        num thread sem bloquear escritores. Com save=True a tabela
+        resultante é gravada (atômico).
+        
+        Returns:
+            Número de nós recalculados
+        """
+        if self._somente_leitura:
+            raise TypeError("Snapshot do grafo TRQ é somente leitura.")
+        with self._trava_relacionados:
+            with self._trava:
+                sujos, self._rel_sujos = self._rel_sujos, set()
+                pedidos = set(self._rel_pedidos)
+                grafo = self.snapshot()
+                base = self._relacionados
+            if base is None and not completo:
+                base = self._ler_relacionados(k) or {}
+            nodos = grafo.data["nodos"]
+            if completo:
+                tabela: Dict[str, Tuple[str, ...]] = {}
+                alvos: Iterable[str] = list(nodos)
+            else:
+                tabela = {nid: top for nid, top in base.items() if nid in nodos}
+                alvos = {nid for nid in pedidos if nid in nodos}
+                alvos.update(
+                    v for s in sujos if s in nodos for v in (s, *grafo.neighbors(s)) if v in tabela
+                )
+            for nid in alvos:
+                tabela[nid] = grafo._top_relacionados(nid, k)
+            self._relacionados = tabela
+            # Pedidos feitos durante a rodada ficam para a próxima
+            self._rel_pedidos.difference_update(pedidos)
+            if save and (alvos or grafo._assinatura != self._rel_gravada):
+                self._gravar_relacionados(tabela, grafo._assinatura, k)
+                self._rel_gravada = grafo._assinatura
+            return len(alvos)
+
+    def _ler_relacionados(self, k: int) -> Optional[Dict[str, Tuple[str, ...]]]:
+        """Tabela gravada, se foi calculada (com o mesmo k) para a versão carregada."""
+        try:
+            salvo = json.loads(self.relacionados_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if salvo.get("versao") != f"{self._assinatura_carregada:016x}" or salvo.get("k") != k:
+            return None
+        self._rel_gravada = self._assinatura_carregada
+        return {
+            sys.intern(nid): tuple(sys.intern(v) for v in top)
+            for nid, top in salvo.get("relacionados", {}).items()
+        }
+
+    def _gravar_relacionados(self, tabela: Dict[str, Tuple[str, ...]], assinatura: int, k: int):
+        tmp = self.relacionados_path.with_name(self.relacionados_path.name + ".tmp")
+        tmp.write_text(
+            json.dumps(
+                {"versao": f"{assinatura:016x}", "k": k, "relacionados": tabela},
+                ensure_ascii=False, separators=(",", ":"),
+            ),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.relacionados_path)
+
+    def related_concepts(self, node_id: str, k: int = 10) -> List[str]:
+        """
+        Conceitos mais relacionados a um nó. Da tabela mantida por
+        recalcular_relacionados() em O(k); na primeira consulta a um nó fora
+        dela, calcula na hora (push local, sem percorrer o grafo) sobre um
+        snapshot e pede ao job que o inclua na tabela.
+        """
+        nodos = self.data["nodos"]
+        top = (self._relacionados or {}).get(node_id)
+        if top is None:
+            if node_id not in nodos:
+                return []
+            self._rel_pedidos.add(node_id)
+            grafo = self if self._somente_leitura else self.snapshot()
+            top = grafo._top_relacionados(node_id, k)
+        return [v for v in top if v in nodos][:k]
+
+    @staticmethod
+    def _raiz(pai: Dict[str, str], node_id: str) -> str:
+        # Sem compressão de caminho: consultas não escrevem (snapshots
+        # compartilham a estrutura); a união por tamanho limita a altura a log n
+        while node_id in pai:
+            node_id = pai[node_id]
+        return node_id
+
+    @classmethod
+    def _unir(cls, pai: Dict[str, str], tamanho: Dict[str, int], a: str, b: str):
+        ra, rb = cls._raiz(pai, a), cls._raiz(pai, b)
+        if ra == rb:
+            return
+        if tamanho.get(ra, 1) < tamanho.get(rb, 1):
+            ra, rb = rb, ra
+        pai[rb] = ra
+        tamanho[ra] = tamanho.get(ra, 1) + tamanho.pop(rb, 1)
+
+    def _montar_uniao(self, tipo: Optional[str]) -> Dict[str, Dict]:
+        """Union-find de um tipo numa passada pelas arestas (não altera o grafo)."""
+        pai: Dict[str, str] = {}
+        tamanho: Dict[str, int] = {}
+        for e in self.data["arestas"]:
+            if tipo is None or e.tipo == tipo:
+                self._unir(pai, tamanho, e.de, e.para)
+        return {"pai": MapaCOW(pai), "tamanho": MapaCOW(tamanho)}
+
+    def _uniao_busca(self, tipo: Optional[str]) -> Dict[str, Dict]:
+        uf = self._componentes.get(tipo)
+        if not self._somente_leitura:
+            # Grafo vivo: quem consulta remonta na hora (sob a trava)
+            if uf is None or tipo in self._componentes_sujos:
+                with self._escrita():
+                    uf = self._montar_uniao(tipo)
+                    self._componentes = {**self._componentes, tipo: uf}
+                    self._componentes_sujos = self._componentes_sujos - {tipo}
+                    self._tipos_pedidos.add(tipo)
+            return uf
+        if uf is None:
+            # Snapshot sem a estrutura: monta só para esta versão e pede ao
+            # job que a mantenha no grafo vivo (as próximas versões a herdam)
+            self._tipos_pedidos.add(tipo)
+            uf = self._montar_uniao(tipo)
+            self._componentes = {**self._componentes, tipo: uf}
+        return uf
+
+    def atualizar_componentes(self) -> int:
+        """
+        Job das componentes: remonta, sobre um snapshot e fora da trava, as
+        estruturas sujas (por remoções) e as pedidas que ainda não existem.
+        Arestas inseridas enquanto isso são reaplicadas na instalação, sob a
+        trava; uma remoção no meio deixa a estrutura suja para a próxima rodada.
+
+        Returns:
+            Número de estruturas remontadas
+        """
+        if self._somente_leitura:
+            raise TypeError("Snapshot do grafo TRQ é somente leitura.")
+        with self._trava:
+            tipos = self._componentes_sujos | (self._tipos_pedidos - set(self._componentes))
+            if not tipos:
+                return 0
+            grafo = self.snapshot()
+            self._componentes_sujos = self._componentes_sujos - tipos
+            self._uniao_novas = []
+        try:
+            novas = {tipo: grafo._montar_uniao(tipo) for tipo in tipos}
+        except BaseException:
+            with self._trava:
+                self._uniao_novas = None
+                self._componentes_sujos = self._componentes_sujos | tipos
+            raise
+        with self._escrita():
+            inseridas, self._uniao_novas = self._uniao_novas, None
+            for tipo_aresta, de, para in inseridas:
+                for tipo, uf in novas.items():
+                    if tipo is None or tipo == tipo_aresta:
+                        self._unir(uf["pai"], uf["tamanho"], de, para)
+            self._componentes = {**self._componentes, **novas}
+        return len(novas)
+
+    def component_of(self, node_id: str, tipo: Optional[str] = None) -> Optional[str]:
+        """
+        Componente conexa de um nó (arestas sem sentido), em O(log n).
+        
+        Args:
+            node_id: ID do nó
+            tipo: Só arestas deste tipo de relação (None = todas)
+        
+        Returns:
+            ID do nó representante da componente (muda quando componentes
+            se unem: compare dois nós no mesmo momento), ou None se o nó não existe
+        """
+        if node_id not in self.data["nodos"]:
+            return None
+        return self._raiz(self._uniao_busca(tipo)["pai"], node_id)
+
+    def same_component(self, a: str, b: str, tipo: Optional[str] = None) -> bool:
+        """Indica se dois nós estão na mesma componente conexa."""
+        ca = self.component_of(a, tipo)
+        return ca is not None and ca == self.component_of(b, tipo)
+
+    def component_size(self, node_id: str, tipo: Optional[str] = None) -> int:
+        """Número de nós na componente de `node_id` (0 se o nó não existe)."""
+        raiz = self.component_of(node_id, tipo)
+        if raiz is None:
+            return 0
+        return self._uniao_busca(tipo)["tamanho"].get(raiz, 1)
+
+    def component_sizes(self, tipo: Optional[str] = None) -> Dict[str, int]:
+        """Representante -> tamanho de cada componente (nós isolados contam 1)."""
+        uf = self._uniao_busca(tipo)
+        tamanhos: Dict[str, int] = {}
+        for nid in self.data["nodos"]:
+            raiz = self._raiz(uf["pai"], nid)
+            if raiz not in tamanhos:
+                tamanhos[raiz] = uf["tamanho"].get(raiz, 1)
+        return tamanhos
 
     def get_region(self, regiao: str) -> List[str]:
-        """Retorna todos os nós de uma região."""
-        return [
-            nid for nid, ndata in self.data["nodos"].items()
-            if ndata.get("regiao") == regiao
-        ]
+        """
+        Retorna todos os nós de uma região.
+        
+        Args:
+            regiao: "nome", "nome:campo" ou "nome:campo:nivel" (nível exato)
+        """
+        nome, campo, nivel = self._parse_filtro_regiao(regiao)
+        if nivel is None:
+            return self.region_nodes(nome, campo)
+        return self.region_nodes(nome, campo, nivel_max=nivel, nivel_min=nivel)
 
     def stats(self) -> Dict:
-        """Retorna estatísticas do grafo."""
-        regioes = set()
-        for node in self.data["nodos"].values():
-            regiao = node.get("regiao", "geral")
-            # regiao pode ser string ou dict {nome, campo, nivel}
-            if isinstance(regiao, dict):
-                regiao = regiao.get("nome", "geral")
-            if regiao:
-                regioes.add(regiao)
-        
-        tipos = set()
-        for edge in self.data["arestas"]:
-            tipo = edge.get("tipo")
-            if tipo:
-                tipos.add(tipo)
-        
+        """
+        Retorna estatísticas do grafo a partir de contadores mantidos nas
+        mutações: não percorre nós nem arestas.
+        """
+        por_regiao = {nome: n for nome, n in self._por_regiao.items() if nome}
+        por_tipo = {tipo: n for tipo, n in self._por_tipo.items() if tipo}
         return {
             "total_nodos": len(self.data["nodos"]),
             "total_arestas": len(self.data["arestas"]),
-            "regioes": sorted(list(regioes)),
-            "tipos_relacao": sorted(list(tipos))
+            "regioes": sorted(por_regiao),
+            "tipos_relacao": sorted(por_tipo),
+            "arestas_por_tipo": por_tipo,
+            "nodos_por_regiao": por_regiao,
+            "nodos_por_origem": dict(self._por_origem),
+            "histograma_grau": dict(self._hist_grau),
         }
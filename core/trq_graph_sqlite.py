@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backend SQLite para o Grafo TRQ.
+
+Mesma superfície pública do TRQGraph (add_node, add_edge, has_edge,
+get_node, edges, neighbors, related, get_region, stats, save), mas com
+os dados num arquivo SQLite local com tabelas indexadas:
+- nodos: id, definicao, pesos, origem, região (nome, campo, nivel)
+- arestas: chave (de, para, tipo) + índices por (para, tipo) e origem
+- regioes: catálogo de (nome, campo, nivel)
+
+Memória limitada (nada é carregado inteiro), escrita transacional e
+leitores concorrentes em vários processos (journal_mode=WAL).
+
+Migração única a partir do JSON:
+  python core/trq_graph_sqlite.py --from data/trq_graph.json --to data/trq_graph.db
+"""
+
+from __future__ import annotations
+
+# --- bootstrap path ---
+import sys
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parents[1]
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+# ----------------------
+
+import argparse
+import sqlite3
+from typing import Dict, List, Optional
+
+from core.json_stream import Progresso, progresso_terminal
+from core.trq_graph import TRQGraph
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS regioes (
+    nome  TEXT NOT NULL,
+    campo TEXT NOT NULL,
+    nivel INTEGER NOT NULL,
+    PRIMARY KEY (nome, campo, nivel)
+);
+CREATE TABLE IF NOT EXISTS nodos (
+    id              TEXT PRIMARY KEY,
+    definicao_curta TEXT NOT NULL,
+    estabilidade    REAL NOT NULL,
+    confianca       REAL NOT NULL,
+    origem          TEXT NOT NULL,
+    regiao_nome     TEXT NOT NULL,
+    regiao_campo    TEXT NOT NULL,
+    regiao_nivel    INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_nodos_regiao ON nodos (regiao_nome, regiao_campo, regiao_nivel);
+CREATE TABLE IF NOT EXISTS arestas (
+    de     TEXT NOT NULL,
+    para   TEXT NOT NULL,
+    tipo   TEXT NOT NULL,
+    peso   REAL NOT NULL,
+    origem TEXT NOT NULL,
+    PRIMARY KEY (de, tipo, para)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_arestas_entrada ON arestas (para, tipo);
+CREATE INDEX IF NOT EXISTS idx_arestas_origem ON arestas (origem);
+"""
+
+
+class TRQGraphSQLite:
+    """
+    Grafo TRQ persistido em SQLite (mesma API do TRQGraph).
+
+    save=True confirma a transação a cada mutação; com save=False as
+    mutações ficam na transação aberta até save().
+    """
+
+    TIPOS_VALIDOS = TRQGraph.TIPOS_VALIDOS
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def save(self):
+        """Confirma mutações pendentes."""
+        self.conn.commit()
+
+    def add_node(
+        self,
+        node_id: str,
+        definicao: str,
+        regiao: str = "geral",
+        origem: str = "humano",
+        peso_estabilidade: float = 1.0,
+        peso_confianca: float = 1.0,
+        *,
+        save: bool = True,
+    ) -> bool:
+        """Adiciona nó. Retorna False se já existia."""
+        r = TRQGraph.estruturar_regiao(regiao)
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO nodos VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                node_id,
+                definicao,
+                min(max(peso_estabilidade, 0.0), 1.0),
+                min(max(peso_confianca, 0.0), 1.0),
+                origem,
+                r["nome"],
+                r["campo"],
+                r["nivel"],
+            ),
+        )
+        if cur.rowcount == 0:
+            return False
+        self.conn.execute(
+            "INSERT OR IGNORE INTO regioes VALUES (?, ?, ?)",
+            (r["nome"], r["campo"], r["nivel"]),
+        )
+        if save:
+            self.save()
+        return True
+
+    def add_edge(
+        self,
+        de: str,
+        para: str,
+        tipo: str,
+        peso: float = 0.8,
+        origem: str = "humano",
+        bidirecional: bool = False,
+        *,
+        save: bool = True,
+        upsert: bool = True,
+    ) -> bool:
+        """Adiciona aresta com a mesma semântica de dedupe/upsert do TRQGraph."""
+        de, para, tipo = TRQGraph._relacao_armazenada(de, para, tipo)
+        if tipo not in self.TIPOS_VALIDOS:
+            return False
+        if not self._existe_nodo(de) or not self._existe_nodo(para):
+            return False
+
+        peso = min(max(peso, 0.0), 1.0)
+        if not self._upsert_aresta(de, para, tipo, peso, origem, upsert):
+            return False
+        # Inversos como composto_por são virtuais (ver edges); só simétricos viram linha
+        if bidirecional and TRQGraph._get_tipo_inverso(tipo) in self.TIPOS_VALIDOS:
+            tipo_inverso = TRQGraph._get_tipo_inverso(tipo)
+            self._upsert_aresta(para, de, tipo_inverso, peso, origem, upsert)
+
+        if save:
+            self.save()
+        return True
+
+    def _upsert_aresta(
+        self, de: str, para: str, tipo: str, peso: float, origem: str, upsert: bool
+    ) -> bool:
+        row = self.conn.execute(
+            "SELECT peso, origem FROM arestas WHERE de = ? AND tipo = ? AND para = ?",
+            (de, tipo, para),
+        ).fetchone()
+        if row is None:
+            self.conn.execute(
+                "INSERT INTO arestas VALUES (?, ?, ?, ?, ?)", (de, para, tipo, peso, origem)
+            )
+            return True
+        if not upsert:
+            return False
+        self.conn.execute(
+            "UPDATE arestas SET peso = ?, origem = ? WHERE de = ? AND tipo = ? AND para = ?",
+            (
+                max(row["peso"], peso),
+                TRQGraph._mesclar_origem(row["origem"], origem),
+                de,
+                tipo,
+                para,
+            ),
+        )
+        return True
+
+    def _existe_nodo(self, node_id: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM nodos WHERE id = ?", (node_id,)).fetchone() is not None
+
+    def has_edge(self, de: str, para: str, tipo: str) -> bool:
+        de, para, tipo = TRQGraph._relacao_armazenada(de, para, tipo)
+        return self.conn.execute(
+            "SELECT 1 FROM arestas WHERE de = ? AND tipo = ? AND para = ?", (de, tipo, para)
+        ).fetchone() is not None
+
+    @staticmethod
+    def _nodo_dict(row: sqlite3.Row) -> Dict:
+        return {
+            "id": row["id"],
+            "definicao_curta": row["definicao_curta"],
+            "peso": {"estabilidade": row["estabilidade"], "confianca": row["confianca"]},
+            "origem": row["origem"],
+            "regiao": {
+                "nome": row["regiao_nome"],
+                "campo": row["regiao_campo"],
+                "nivel": row["regiao_nivel"],
+            },
+        }
+
+    def get_node(self, node_id: str) -> Optional[Dict]:
+        row = self.conn.execute("SELECT * FROM nodos WHERE id = ?", (node_id,)).fetchone()
+        return self._nodo_dict(row) if row else None
+
+    def edges(
+        self,
+        node_id: str,
+        direcao: Optional[str] = None,
+        tipo: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Arestas de um nó por direção ("out", "in" ou None) e tipo. Tipo
+        inverso (composto_por...) lê o tipo direto com de/para trocados.
+        """
+        direto = TRQGraph.TIPOS_INVERSOS.get(tipo)
+        if direto:
+            if direcao not in (None, "out", "in"):
+                raise ValueError(f"Direção inválida: {direcao!r} (use 'out', 'in' ou None)")
+            oposta = {"out": "in", "in": "out", None: None}[direcao]
+            return [
+                dict(e, de=e["para"], para=e["de"], tipo=tipo)
+                for e in self.edges(node_id, oposta, direto)
+            ]
+
+        colunas = []
+        if direcao in (None, "out"):
+            colunas.append("de")
+        if direcao in (None, "in"):
+            colunas.append("para")
+        if not colunas:
+            raise ValueError(f"Direção inválida: {direcao!r} (use 'out', 'in' ou None)")
+
+        arestas: List[Dict] = []
+        for col in colunas:
+            sql = f"SELECT de, para, tipo, peso, origem FROM arestas WHERE {col} = ?"
+            params: tuple = (node_id,)
+            if tipo:
+                sql += " AND tipo = ?"
+                params += (tipo,)
+            arestas.extend(dict(row) for row in self.conn.execute(sql, params))
+        return arestas
+
+    def related(self, a: str, b: str) -> List[Dict]:
+        rows = self.conn.execute(
+            "SELECT de, para, tipo, peso, origem FROM arestas WHERE de = ? AND para = ? "
+            "UNION ALL "
+            "SELECT de, para, tipo, peso, origem FROM arestas WHERE de = ? AND para = ? AND de != para",
+            (a, b, b, a),
+        )
+        return [dict(row) for row in rows]
+
+    def neighbors(
+        self,
+        node_id: str,
+        tipo: Optional[str] = None,
+        direcao: Optional[str] = None,
+    ) -> List[str]:
+        vizinhos = []
+        if direcao in (None, "out"):
+            vizinhos.extend(e["para"] for e in self.edges(node_id, "out", tipo))
+        if direcao in (None, "in"):
+            vizinhos.extend(e["de"] for e in self.edges(node_id, "in", tipo))
+        return list(dict.fromkeys(vizinhos))
+
+    def get_region(self, regiao: str) -> List[str]:
+        """Nós de uma região ("nome", "nome:campo" ou "nome:campo:nivel")."""
+        partes: List = regiao.split(":")[:3]
+        if len(partes) == 3:
+            partes[2] = int(partes[2])
+        colunas = ["regiao_nome", "regiao_campo", "regiao_nivel"][: len(partes)]
+        where = " AND ".join(f"{c} = ?" for c in colunas)
+        return [row["id"] for row in self.conn.execute(f"SELECT id FROM nodos WHERE {where}", partes)]
+
+    def region_nodes(
+        self,
+        nome: str,
+        campo: Optional[str] = None,
+        nivel_max: Optional[int] = None,
+        nivel_min: Optional[int] = None,
+    ) -> List[str]:
+        """Nós de uma região, usando o índice (regiao_nome, regiao_campo, regiao_nivel)."""
+        sql = "SELECT id FROM nodos WHERE regiao_nome = ?"
+        params: List = [nome]
+        if campo is not None:
+            sql += " AND regiao_campo = ?"
+            params.append(campo)
+        if nivel_max is not None:
+            sql += " AND regiao_nivel <= ?"
+            params.append(nivel_max)
+        if nivel_min is not None:
+            sql += " AND regiao_nivel >= ?"
+            params.append(nivel_min)
+        return [row["id"] for row in self.conn.execute(sql, params)]
+
+    def stats(self) -> Dict:
+        total_nodos = self.conn.execute("SELECT COUNT(*) FROM nodos").fetchone()[0]
+        total_arestas = self.conn.execute("SELECT COUNT(*) FROM arestas").fetchone()[0]
+        por_tipo = dict(self.conn.execute("SELECT tipo, COUNT(*) FROM arestas GROUP BY tipo"))
+        por_regiao = dict(self.conn.execute("SELECT regiao_nome, COUNT(*) FROM nodos GROUP BY regiao_nome"))
+        por_origem = dict(self.conn.execute("SELECT origem, COUNT(*) FROM nodos GROUP BY origem"))
+        histograma: Dict[str, int] = {}
+        for (grau,) in self.conn.execute(
+            "SELECT (SELECT COUNT(*) FROM arestas WHERE de = n.id)"
+            " + (SELECT COUNT(*) FROM arestas WHERE para = n.id) FROM nodos n"
+        ):
+            faixa = TRQGraph._faixa_grau(grau)
+            histograma[faixa] = histograma.get(faixa, 0) + 1
+        return {
+            "total_nodos": total_nodos,
+            "total_arestas": total_arestas,
+            "regioes": sorted(por_regiao),
+            "tipos_relacao": sorted(por_tipo),
+            "arestas_por_tipo": por_tipo,
+            "nodos_por_regiao": por_regiao,
+            "nodos_por_origem": por_origem,
+            "histograma_grau": histograma,
+        }
+
+
+def migrar_json(json_path: Path, db_path: Path, progresso: Optional[Progresso] = None) -> Dict:
+    """
+    Migração única: copia nodos e arestas de um trq_graph.json (incluindo o
+    journal pendente) para um banco SQLite, numa única transação.
+    """
+    origem = TRQGraph(str(json_path), progresso=progresso)
+    destino = TRQGraphSQLite(str(db_path))
+    nodos = 0
+    arestas = 0
+    try:
+        for nid, n in origem.data["nodos"].items():
+            reg = n.get("regiao") or {}
+            if isinstance(reg, str):
+                reg = TRQGraph.estruturar_regiao(reg)
+            peso = n.get("peso") or {}
+            regiao = f"{reg.get('nome', 'geral')}:{reg.get('campo', 'geral')}:{reg.get('nivel', 1)}"
+            if destino.add_node(
+                nid,
+                n.get("definicao_curta", ""),
+                regiao=regiao,
+                origem=n.get("origem", "humano"),
+                peso_estabilidade=float(peso.get("estabilidade", 1.0)),
+                peso_confianca=float(peso.get("confianca", 1.0)),
+                save=False,
+            ):
+                nodos += 1
+        for e in origem.data["arestas"]:
+            # Inversas gravadas por versões antigas entram como a direta
+            de, para, tipo = TRQGraph._relacao_armazenada(e["de"], e["para"], e["tipo"])
+            novo = not destino.has_edge(de, para, tipo)
+            if destino._existe_nodo(de) and destino._existe_nodo(para):
+                destino._upsert_aresta(
+                    de, para, tipo, float(e.get("peso", 0.8)), e.get("origem", "humano"), True
+                )
+                arestas += int(novo)
+        destino.save()
+    except Exception:
+        destino.conn.rollback()
+        raise
+    finally:
+        destino.close()
+    return {"nodos": nodos, "arestas": arestas}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--from", dest="src", default=str(_ROOT / "data" / "trq_graph.json"))
+    ap.add_argument("--to", dest="dst", default=str(_ROOT / "data" / "trq_graph.db"))
+    args = ap.parse_args()
+
+    res = migrar_json(Path(args.src), Path(args.dst), progresso=progresso_terminal("grafo"))
+    print("=== Migracao concluida ===")
+    print(f"nodos: {res['nodos']}")
+    print(f"arestas: {res['arestas']}")
+    print(f"banco: {args.dst}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
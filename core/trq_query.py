@@ -0,0 +1,235 @@
+# core/trq_query.py
+"""
+Consultas por padrão sobre o grafo TRQ.
+
+Um padrão é uma cadeia de termos ligados por passos tipados:
+
+    X -causa-> ? -parte_de-> energia
+    ? -exemplo-> tcp
+    calor <-exemplo- ? -relacionado- trabalho
+
+Termos:
+- `?`, `?nome` ou uma letra maiúscula (`X`, `Y2`): variável
+- qualquer outra palavra (ou "entre aspas"): ID de nó
+Passos:
+- `-tipo->` aresta no sentido de/para; `<-tipo-` no sentido inverso;
+  `-tipo-` em qualquer sentido
+- `tipo` pode ser `a|b` (alternativas) ou vazio/`*` (qualquer tipo)
+
+O planejador começa pelo nó fixo mais seletivo (menos arestas no primeiro
+passo) e estende a cadeia para os dois lados com consultas ao índice de
+adjacência (nó, direção, tipo). Sem nenhum nó fixo, varre as arestas do
+tipo mais raro. Os resultados saem um a um (gerador).
+"""
+import itertools
+import re
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+_PASSO = re.compile(r"^(<)?-([\w|*]*)-(>)?$")
+_TERMO = re.compile(r'"[^"]*"|\S+')
+# Siglas como TCP ou CPU continuam sendo IDs de nó
+_VARIAVEL = re.compile(r"^(\?\w*|[A-Z]\d*)$")
+
+
+def _eh_variavel(termo: str) -> bool:
+    return bool(_VARIAVEL.match(termo))
+
+
+def parse(texto: str, normalizar: Optional[Callable[[str], str]] = None) -> Dict:
+    """
+    Converte o texto da consulta em {"termos": [...], "passos": [...]}.
+
+    Cada termo é {"var": nome} (nome None para `?` anônimo) ou {"id": nó};
+    cada passo é {"direcao": "out"|"in"|None, "tipos": tupla ou (None,)}.
+    `normalizar`, se dado, é aplicado aos IDs de nó (ex.: tokenizer.normalize).
+
+    Raises:
+        ValueError: se a consulta não segue a gramática
+    """
+    pedacos = _TERMO.findall(texto or "")
+    if len(pedacos) < 3 or len(pedacos) % 2 == 0:
+        raise ValueError("Consulta deve ser: termo -tipo-> termo [-tipo-> termo ...]")
+    termos, passos = [], []
+    for i, pedaco in enumerate(pedacos):
+        if i % 2 == 1:
+            m = _PASSO.match(pedaco)
+            if not m or (m.group(1) and m.group(3)):
+                raise ValueError(f"Passo inválido: {pedaco!r} (use -tipo->, <-tipo- ou -tipo-)")
+            tipos = tuple(t for t in m.group(2).split("|") if t and t != "*")
+            direcao = "in" if m.group(1) else ("out" if m.group(3) else None)
+            passos.append({"direcao": direcao, "tipos": tipos or (None,)})
+        elif pedaco.startswith('"'):
+            termos.append({"id": normalizar(pedaco[1:-1]) if normalizar else pedaco[1:-1]})
+        elif _PASSO.match(pedaco):
+            raise ValueError(f"Esperado um termo, encontrado o passo {pedaco!r}")
+        elif _eh_variavel(pedaco):
+            nome = pedaco.lstrip("?")
+            termos.append({"var": nome or None})
+        else:
+            termos.append({"id": normalizar(pedaco) if normalizar else pedaco})
+    return {"termos": termos, "passos": passos}
+
+
+def _inverter(direcao: Optional[str]) -> Optional[str]:
+    return {"out": "in", "in": "out", None: None}[direcao]
+
+
+def planejar(grafo, consulta: Dict) -> Dict:
+    """
+    Escolhe por onde começar: {"inicio": posição, "estrategia", "custo"}.
+
+    "indice": parte de um nó fixo (custo = arestas no primeiro passo);
+    "varredura": nenhum nó fixo, parte das arestas do passo mais raro.
+    """
+    termos, passos = consulta["termos"], consulta["passos"]
+    melhor: Optional[Tuple[int, int]] = None
+    for i, termo in enumerate(termos):
+        if "id" not in termo:
+            continue
+        if termo["id"] not in grafo.data["nodos"]:
+            return {"inicio": i, "estrategia": "indice", "custo": 0}
+        custos = []
+        if i + 1 < len(termos):
+            custos.append(_custo(grafo, termo["id"], passos[i]["direcao"], passos[i]["tipos"]))
+        if i > 0:
+            custos.append(_custo(grafo, termo["id"], _inverter(passos[i - 1]["direcao"]), passos[i - 1]["tipos"]))
+        custo = min(custos)
+        if melhor is None or custo < melhor[1]:
+            melhor = (i, custo)
+    if melhor is not None:
+        return {"inicio": melhor[0], "estrategia": "indice", "custo": melhor[1]}
+    # Sem nó fixo: passo cujo(s) tipo(s) têm menos arestas (inverso conta o direto)
+    contagem = grafo.stats()["arestas_por_tipo"]
+    total = sum(contagem.values())
+    custos = [
+        total if None in p["tipos"]
+        else sum(contagem.get(grafo.TIPOS_INVERSOS.get(t, t), 0) for t in p["tipos"])
+        for p in passos
+    ]
+    i = min(range(len(passos)), key=custos.__getitem__)
+    return {"inicio": i, "estrategia": "varredura", "custo": custos[i]}
+
+
+def _custo(grafo, node_id: str, direcao: Optional[str], tipos: Tuple) -> int:
+    return sum(len(grafo.edges(node_id, direcao, t)) for t in tipos)
+
+
+def _passos(grafo, no: str, direcao: Optional[str], tipos: Tuple) -> Iterator[Tuple[Dict, str]]:
+    """Arestas a partir de `no` no sentido pedido, com o nó do outro lado."""
+    for d in ("out", "in") if direcao is None else (direcao,):
+        for tipo in tipos:
+            for e in grafo.edges(no, d, tipo):
+                outro = e["para"] if d == "out" else e["de"]
+                # Laço em passo sem sentido: conta uma vez só
+                if direcao is None and d == "in" and outro == no:
+                    continue
+                yield e, outro
+
+
+def _ligar(termo: Dict, no: str, valores: Dict) -> Optional[Dict]:
+    """Tenta casar `no` com o termo; devolve as variáveis atualizadas ou None."""
+    if "id" in termo:
+        return valores if termo["id"] == no else None
+    nome = termo["var"]
+    if nome is None:
+        return valores
+    if nome in valores:
+        return valores if valores[nome] == no else None
+    novo = dict(valores)
+    novo[nome] = no
+    return novo
+
+
+def executar(grafo, consulta: Dict, plano: Optional[Dict] = None) -> Iterator[Dict]:
+    """
+    Gera os casamentos da consulta: {"vars", "nodos", "arestas"}.
+
+    `nodos` traz um nó por termo e `arestas` uma aresta por passo, na
+    ordem da consulta; `vars` só as variáveis nomeadas.
+    """
+    termos, passos = consulta["termos"], consulta["passos"]
+    plano = plano or planejar(grafo, consulta)
+    k = plano["inicio"]
+    n = len(termos)
+
+    def direita(i: int, nodos: List[str], arestas: List[Dict], valores: Dict):
+        if i == n - 1:
+            yield nodos, arestas, valores
+            return
+        p = passos[i]
+        for e, outro in _passos(grafo, nodos[-1], p["direcao"], p["tipos"]):
+            v = _ligar(termos[i + 1], outro, valores)
+            if v is not None:
+                yield from direita(i + 1, nodos + [outro], arestas + [e], v)
+
+    def esquerda(i: int, nodos: List[str], arestas: List[Dict], valores: Dict):
+        if i == 0:
+            yield nodos, arestas, valores
+            return
+        p = passos[i - 1]
+        for e, outro in _passos(grafo, nodos[0], _inverter(p["direcao"]), p["tipos"]):
+            v = _ligar(termos[i - 1], outro, valores)
+            if v is not None:
+                yield from esquerda(i - 1, [outro] + nodos, [e] + arestas, v)
+
+    def completar(i: int, nodos: List[str], arestas: List[Dict], valores: Dict):
+        # nodos/arestas cobrem os termos i..i+len(nodos)-1
+        fim = i + len(nodos) - 1
+        for nd, ar, v in direita(fim, nodos[-1:], [], valores):
+            for ne, ae, v2 in esquerda(i, nodos + nd[1:], arestas + ar, v):
+                yield {"vars": v2, "nodos": ne, "arestas": ae}
+
+    if plano["estrategia"] == "indice":
+        no = termos[k]["id"]
+        if no in grafo.data["nodos"]:
+            yield from completar(k, [no], [], {})
+        return
+
+    # Varredura: arestas do passo k (termos k e k+1), depois estende.
+    # Tipo inverso (composto_por...) casa com a aresta direta lida ao contrário.
+    p = passos[k]
+    for gravada in grafo.data["arestas"]:
+        for tipo in p["tipos"]:
+            if tipo is None or tipo == gravada["tipo"]:
+                e = gravada
+            elif grafo.TIPOS_INVERSOS.get(tipo) == gravada["tipo"]:
+                e = grafo._vista_inversa(gravada)
+            else:
+                continue
+            pares = []
+            if p["direcao"] in (None, "out"):
+                pares.append((e["de"], e["para"]))
+            if p["direcao"] in (None, "in") and not (p["direcao"] is None and e["de"] == e["para"]):
+                pares.append((e["para"], e["de"]))
+            for a, b in pares:
+                v = _ligar(termos[k], a, {})
+                v = _ligar(termos[k + 1], b, v) if v is not None else None
+                if v is not None:
+                    yield from completar(k, [a, b], [e], v)
+
+
+def consultar(
+    grafo,
+    texto: str,
+    limite: Optional[int] = None,
+    normalizar: Optional[Callable[[str], str]] = None,
+) -> Iterator[Dict]:
+    """
+    Faz parse, planeja e executa `texto`; para após `limite` casamentos.
+    Erros de sintaxe saem na chamada (ValueError), não na iteração.
+    """
+    consulta = parse(texto, normalizar)
+    return itertools.islice(executar(grafo, consulta), limite)
+
+
+def formatar(casamento: Dict) -> str:
+    """Casamento como caminho legível: "forca -causa-> trabalho <-exemplo- x"."""
+    partes = [casamento["nodos"][0]]
+    for e, no in zip(casamento["arestas"], casamento["nodos"][1:]):
+        if e["para"] == no and e["de"] != no:
+            partes.append(f"-{e['tipo']}-> {no}")
+        elif e["de"] == no and e["para"] != no:
+            partes.append(f"<-{e['tipo']}- {no}")
+        else:
+            partes.append(f"-{e['tipo']}- {no}")
+    return " ".join(partes)
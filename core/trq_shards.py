@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Grafo TRQ fragmentado por região (um arquivo por regiao.nome).
+
+Layout do diretório:
+- manifesto.json   shards (arquivo + stats), nó -> shard e a "fronteira"
+                   (grau interno dos nós que têm arestas entre shards)
+- <regiao>.json    um snapshot TRQGraph por região (nós + arestas internas)
+- _cruzadas.json   arestas cujas pontas estão em shards diferentes
+
+Cada shard só é carregado na primeira vez que um nó dele é tocado. Com
+max_nodos, os shards menos usados recentemente são descarregados (e
+gravados, se sujos) quando o total de nós em memória passa do orçamento.
+Uma implantação que atende só "fisica" nunca carrega "ti" ou "filosofia".
+
+Fragmentar um grafo existente:
+  python core/trq_shards.py --graph data/trq_graph.json --out data/trq_shards
+"""
+
+from __future__ import annotations
+
+# --- bootstrap path ---
+import sys
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parents[1]
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+# ----------------------
+
+import argparse
+import json
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+from core.json_stream import progresso_terminal
+from core.trq_graph import TRQGraph
+
+
+FORMATO_VERSAO = 1
+MANIFESTO = "manifesto.json"
+ARQUIVO_CRUZADAS = "_cruzadas.json"
+
+
+def _arquivo_shard(nome: str) -> str:
+    return (re.sub(r"[^\w.-]", "_", nome) or "geral") + ".json"
+
+
+def _gravar_json(arquivo: Path, obj: Dict) -> None:
+    tmp = arquivo.with_name(arquivo.name + ".tmp")
+    tmp.write_text(json.dumps(obj, ensure_ascii=False, indent=2, default=dict), encoding="utf-8")
+    os.replace(tmp, arquivo)
+
+
+def _somar(total: Dict[str, int], parcial: Dict[str, int]) -> None:
+    for chave, n in parcial.items():
+        total[chave] = total.get(chave, 0) + n
+
+
+def fragmentar(graph: TRQGraph, destino: Path) -> Dict:
+    """Divide um grafo em memória em shards por região dentro de `destino`."""
+    destino = Path(destino)
+    destino.mkdir(parents=True, exist_ok=True)
+
+    shard_de = {
+        nid: TRQGraph._regiao_do_nodo(ndata)["nome"] or "geral"
+        for nid, ndata in graph.data["nodos"].items()
+    }
+    partes: Dict[str, Dict] = {}
+    for nid, nome in shard_de.items():
+        partes.setdefault(nome, {"nodos": {}, "arestas": []})["nodos"][nid] = graph.data["nodos"][nid]
+    cruzadas: List[Dict] = []
+    grau_interno: Dict[str, int] = {}
+    for e in graph.data["arestas"]:
+        sa, sb = shard_de.get(e["de"]), shard_de.get(e["para"])
+        if sa is None or sb is None:
+            continue  # aresta órfã: não pertence a nenhum shard
+        if sa == sb:
+            partes[sa]["arestas"].append(e)
+            for nid in (e["de"], e["para"]):
+                grau_interno[nid] = grau_interno.get(nid, 0) + 1
+        else:
+            cruzadas.append(e)
+
+    manifesto = {"versao": FORMATO_VERSAO, "shards": {}, "nodos": shard_de, "fronteira": {}}
+    for nome, dados in partes.items():
+        arquivo = _arquivo_shard(nome)
+        _gravar_json(destino / arquivo, dados)
+        manifesto["shards"][nome] = {"arquivo": arquivo, "stats": TRQGraph(str(destino / arquivo)).stats()}
+    for e in cruzadas:
+        for nid in (e["de"], e["para"]):
+            manifesto["fronteira"][nid] = grau_interno.get(nid, 0)
+    _gravar_json(destino / ARQUIVO_CRUZADAS, {"nodos": {}, "arestas": cruzadas})
+    _gravar_json(destino / MANIFESTO, manifesto)
+    return {"shards": len(partes), "nodos": len(shard_de), "arestas_cruzadas": len(cruzadas)}
+
+
+class TRQGraphShards:
+    """
+    Grafo TRQ com um arquivo por região e carga sob demanda (mesma API de
+    consulta/mutação do TRQGraph: add_node, add_edge, has_edge, get_node,
+    edges, neighbors, related, region_nodes, get_region, stats, save).
+
+    save=True grava os shards alterados e o manifesto a cada mutação; com
+    save=False as mutações ficam em memória até save() (ou até o shard ser
+    descarregado pelo orçamento, quando ele é gravado).
+    """
+
+    TIPOS_VALIDOS = TRQGraph.TIPOS_VALIDOS
+
+    def __init__(self, path: str, max_nodos: Optional[int] = None):
+        """
+        Args:
+            path: Diretório dos shards (criado se não existir)
+            max_nodos: Orçamento de nós em memória (None = sem limite)
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_nodos = max_nodos
+        arquivo = self.path / MANIFESTO
+        if arquivo.exists():
+            self.manifesto = json.loads(arquivo.read_text(encoding="utf-8"))
+            if self.manifesto.get("versao") != FORMATO_VERSAO:
+                raise ValueError(f"Versão de manifesto não suportada: {self.manifesto.get('versao')}")
+        else:
+            self.manifesto = {"versao": FORMATO_VERSAO, "shards": {}, "nodos": {}, "fronteira": {}}
+        # Arestas entre shards ficam sempre carregadas (TRQGraph sem nós)
+        self._cruzadas = TRQGraph(str(self.path / ARQUIVO_CRUZADAS))
+        self._carregados: "OrderedDict[str, TRQGraph]" = OrderedDict()
+        self._sujos: Set[str] = set()
+        self._cruzadas_sujas = False
+        self._manifesto_sujo = False
+
+    # ---- shards ----
+
+    def carregados(self) -> List[str]:
+        """Shards em memória, do menos ao mais usado recentemente."""
+        return list(self._carregados)
+
+    def _shard(self, nome: str, criar: bool = False) -> Optional[TRQGraph]:
+        g = self._carregados.get(nome)
+        if g is not None:
+            self._carregados.move_to_end(nome)
+            return g
+        info = self.manifesto["shards"].get(nome)
+        if info is None:
+            if not criar:
+                return None
+            info = self.manifesto["shards"][nome] = {"arquivo": _arquivo_shard(nome), "stats": {}}
+            self._manifesto_sujo = True
+        g = TRQGraph(str(self.path / info["arquivo"]))
+        self._carregados[nome] = g
+        self._aplicar_orcamento()
+        return g
+
+    def _shard_do_nodo(self, node_id: str) -> Optional[TRQGraph]:
+        nome = self.manifesto["nodos"].get(node_id)
+        return None if nome is None else self._shard(nome)
+
+    def _aplicar_orcamento(self):
+        if self.max_nodos is None:
+            return
+        # O shard recém-tocado (último) nunca é descarregado
+        while len(self._carregados) > 1:
+            total = sum(len(g.data["nodos"]) for g in self._carregados.values())
+            if total <= self.max_nodos:
+                break
+            self.descarregar(next(iter(self._carregados)))
+
+    def descarregar(self, nome: str):
+        """Tira um shard da memória (gravando-o antes, se estiver sujo)."""
+        if nome not in self._carregados:
+            return
+        if nome in self._sujos:
+            self._gravar_shard(nome)
+        del self._carregados[nome]
+
+    def _gravar_shard(self, nome: str):
+        g = self._carregados[nome]
+        g.save()
+        self.manifesto["shards"][nome]["stats"] = g.stats()
+        for nid in self.manifesto["fronteira"]:
+            if self.manifesto["nodos"].get(nid) == nome:
+                self.manifesto["fronteira"][nid] = len(g.edges(nid))
+        self._sujos.discard(nome)
+        self._manifesto_sujo = True
+
+    def save(self):
+        """Grava shards alterados, arestas cruzadas e manifesto."""
+        for nome in list(self._sujos):
+            self._gravar_shard(nome)
+        if self._cruzadas_sujas:
+            self._cruzadas.save()
+            self._cruzadas_sujas = False
+        if self._manifesto_sujo:
+            _gravar_json(self.path / MANIFESTO, self.manifesto)
+            self._manifesto_sujo = False
+
+    # ---- mutações ----
+
+    def add_node(
+        self,
+        node_id: str,
+        definicao: str,
+        regiao: str = "geral",
+        origem: str = "humano",
+        peso_estabilidade: float = 1.0,
+        peso_confianca: float = 1.0,
+        *,
+        save: bool = True,
+    ) -> bool:
+        """Adiciona nó no shard da sua região. Retorna False se já existia."""
+        if node_id in self.manifesto["nodos"]:
+            return False
+        nome = TRQGraph.estruturar_regiao(regiao)["nome"] or "geral"
+        self._shard(nome, criar=True).add_node(
+            node_id, definicao, regiao, origem, peso_estabilidade, peso_confianca, save=False
+        )
+        self.manifesto["nodos"][node_id] = nome
+        self._sujos.add(nome)
+        self._manifesto_sujo = True
+        if save:
+            self.save()
+        return True
+
+    def add_edge(
+        self,
+        de: str,
+        para: str,
+        tipo: str,
+        peso: float = 0.8,
+        origem: str = "humano",
+        bidirecional: bool = False,
+        *,
+        save: bool = True,
+        upsert: bool = True,
+    ) -> bool:
+        """Adiciona aresta: no shard, se as pontas estão na mesma região; senão nas cruzadas."""
+        de, para, tipo = TRQGraph._relacao_armazenada(de, para, tipo)
+        if tipo not in self.TIPOS_VALIDOS:
+            return False
+        sa, sb = self.manifesto["nodos"].get(de), self.manifesto["nodos"].get(para)
+        if sa is None or sb is None:
+            return False
+        if sa == sb:
+            ok = self._shard(sa).add_edge(
+                de, para, tipo, peso, origem, bidirecional, save=False, upsert=upsert
+            )
+            if ok:
+                self._sujos.add(sa)
+        else:
+            ok = self._add_cruzada(de, para, tipo, peso, origem, bidirecional, upsert)
+        if ok and save:
+            self.save()
+        return ok
+
+    def _add_cruzada(
+        self, de: str, para: str, tipo: str, peso: float, origem: str, bidirecional: bool, upsert: bool
+    ) -> bool:
+        peso = min(max(peso, 0.0), 1.0)
+        if not self._cruzadas._upsert_aresta(de, para, tipo, peso, origem, upsert):
+            return False
+        if bidirecional and TRQGraph._get_tipo_inverso(tipo) in self.TIPOS_VALIDOS:
+            self._cruzadas._upsert_aresta(para, de, TRQGraph._get_tipo_inverso(tipo), peso, origem, upsert)
+        for nid in (de, para):
+            if nid not in self.manifesto["fronteira"]:
+                self.manifesto["fronteira"][nid] = len(self._shard_do_nodo(nid).edges(nid))
+        self._cruzadas_sujas = True
+        self._manifesto_sujo = True
+        return True
+
+    # ---- consultas ----
+
+    def get_node(self, node_id: str) -> Optional[Dict]:
+        g = self._shard_do_nodo(node_id)
+        return None if g is None else g.get_node(node_id)
+
+    def has_edge(self, de: str, para: str, tipo: str) -> bool:
+        sa, sb = self.manifesto["nodos"].get(de), self.manifesto["nodos"].get(para)
+        if sa is None or sb is None:
+            return False
+        if sa == sb:
+            return self._shard(sa).has_edge(de, para, tipo)
+        return self._cruzadas.has_edge(de, para, tipo)
+
+    def edges(self, node_id: str, direcao: Optional[str] = None, tipo: Optional[str] = None) -> List[Dict]:
+        if direcao not in (None, "out", "in"):
+            raise ValueError(f"Direção inválida: {direcao!r} (use 'out', 'in' ou None)")
+        g = self._shard_do_nodo(node_id)
+        if g is None:
+            return []
+        return g.edges(node_id, direcao, tipo) + self._cruzadas.edges(node_id, direcao, tipo)
+
+    def neighbors(
+        self,
+        node_id: str,
+        tipo: Optional[str] = None,
+        direcao: Optional[str] = None,
+        regiao: Optional[str] = None,
+    ) -> List[str]:
+        g = self._shard_do_nodo(node_id)
+        if g is None:
+            return []
+        vizinhos = g.neighbors(node_id, tipo, direcao) + self._cruzadas.neighbors(node_id, tipo, direcao)
+        vizinhos = list(dict.fromkeys(vizinhos))
+        if regiao:
+            # Só o shard da região filtrada precisa estar carregado
+            filtro = TRQGraph._parse_filtro_regiao(regiao)
+            alvo = self._shard(filtro[0])
+            vizinhos = [] if alvo is None else [v for v in vizinhos if alvo._na_regiao(v, *filtro)]
+        return vizinhos
+
+    def related(self, a: str, b: str) -> List[Dict]:
+        sa, sb = self.manifesto["nodos"].get(a), self.manifesto["nodos"].get(b)
+        if sa is None or sb is None:
+            return []
+        if sa == sb:
+            return self._shard(sa).related(a, b)
+        return self._cruzadas.related(a, b)
+
+    def region_nodes(
+        self,
+        nome: str,
+        campo: Optional[str] = None,
+        nivel_max: Optional[int] = None,
+        nivel_min: Optional[int] = None,
+    ) -> List[str]:
+        g = self._shard(nome)
+        return [] if g is None else g.region_nodes(nome, campo, nivel_max, nivel_min)
+
+    def get_region(self, regiao: str) -> List[str]:
+        g = self._shard(regiao.split(":")[0])
+        return [] if g is None else g.get_region(regiao)
+
+    def stats(self) -> Dict:
+        """
+        Estatísticas agregadas sem carregar shards frios: usa as stats
+        vivas dos shards carregados e as do manifesto para os demais.
+        """
+        total_nodos = 0
+        total_arestas = len(self._cruzadas.data["arestas"])
+        por_tipo: Dict[str, int] = dict(self._cruzadas.stats()["arestas_por_tipo"])
+        por_regiao: Dict[str, int] = {}
+        por_origem: Dict[str, int] = {}
+        histograma: Dict[str, int] = {}
+        for nome, info in self.manifesto["shards"].items():
+            g = self._carregados.get(nome)
+            s = g.stats() if g is not None else info.get("stats", {})
+            total_nodos += s.get("total_nodos", 0)
+            total_arestas += s.get("total_arestas", 0)
+            _somar(por_tipo, s.get("arestas_por_tipo", {}))
+            _somar(por_regiao, s.get("nodos_por_regiao", {}))
+            _somar(por_origem, s.get("nodos_por_origem", {}))
+            _somar(histograma, s.get("histograma_grau", {}))
+        # Nós de fronteira: soma o grau das arestas cruzadas ao grau interno
+        for nid, interno in self.manifesto["fronteira"].items():
+            g = self._carregados.get(self.manifesto["nodos"].get(nid))
+            if g is not None:
+                interno = len(g.edges(nid))
+            externo = len(self._cruzadas.edges(nid))
+            _somar(histograma, {TRQGraph._faixa_grau(interno): -1})
+            _somar(histograma, {TRQGraph._faixa_grau(interno + externo): 1})
+        histograma = {faixa: n for faixa, n in histograma.items() if n}
+        return {
+            "total_nodos": total_nodos,
+            "total_arestas": total_arestas,
+            "regioes": sorted(nome for nome in por_regiao if nome),
+            "tipos_relacao": sorted(tipo for tipo in por_tipo if tipo),
+            "arestas_por_tipo": por_tipo,
+            "nodos_por_regiao": por_regiao,
+            "nodos_por_origem": por_origem,
+            "histograma_grau": histograma,
+        }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--graph", default=str(_ROOT / "data" / "trq_graph.json"))
+    ap.add_argument("--out", default=str(_ROOT / "data" / "trq_shards"))
+    args = ap.parse_args()
+
+    res = fragmentar(TRQGraph(args.graph, progresso=progresso_terminal("grafo")), Path(args.out))
+    print("=== Grafo fragmentado por região ===")
+    print(f"shards: {res['shards']}")
+    print(f"nodos: {res['nodos']}")
+    print(f"arestas cruzadas: {res['arestas_cruzadas']}")
+    print(f"diretorio: {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
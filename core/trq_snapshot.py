@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Snapshot binário (CSR) do Grafo TRQ, somente leitura, para servir.
+
+Layout do diretório do snapshot:
+- meta.json          tabelas pequenas (tipos, origens, totais)
+- ids.bin            ids dos nós (utf-8) concatenados, em ordem de bytes
+- ids_offsets.npy    int64[N+1] fronteiras de cada id em ids.bin
+- nodos.jsonl        metadados dos nós (uma linha JSON por nó, mesma ordem)
+- nodos_offsets.npy  int64[N+1] fronteiras de cada linha em nodos.jsonl
+- out_*.npy / in_*.npy  CSR de saída e de entrada:
+    offsets int64[N+1], alvos int32[E], tipos uint8[E],
+    pesos float32[E], origens int32[E]
+
+Tudo é aberto com memory-map: vários workers (uvicorn) compartilham a
+mesma cópia no page cache e o startup não faz parse de JSON. Reexportar
+não sobrescreve arquivos mapeados: o novo snapshot é escrito num diretório
+irmão versionado (.<nome>.*.v) e o diretório do snapshot é um link
+simbólico para ele, trocado com rename.
+
+Exportar:
+  python core/trq_snapshot.py --graph data/trq_graph.json --out data/trq_csr
+"""
+
+from __future__ import annotations
+
+# --- bootstrap path ---
+import sys
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parents[1]
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+# ----------------------
+
+import argparse
+import json
+import mmap
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from core.json_stream import progresso_terminal
+from core.trq_graph import TRQGraph
+
+
+FORMATO_VERSAO = 1
+
+
+def _gravar_csr(destino: Path, prefixo: str, linhas: List[List[tuple]]) -> None:
+    """linhas[i] = [(alvo_idx, tipo_cod, peso, origem_cod), ...] já ordenada por alvo."""
+    offsets = np.zeros(len(linhas) + 1, dtype=np.int64)
+    for i, linha in enumerate(linhas):
+        offsets[i + 1] = offsets[i] + len(linha)
+    total = int(offsets[-1])
+    alvos = np.empty(total, dtype=np.int32)
+    tipos = np.empty(total, dtype=np.uint8)
+    pesos = np.empty(total, dtype=np.float32)
+    origens = np.empty(total, dtype=np.int32)
+    k = 0
+    for linha in linhas:
+        for alvo, tipo, peso, origem in linha:
+            alvos[k], tipos[k], pesos[k], origens[k] = alvo, tipo, peso, origem
+            k += 1
+    np.save(destino / f"{prefixo}_offsets.npy", offsets)
+    np.save(destino / f"{prefixo}_alvos.npy", alvos)
+    np.save(destino / f"{prefixo}_tipos.npy", tipos)
+    np.save(destino / f"{prefixo}_pesos.npy", pesos)
+    np.save(destino / f"{prefixo}_origens.npy", origens)
+
+
+def exportar_snapshot(graph: TRQGraph, destino: Path) -> Dict:
+    """
+    Exporta o grafo em memória para um snapshot CSR em `destino`.
+
+    Os arquivos vão para um diretório versionado ao lado de `destino`, e
+    `destino` passa a ser um link simbólico para ele, trocado com
+    os.replace: quem abre `destino` vê sempre o snapshot anterior ou o
+    novo, inteiros, nunca um caminho ausente. Leitores que já mapearam o
+    anterior seguem nos arquivos dele (o sistema só os libera quando o
+    último mapeamento fecha).
+    """
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    novo = Path(tempfile.mkdtemp(prefix=f".{destino.name}.", suffix=".v", dir=destino.parent))
+    try:
+        os.chmod(novo, 0o755)
+        meta = _exportar(graph, novo)
+        _apontar(destino, novo)
+    except BaseException:
+        shutil.rmtree(novo, ignore_errors=True)
+        raise
+    return meta
+
+
+def _apontar(destino: Path, novo: Path) -> None:
+    """Troca atômica do link `destino` para a versão `novo`; apaga as mais velhas."""
+    if destino.is_symlink():
+        anterior = Path(os.readlink(destino)).name
+    elif destino.exists():
+        # Formato antigo (diretório de verdade): vira uma versão. Só nesta
+        # migração o caminho fica ausente por um instante.
+        legado = Path(tempfile.mkdtemp(prefix=f".{destino.name}.", suffix=".v", dir=destino.parent))
+        os.replace(destino, legado)
+        anterior = legado.name
+    else:
+        anterior = None
+    link = destino.with_name(f"{novo.name}.link")
+    os.symlink(novo.name, link)
+    os.replace(link, destino)
+    # A versão anterior fica: um leitor que acabou de resolver o link ainda
+    # vai abrir os arquivos dela
+    for versao in destino.parent.glob(f".{destino.name}.*.v"):
+        if versao.name not in (novo.name, anterior):
+            shutil.rmtree(versao, ignore_errors=True)
+
+
+def _exportar(graph: TRQGraph, destino: Path) -> Dict:
+
+    ids = sorted(graph.data["nodos"], key=lambda s: s.encode("utf-8"))
+    indice = {nid: i for i, nid in enumerate(ids)}
+    tipos: Dict[str, int] = {}
+    origens: Dict[str, int] = {}
+
+    # Tabela de ids (interned) e tabela lateral de metadados
+    ids_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    nodos_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    with (destino / "ids.bin").open("wb") as f_ids, (destino / "nodos.jsonl").open("wb") as f_nodos:
+        for i, nid in enumerate(ids):
+            b = nid.encode("utf-8")
+            f_ids.write(b)
+            ids_offsets[i + 1] = ids_offsets[i] + len(b)
+            linha = (json.dumps(graph.data["nodos"][nid], ensure_ascii=False) + "\n").encode("utf-8")
+            f_nodos.write(linha)
+            nodos_offsets[i + 1] = nodos_offsets[i] + len(linha)
+    np.save(destino / "ids_offsets.npy", ids_offsets)
+    np.save(destino / "nodos_offsets.npy", nodos_offsets)
+
+    saida: List[List[tuple]] = [[] for _ in ids]
+    entrada: List[List[tuple]] = [[] for _ in ids]
+    por_tipo: Dict[str, int] = {}
+    for e in graph.data["arestas"]:
+        de, para = indice.get(e["de"]), indice.get(e["para"])
+        if de is None or para is None:
+            continue
+        t = tipos.setdefault(e["tipo"], len(tipos))
+        por_tipo[e["tipo"]] = por_tipo.get(e["tipo"], 0) + 1
+        o = origens.setdefault(e.get("origem", ""), len(origens))
+        peso = float(e.get("peso", 0.0))
+        saida[de].append((para, t, peso, o))
+        entrada[para].append((de, t, peso, o))
+    for linhas in (saida, entrada):
+        for linha in linhas:
+            linha.sort()
+    if len(tipos) > 255:
+        raise ValueError("Snapshot CSR suporta no máximo 255 tipos de relação.")
+    _gravar_csr(destino, "out", saida)
+    _gravar_csr(destino, "in", entrada)
+
+    # Contadores de arestas (e o grau) do conjunto exportado: arestas para
+    # nós ausentes ficam de fora do CSR e não entram nos totais
+    histograma: Dict[str, int] = {}
+    for i in range(len(ids)):
+        faixa = TRQGraph._faixa_grau(len(saida[i]) + len(entrada[i]))
+        histograma[faixa] = histograma.get(faixa, 0) + 1
+    stats = graph.stats()
+    meta = {
+        "versao": FORMATO_VERSAO,
+        "total_nodos": len(ids),
+        "total_arestas": sum(len(linha) for linha in saida),
+        "tipos": sorted(tipos, key=tipos.get),
+        "origens": sorted(origens, key=origens.get),
+        "regioes": stats["regioes"],
+        # Contadores agregados (servidos por stats() sem varrer o CSR)
+        "arestas_por_tipo": por_tipo,
+        "nodos_por_regiao": stats["nodos_por_regiao"],
+        "nodos_por_origem": stats["nodos_por_origem"],
+        "histograma_grau": histograma,
+    }
+    (destino / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    return meta
+
+
+class _CSR:
+    def __init__(self, base: Path, prefixo: str):
+        self.offsets = np.load(base / f"{prefixo}_offsets.npy", mmap_mode="r")
+        self.alvos = np.load(base / f"{prefixo}_alvos.npy", mmap_mode="r")
+        self.tipos = np.load(base / f"{prefixo}_tipos.npy", mmap_mode="r")
+        self.pesos = np.load(base / f"{prefixo}_pesos.npy", mmap_mode="r")
+        self.origens = np.load(base / f"{prefixo}_origens.npy", mmap_mode="r")
+
+    def faixa(self, i: int) -> tuple:
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+
+class TRQSnapshot:
+    """
+    Grafo TRQ somente leitura servido a partir de um snapshot CSR mapeado
+    em memória. Mesma API de consulta do TRQGraph (get_node, edges,
+    neighbors, related, has_edge, stats).
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        # Resolve o link uma vez: todos os arquivos vêm da mesma versão,
+        # mesmo que uma reexportação troque o link no meio
+        base = Path(os.path.realpath(self.path))
+        self.meta = json.loads((base / "meta.json").read_text(encoding="utf-8"))
+        if self.meta.get("versao") != FORMATO_VERSAO:
+            raise ValueError(f"Versão de snapshot não suportada: {self.meta.get('versao')}")
+        self._tipos: List[str] = self.meta["tipos"]
+        self._tipo_cod = {t: i for i, t in enumerate(self._tipos)}
+        self._origens: List[str] = self.meta["origens"]
+        self._n = int(self.meta["total_nodos"])
+
+        self._ids_offsets = np.load(base / "ids_offsets.npy", mmap_mode="r")
+        self._nodos_offsets = np.load(base / "nodos_offsets.npy", mmap_mode="r")
+        self._ids = self._mapear(base / "ids.bin")
+        self._nodos = self._mapear(base / "nodos.jsonl")
+        self._out = _CSR(base, "out")
+        self._in = _CSR(base, "in")
+
+    @staticmethod
+    def _mapear(arquivo: Path):
+        with arquivo.open("rb") as fh:
+            if arquivo.stat().st_size == 0:
+                return b""
+            return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _id(self, i: int) -> str:
+        return self._ids[int(self._ids_offsets[i]):int(self._ids_offsets[i + 1])].decode("utf-8")
+
+    def _indice(self, node_id: str) -> Optional[int]:
+        """Busca binária na tabela de ids (ordenada por bytes)."""
+        alvo = node_id.encode("utf-8")
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            atual = self._ids[int(self._ids_offsets[mid]):int(self._ids_offsets[mid + 1])]
+            if atual < alvo:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._n and self._id(lo) == node_id:
+            return lo
+        return None
+
+    def get_node(self, node_id: str) -> Optional[Dict]:
+        i = self._indice(node_id)
+        if i is None:
+            return None
+        ini, fim = int(self._nodos_offsets[i]), int(self._nodos_offsets[i + 1])
+        return json.loads(self._nodos[ini:fim])
+
+    def _arestas(
+        self, csr: _CSR, i: int, tipo: Optional[str], saida: bool, sel=None
+    ) -> List[Dict]:
+        ini, fim = csr.faixa(i)
+        if ini == fim:
+            return []
+        alvos = csr.alvos[ini:fim]
+        tipos = csr.tipos[ini:fim]
+        if sel is None:
+            sel = range(fim - ini)
+        if tipo:
+            cod = self._tipo_cod.get(tipo)
+            if cod is None:
+                return []
+            sel = np.nonzero(tipos == cod)[0]
+        nid = self._id(i)
+        arestas = []
+        for k in sel:
+            outro = self._id(int(alvos[k]))
+            arestas.append({
+                "de": nid if saida else outro,
+                "para": outro if saida else nid,
+                "tipo": self._tipos[int(tipos[k])],
+                "peso": round(float(csr.pesos[ini + k]), 6),
+                "origem": self._origens[int(csr.origens[ini + k])],
+            })
+        return arestas
+
+    def edges(self, node_id: str, direcao: Optional[str] = None, tipo: Optional[str] = None) -> List[Dict]:
+        if direcao not in (None, "out", "in"):
+            raise ValueError(f"Direção inválida: {direcao!r} (use 'out', 'in' ou None)")
+        # Tipo inverso (composto_por...): o tipo direto lido no CSR oposto
+        direto = TRQGraph.TIPOS_INVERSOS.get(tipo)
+        if direto:
+            oposta = {"out": "in", "in": "out", None: None}[direcao]
+            return [
+                dict(e, de=e["para"], para=e["de"], tipo=tipo)
+                for e in self.edges(node_id, oposta, direto)
+            ]
+        i = self._indice(node_id)
+        if i is None:
+            return []
+        arestas = []
+        if direcao in (None, "out"):
+            arestas.extend(self._arestas(self._out, i, tipo, True))
+        if direcao in (None, "in"):
+            arestas.extend(self._arestas(self._in, i, tipo, False))
+        return arestas
+
+    def neighbors(self, node_id: str, tipo: Optional[str] = None, direcao: Optional[str] = None) -> List[str]:
+        vizinhos = []
+        if direcao in (None, "out"):
+            vizinhos.extend(e["para"] for e in self.edges(node_id, "out", tipo))
+        if direcao in (None, "in"):
+            vizinhos.extend(e["de"] for e in self.edges(node_id, "in", tipo))
+        return list(dict.fromkeys(vizinhos))
+
+    def _entre(self, a: int, b: int) -> List[Dict]:
+        """Arestas a -> b via busca binária na linha CSR de a (ordenada por alvo)."""
+        ini, fim = self._out.faixa(a)
+        alvos = self._out.alvos[ini:fim]
+        lo = int(np.searchsorted(alvos, b, side="left"))
+        hi = int(np.searchsorted(alvos, b, side="right"))
+        if lo == hi:
+            return []
+        return self._arestas(self._out, a, None, True, sel=range(lo, hi))
+
+    def related(self, a: str, b: str) -> List[Dict]:
+        ia, ib = self._indice(a), self._indice(b)
+        if ia is None or ib is None:
+            return []
+        rels = self._entre(ia, ib)
+        if ia != ib:
+            rels.extend(self._entre(ib, ia))
+        return rels
+
+    def has_edge(self, de: str, para: str, tipo: str) -> bool:
+        de, para, tipo = TRQGraph._relacao_armazenada(de, para, tipo)
+        ia, ib = self._indice(de), self._indice(para)
+        if ia is None or ib is None:
+            return False
+        return any(e["tipo"] == tipo for e in self._entre(ia, ib))
+
+    def stats(self) -> Dict:
+        return {
+            "total_nodos": self._n,
+            "total_arestas": int(self.meta["total_arestas"]),
+            "regioes": list(self.meta.get("regioes", [])),
+            "tipos_relacao": sorted(self._tipos),
+            "arestas_por_tipo": dict(self.meta.get("arestas_por_tipo", {})),
+            "nodos_por_regiao": dict(self.meta.get("nodos_por_regiao", {})),
+            "nodos_por_origem": dict(self.meta.get("nodos_por_origem", {})),
+            "histograma_grau": dict(self.meta.get("histograma_grau", {})),
+        }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--graph", default=str(_ROOT / "data" / "trq_graph.json"))
+    ap.add_argument("--out", default=str(_ROOT / "data" / "trq_csr"))
+    args = ap.parse_args()
+
+    grafo = TRQGraph(args.graph, progresso=progresso_terminal("grafo"))
+    meta = exportar_snapshot(grafo, Path(args.out))
+    print("=== Snapshot CSR exportado ===")
+    print(f"nodos: {meta['total_nodos']}")
+    print(f"arestas: {meta['total_arestas']}")
+    print(f"diretorio: {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
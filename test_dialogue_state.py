@@ -197,6 +197,57 @@ def test_principio_guardiao():
     
     print()
 
+def test_area_tematica():
+    """Testa área temática (componente do grafo) e gesto ao mudar de área"""
+    print("=" * 60)
+    print("TESTE 7: Área temática")
+    print("=" * 60)
+    
+    estado = EstadoDialogo()
+    estado.papel = "explicadora"
+    estado.profundidade = 2
+    
+    estado.atualizar_area("energia", mesma_area=False)
+    assert estado.area_tematica == "energia" and not estado.mudou_area
+    assert estado.gerar_gesto_final() != ""
+    
+    # Mudou de área: resposta não termina com convite
+    estado.atualizar_area("bit", mesma_area=False)
+    assert estado.mudou_area and estado.gerar_gesto_final() == ""
+    
+    # O sinal vale só para o turno em curso
+    estado.registrar_turno("o que é bit?", "...", topico="bit")
+    assert not estado.mudou_area
+    print("  Mudança de área suprime gesto: [OK]")
+    
+    print()
+
+def test_relacionados():
+    """Testa o gesto final com conceitos relacionados ranqueados pelo grafo"""
+    print("=" * 60)
+    print("TESTE 8: Conceitos relacionados no gesto")
+    print("=" * 60)
+    
+    estado = EstadoDialogo()
+    estado.topico_atual = "energia"
+    estado.papel = "exploradora"
+    estado.profundidade = 3
+    assert "conceitos relacionados?" in estado.gerar_gesto_final()
+    
+    estado.sugerir_relacionados(["trabalho", "calor", "potencia", "massa"])
+    gesto = estado.gerar_gesto_final()
+    assert gesto.endswith("seguir para trabalho, calor ou potencia?")
+    
+    estado.papel = "explicadora"
+    assert estado.gerar_gesto_final().endswith("seguimos para trabalho?")
+    
+    # Sugestões valem só para o turno em curso
+    estado.registrar_turno("e a energia?", "...", topico="energia")
+    assert estado.relacionados == []
+    print("  Gesto sugere próximos tópicos do grafo: [OK]")
+    
+    print()
+
 if __name__ == "__main__":
     print("\n" + "=" * 60)
     print("TESTANDO ESTADO CONVERSACIONAL DA ANTONIA")
@@ -209,6 +260,8 @@ if __name__ == "__main__":
     test_gesto_final()
     test_conversacao_progressiva()
     test_principio_guardiao()
+    test_area_tematica()
+    test_relacionados()
     
     print("=" * 60)
     print("TODOS OS TESTES PASSARAM [OK]")
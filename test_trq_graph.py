@@ -0,0 +1,1226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_trq_graph.py
+
+Testa o Grafo TRQ (índices e consultas) sem tocar em data/.
+"""
+
+import tempfile
+from pathlib import Path
+
+from core.trq_graph import TRQGraph
+from core.trq_graph_sqlite import TRQGraphSQLite, migrar_json
+
+
+def _grafo_tmp() -> TRQGraph:
+    tmp = Path(tempfile.mkdtemp())
+    return TRQGraph(str(tmp / "trq_graph.json"))
+
+
+def _grafo_exemplo() -> TRQGraph:
+    g = _grafo_tmp()
+    for nid in ("energia", "trabalho", "forca", "calor", "movimento"):
+        g.add_node(nid, f"definicao de {nid}", regiao="fisica:mecanica:2", save=False)
+    g.add_edge("energia", "trabalho", "relacionado", save=False)
+    g.add_edge("forca", "trabalho", "causa", save=False)
+    g.add_edge("calor", "energia", "exemplo", save=False)
+    g.add_edge("energia", "movimento", "causa", save=False)
+    g.save()
+    return g
+
+
+def test_adjacencia():
+    """Testa vizinhos e relações via índice de adjacência"""
+    print("=" * 60)
+    print("TESTE 1: Índice de adjacência")
+    print("=" * 60)
+
+    g = _grafo_exemplo()
+    assert sorted(g.neighbors("energia")) == ["calor", "movimento", "trabalho"]
+    assert g.neighbors("energia", tipo="causa") == ["movimento"]
+    assert g.neighbors("inexistente") == []
+
+    rels = g.related("trabalho", "energia")
+    assert len(rels) == 1 and rels[0]["de"] == "energia"
+
+    # load() reconstrói o índice a partir do disco
+    g2 = TRQGraph(str(g.path))
+    assert sorted(g2.neighbors("trabalho")) == ["energia", "forca"]
+    assert g2.related("calor", "energia") == g.related("calor", "energia")
+
+    print("[OK] Adjacência funcionando")
+    print()
+
+
+def test_arestas_tipadas():
+    """Testa consultas por (nó, direção, tipo)"""
+    print("=" * 60)
+    print("TESTE 2: Arestas tipadas e direcionais")
+    print("=" * 60)
+
+    g = _grafo_exemplo()
+    saida = g.edges("energia", "out", tipo="causa")
+    assert [(e["de"], e["para"]) for e in saida] == [("energia", "movimento")]
+    entrada = g.edges("energia", "in", tipo="exemplo")
+    assert [e["de"] for e in entrada] == ["calor"]
+    assert len(g.edges("energia")) == 3
+    assert g.neighbors("trabalho", direcao="in", tipo="causa") == ["forca"]
+    assert g.neighbors("trabalho", direcao="out") == []
+
+    print("[OK] Arestas tipadas funcionando")
+    print()
+
+
+def test_deduplicacao():
+    """Testa has_edge e upsert de arestas repetidas"""
+    print("=" * 60)
+    print("TESTE 3: Deduplicação e upsert")
+    print("=" * 60)
+
+    g = _grafo_exemplo()
+    total = len(g.data["arestas"])
+    assert g.has_edge("energia", "trabalho", "relacionado")
+    assert not g.has_edge("trabalho", "energia", "relacionado")
+
+    # Repetição com upsert mescla peso e origem
+    assert g.add_edge("energia", "trabalho", "relacionado", peso=0.95, origem="nucleo", save=False)
+    assert len(g.data["arestas"]) == total
+    e = g.related("energia", "trabalho")[0]
+    assert e["peso"] == 0.95 and e["origem"] == "humano+nucleo"
+
+    # Sem upsert a repetição é ignorada
+    assert not g.add_edge("energia", "trabalho", "relacionado", peso=0.1, upsert=False, save=False)
+    assert e["peso"] == 0.95
+    assert len(g.data["arestas"]) == total
+
+    print("[OK] Deduplicação funcionando")
+    print()
+
+
+def test_journal():
+    """Testa journal append-only, replay e compactação"""
+    print("=" * 60)
+    print("TESTE 4: Journal (write-ahead log)")
+    print("=" * 60)
+
+    import json
+
+    g = _grafo_exemplo()
+    snapshot = g.path.read_text(encoding="utf-8")
+    gj = TRQGraph(str(g.path), journal=True)
+    gj.add_node("potencia", "trabalho por tempo")
+    gj.add_edge("potencia", "trabalho", "relacionado")
+
+    # Snapshot intacto; mutações só no journal
+    assert g.path.read_text(encoding="utf-8") == snapshot
+    assert len(gj.journal_path.read_text(encoding="utf-8").splitlines()) == 2
+
+    # load() reaplica o journal sobre o snapshot
+    g2 = TRQGraph(str(g.path))
+    assert g2.get_node("potencia") is not None
+    assert g2.has_edge("potencia", "trabalho", "relacionado")
+
+    # compact() dobra o journal num novo snapshot
+    assert gj.compact() == 2
+    assert not gj.journal_path.exists()
+    g3 = TRQGraph(str(g.path))
+    assert g3.has_edge("potencia", "trabalho", "relacionado")
+
+    # Queda entre o rename do snapshot e o unlink do journal: o journal já
+    # dobrado é reaplicado por cima sem erro e sem mudar o resultado
+    from core.trq_diff import vazio
+    gj.apply_patch({"arestas": {"removidas": [["forca", "trabalho", "causa"]]}})
+    gj.update_edge_weight("potencia", "trabalho", "relacionado", 0.4)
+    gj.remove_node("calor")
+    wal = gj.journal_path.read_text(encoding="utf-8")
+    gj.compact()
+    gj.journal_path.write_text(wal, encoding="utf-8")
+    g4 = TRQGraph(str(g.path), journal=True)
+    assert vazio(g4.diff(gj)) and g4.stats() == gj.stats()
+
+    # Registro que não é "já aplicado" (aresta para nó que nunca existiu)
+    # interrompe o load indicando o registro, em vez de ser pulado
+    registro = {"op": "add_edge", "args": {"de": "potencia", "para": "fantasma", "tipo": "causa"}}
+    gj.journal_path.write_text(wal + json.dumps(registro) + "\n", encoding="utf-8")
+    try:
+        TRQGraph(str(g.path), journal=True)
+        assert False, "journal inconsistente deveria falhar"
+    except ValueError as exc:
+        assert "registro 4 (add_edge)" in str(exc)
+    gj.journal_path.unlink()
+
+    print("[OK] Journal funcionando")
+    print()
+
+
+def test_backend_sqlite():
+    """Testa migração JSON -> SQLite e paridade da API"""
+    print("=" * 60)
+    print("TESTE 5: Backend SQLite")
+    print("=" * 60)
+
+    g = _grafo_exemplo()
+    db = g.path.with_suffix(".db")
+    res = migrar_json(g.path, db)
+    assert res == {"nodos": 5, "arestas": 4}
+
+    s = TRQGraphSQLite(str(db))
+    for nid in ("energia", "trabalho", "calor"):
+        assert s.get_node(nid) == g.get_node(nid)
+        assert sorted(s.neighbors(nid)) == sorted(g.neighbors(nid))
+    assert s.edges("energia", "out", tipo="causa") == g.edges("energia", "out", tipo="causa")
+    assert s.related("trabalho", "energia") == g.related("trabalho", "energia")
+    assert s.stats() == g.stats()
+    assert sorted(s.get_region("fisica:mecanica")) == sorted(g.data["nodos"])
+
+    assert s.add_edge("energia", "trabalho", "relacionado", peso=0.9, origem="nucleo")
+    assert s.related("energia", "trabalho")[0]["origem"] == "humano+nucleo"
+    assert not s.add_edge("energia", "inexistente", "causa")
+    s.close()
+
+    print("[OK] Backend SQLite funcionando")
+    print()
+
+
+def test_snapshot_csr():
+    """Testa exportação e leitura do snapshot CSR mapeado em memória"""
+    print("=" * 60)
+    print("TESTE 6: Snapshot CSR")
+    print("=" * 60)
+
+    import json
+    import os
+    from core.trq_snapshot import TRQSnapshot
+
+    g = _grafo_exemplo()
+    destino = g.path.parent / "csr"
+    g.export_csr(str(destino))
+    s = TRQSnapshot(str(destino))
+
+    for nid in g.data["nodos"]:
+        assert s.get_node(nid) == g.get_node(nid)
+        assert sorted(s.neighbors(nid)) == sorted(g.neighbors(nid))
+    assert s.get_node("inexistente") is None
+    assert s.edges("energia", "in", tipo="exemplo") == g.edges("energia", "in", tipo="exemplo")
+    assert s.related("trabalho", "energia") == g.related("trabalho", "energia")
+    assert s.has_edge("forca", "trabalho", "causa")
+    assert s.stats() == g.stats()
+
+    # Reexportar troca o diretório: o leitor antigo segue nos arquivos antigos
+    g.add_node("potencia", "trabalho por tempo", save=False)
+    g.add_edge("potencia", "trabalho", "relacionado", save=False)
+    g.export_csr(str(destino))
+    novo = TRQSnapshot(str(destino))
+    assert novo.neighbors("potencia") == ["trabalho"] and s.get_node("potencia") is None
+    assert sorted(s.neighbors("trabalho")) == ["energia", "forca"]
+
+    # destino é um link trocado com os.replace (nunca ausente); ficam só a
+    # versão atual e a anterior, sem temporários
+    def versoes():
+        return sorted(p.name for p in destino.parent.iterdir() if p.name.startswith(".csr"))
+    assert destino.is_symlink() and len(versoes()) == 2
+    atual = os.readlink(destino)
+    g.export_csr(str(destino))
+    assert len(versoes()) == 2 and atual in versoes() and os.readlink(destino) != atual
+    assert sorted(s.neighbors("trabalho")) == ["energia", "forca"]  # mapeado antes
+
+    # Diretório no formato antigo vira uma versão na primeira exportação
+    legado = g.path.parent / "csr_legado"
+    legado.mkdir()
+    (legado / "meta.json").write_text("{}", encoding="utf-8")
+    g.export_csr(str(legado))
+    assert legado.is_symlink() and TRQSnapshot(str(legado)).neighbors("potencia") == ["trabalho"]
+
+    # Totais do meta saem do conjunto exportado: aresta para nó ausente
+    # (arquivo antigo) não entra nem no CSR nem nos contadores
+    dados = json.loads(g.path.read_text(encoding="utf-8"))
+    dados["arestas"].append({"de": "energia", "para": "sumido", "tipo": "causa", "peso": 0.5})
+    antigo = g.path.with_name("antigo.json")
+    antigo.write_text(json.dumps(dados), encoding="utf-8")
+    ga = TRQGraph(str(antigo))
+    assert ga.stats()["total_arestas"] == 5
+    meta = ga.export_csr(str(g.path.parent / "csr_antigo"))
+    assert meta["total_arestas"] == 4 and sum(meta["arestas_por_tipo"].values()) == 4
+    assert meta["histograma_grau"] == {"1": 3, "2-3": 2}  # energia com grau 3, não 4
+
+    print("[OK] Snapshot CSR funcionando")
+    print()
+
+
+def test_indice_regioes():
+    """Testa índice de regiões e vizinhos filtrados por região"""
+    print("=" * 60)
+    print("TESTE 7: Índice de regiões")
+    print("=" * 60)
+
+    g = _grafo_exemplo()
+    g.add_node("entropia", "medida de desordem", regiao="fisica:termodinamica:3", save=False)
+    g.add_node("bit", "unidade de informacao", regiao="ti:dados:1", save=False)
+    g.add_edge("energia", "entropia", "relacionado", save=False)
+    g.add_edge("energia", "bit", "relacionado", save=False)
+
+    assert sorted(g.get_region("fisica:termodinamica")) == ["entropia"]
+    assert g.get_region("ti") == ["bit"]
+    assert len(g.region_nodes("fisica", nivel_max=2)) == 5
+    assert g.region_nodes("fisica", "mecanica", nivel_min=3) == []
+    assert g.neighbors("energia", regiao="fisica:termodinamica") == ["entropia"]
+    assert "bit" not in g.neighbors("energia", regiao="fisica")
+    assert g.stats()["regioes"] == ["fisica", "ti"]
+
+    print("[OK] Índice de regiões funcionando")
+    print()
+
+
+def test_percurso():
+    """Testa percurso k-hop com tipos, peso mínimo, fanout e orçamento"""
+    print("=" * 60)
+    print("TESTE 8: Percurso (BFS/DFS)")
+    print("=" * 60)
+
+    g = _grafo_exemplo()
+    g.add_node("joule", "unidade de energia", save=False)
+    g.add_edge("movimento", "joule", "relacionado", peso=0.3, save=False)
+
+    passos = list(g.traverse("calor", profundidade=3))
+    assert [p["nodo"] for p in passos] == ["energia", "trabalho", "movimento", "joule"]
+    assert passos[-1]["caminho"] == ["calor", "energia", "movimento", "joule"]
+    assert passos[-1]["aresta"]["de"] == "movimento"
+
+    assert [p["nodo"] for p in g.traverse("calor", profundidade=1)] == ["energia"]
+    assert [p["nodo"] for p in g.traverse("calor", profundidade=3, peso_min=0.5)][-1] == "movimento"
+    assert [p["nodo"] for p in g.traverse("energia", tipos=["causa"])] == ["movimento"]
+    assert len(list(g.traverse("calor", profundidade=3, max_nodos=2))) == 2
+    assert len(list(g.traverse("calor", profundidade=3, fanout=(1, 1, 1)))) == 2
+
+    # Ambas as direções e DFS (2º nível logo após o pai)
+    dfs = [p["nodo"] for p in g.traverse("trabalho", profundidade=2, direcao=None, estrategia="dfs")]
+    assert dfs == ["energia", "movimento", "calor", "forca"]
+
+    print("[OK] Percurso funcionando")
+    print()
+
+
+def test_caminhos():
+    """Testa caminhos ponderados (-log peso) entre dois conceitos"""
+    print("=" * 60)
+    print("TESTE 9: Caminhos de explicação")
+    print("=" * 60)
+
+    g = _grafo_exemplo()
+    g.add_edge("calor", "movimento", "causa", peso=0.2, save=False)
+
+    caminhos = g.paths("calor", "trabalho", k=3)
+    assert caminhos[0]["nodos"] == ["calor", "energia", "trabalho"]
+    assert abs(caminhos[0]["peso"] - 0.64) < 1e-9
+    assert caminhos[1]["nodos"] == ["calor", "movimento", "energia", "trabalho"]
+    assert [c["custo"] for c in caminhos] == sorted(c["custo"] for c in caminhos)
+
+    # Sentido das arestas e restrição de tipo
+    assert g.paths("trabalho", "calor", direcao="out") == []
+    assert g.paths("calor", "trabalho", tipos=["causa"]) == []
+    assert g.paths("calor", "inexistente") == []
+
+    print("[OK] Caminhos funcionando")
+    print()
+
+
+def test_centralidade():
+    """Testa grau incremental, PageRank e seleção top-k de vizinhos"""
+    print("=" * 60)
+    print("TESTE 10: Centralidade")
+    print("=" * 60)
+
+    g = _grafo_exemplo()
+    c = g.centralidade("energia")
+    assert c["grau"] == 3 and abs(c["grau_ponderado"] - 2.4) < 1e-9
+    assert c["pagerank"] > 0
+
+    # trabalho recebe arestas de energia e forca: mais central que movimento
+    assert g.top_neighbors("energia", k=2, direcao="out") == ["trabalho", "movimento"]
+    assert g.top_neighbors("energia", k=1) == ["trabalho"]
+    assert g.top_neighbors("energia", k=3, por="grau")[0] == "trabalho"
+
+    # Grau é incremental; upsert com peso maior ajusta o grau ponderado
+    g.add_edge("forca", "movimento", "causa", peso=0.5, save=False)
+    g.add_edge("forca", "movimento", "causa", peso=0.9, save=False)
+    assert g.centralidade("movimento")["grau"] == 2
+    assert abs(g.centralidade("movimento")["grau_ponderado"] - 1.7) < 1e-9
+
+    print("[OK] Centralidade funcionando")
+    print()
+
+
+def test_transacao():
+    """Testa batch(): uma gravação no commit e rollback em caso de erro"""
+    print("=" * 60)
+    print("TESTE 11: Transação em lote")
+    print("=" * 60)
+
+    g = _grafo_exemplo()
+    gj = TRQGraph(str(g.path), journal=True)
+    with gj.batch():
+        gj.add_node("potencia", "trabalho por tempo")
+        gj.add_edge("potencia", "trabalho", "relacionado")
+        # Leituras dentro do lote já enxergam as mutações
+        assert gj.has_edge("potencia", "trabalho", "relacionado")
+        assert not gj.journal_path.exists()
+    assert len(gj.journal_path.read_text(encoding="utf-8").splitlines()) == 2
+
+    # Exceção desfaz nós, arestas, upserts e índices; nada é gravado
+    antes = (len(gj.data["arestas"]), gj.centralidade("trabalho")["grau_ponderado"])
+    try:
+        with gj.batch():
+            gj.add_node("watt", "unidade de potencia", regiao="fisica:unidades:1")
+            gj.add_edge("watt", "potencia", "exemplo")
+            gj.add_edge("energia", "trabalho", "relacionado", peso=0.99, origem="nucleo")
+            raise RuntimeError("falha no meio do lote")
+    except RuntimeError:
+        pass
+    assert gj.get_node("watt") is None and gj.get_region("fisica:unidades") == []
+    assert gj.neighbors("potencia") == ["trabalho"]
+    e = gj.related("energia", "trabalho")[0]
+    assert e["peso"] == 0.8 and e["origem"] == "humano"
+    assert (len(gj.data["arestas"]), gj.centralidade("trabalho")["grau_ponderado"]) == antes
+    assert len(gj.journal_path.read_text(encoding="utf-8").splitlines()) == 2
+
+    print("[OK] Transação funcionando")
+    print()
+
+
+def _pagerank_referencia(g, amortecimento=0.85, iteracoes=200):
+    """PageRank ponderado clássico (iteração de potência) para conferir o incremental."""
+    nodos = list(g.data["nodos"])
+    n = len(nodos)
+    saida = {nid: sum(e["peso"] for e in g.edges(nid, "out")) for nid in nodos}
+    rank = dict.fromkeys(nodos, 1.0 / n)
+    for _ in range(iteracoes):
+        pendente = sum(rank[nid] for nid in nodos if saida[nid] <= 0.0)
+        novo = dict.fromkeys(nodos, (1.0 - amortecimento) / n + amortecimento * pendente / n)
+        for nid in nodos:
+            for e in g.edges(nid, "out") if saida[nid] > 0.0 else ():
+                novo[e["para"]] += amortecimento * rank[nid] * e["peso"] / saida[nid]
+        rank = novo
+    return rank
+
+
+def test_snapshot_cow():
+    """Testa snapshots imutáveis (copy-on-write) com escrita concorrente"""
+    print("=" * 60)
+    print("TESTE 12: Snapshots copy-on-write")
+    print("=" * 60)
+
+    import threading
+
+    g = _grafo_exemplo()
+    v1 = g.snapshot()
+    assert g.snapshot() is v1  # sem escrita, mesma versão
+
+    g.add_node("potencia", "trabalho por tempo", regiao="fisica:mecanica:2", save=False)
+    g.add_edge("potencia", "trabalho", "relacionado", save=False)
+    g.add_edge("energia", "trabalho", "relacionado", peso=0.95, origem="nucleo", save=False)
+
+    # A versão antiga não muda: nós, arestas, índices e registros
+    assert v1.get_node("potencia") is None
+    assert sorted(v1.neighbors("trabalho")) == ["energia", "forca"]
+    assert len(v1.data["arestas"]) == 4 and "potencia" not in v1.get_region("fisica")
+    assert v1.related("energia", "trabalho")[0]["peso"] == 0.8
+    assert v1.centralidade("trabalho")["grau"] == 2
+
+    v2 = g.snapshot()
+    assert v2 is not v1 and v2.has_edge("potencia", "trabalho", "relacionado")
+    assert v2.related("energia", "trabalho")[0]["origem"] == "humano+nucleo"
+    try:
+        v2.add_node("watt", "unidade")
+        assert False, "snapshot deveria ser somente leitura"
+    except TypeError:
+        pass
+
+    # PageRank e componentes são mantidos por jobs no grafo vivo: leitores de
+    # snapshot não calculam, versões novas herdam o que foi publicado
+    assert g._pr_fila and v2.centralidade("trabalho")["pagerank"] == 0.0
+    assert g.atualizar_centralidade() > 0 and not g._pr_fila
+    assert g.atualizar_componentes() == 1 and g.atualizar_componentes() == 0
+    v2 = g.snapshot()
+    assert v2.centralidade("trabalho")["pagerank"] > 0 and v2.same_component("potencia", "calor")
+    assert v2._pagerank is g._pagerank and v2._componentes[None] is g._componentes[None]
+
+    # Mutação só corrige resíduos em volta do nó tocado; o job fecha a conta
+    g.add_node("watt", "unidade de potencia", save=False)
+    g.add_edge("watt", "potencia", "relacionado", save=False)
+    assert 1 <= len(g._pr_fila) <= 3
+    v3 = g.snapshot()
+    assert v3._componentes[None] is g._componentes[None] and v3.same_component("watt", "energia")
+    assert not v2.same_component("watt", "energia")
+    g.update_edge_weight("energia", "trabalho", "relacionado", 0.3, save=False)
+    g.atualizar_centralidade()
+    referencia = _pagerank_referencia(g)
+    assert all(abs(g.centralidade(nid)["pagerank"] - pr) < 1e-3 for nid, pr in referencia.items())
+    assert g.remove_node("watt", save=False)
+    assert None in g._componentes_sujos and v3.same_component("watt", "energia")
+    assert g.atualizar_componentes() == 1 and g.component_of("watt") is None
+    g.atualizar_centralidade()
+    assert all(abs(g.centralidade(nid)["pagerank"] - pr) < 1e-3
+               for nid, pr in _pagerank_referencia(g).items())
+
+    # Durante um lote os leitores seguem na versão anterior
+    with g.batch():
+        g.add_node("watt", "unidade de potencia", save=False)
+        assert g.snapshot().get_node("watt") is None
+    assert g.snapshot().get_node("watt") is not None
+
+    # Leitores iteram sem travas enquanto um escritor cresce o grafo
+    erros = []
+
+    def escritor():
+        for i in range(300):
+            g.add_node(f"n{i}", "x", save=False)
+            g.add_edge(f"n{i}", "energia", "exemplo", save=False)
+
+    def leitor():
+        try:
+            for _ in range(300):
+                v = g.snapshot()
+                assert len(v.edges("energia", "in")) == len(v.neighbors("energia", direcao="in"))
+                sum(1 for _ in v.data["arestas"])
+        except Exception as exc:  # pragma: no cover - só em caso de falha
+            erros.append(exc)
+
+    threads = [threading.Thread(target=escritor)] + [threading.Thread(target=leitor) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not erros, erros
+    assert len(g.snapshot().edges("energia", "in", tipo="exemplo")) == 301
+
+    # Escrever depois de um snapshot copia só os fragmentos tocados, não os
+    # índices inteiros (core.cow)
+    v = g.snapshot()
+    g.add_edge("n5", "n7", "relacionado", save=False)
+    for nome in ("_out", "_in", "_chaves", "_grau"):
+        tocados = [f for f, antigo in zip(getattr(g, nome)._frags, getattr(v, nome)._frags) if f is not antigo]
+        assert 1 <= len(tocados) <= 2, nome
+    assert all(a is b for a, b in zip(g.data["nodos"]._frags, v.data["nodos"]._frags))
+    assert sum(a is not b for a, b in zip(g.data["arestas"]._blocos, v.data["arestas"]._blocos)) <= 1
+    assert g.has_edge("n5", "n7", "relacionado") and not v.has_edge("n5", "n7", "relacionado")
+
+    print("[OK] Snapshots copy-on-write funcionando")
+    print()
+
+
+def test_stats_incrementais():
+    """Testa contadores de stats() contra uma contagem completa"""
+    print("=" * 60)
+    print("TESTE 13: Estatísticas incrementais")
+    print("=" * 60)
+
+    def contagem_completa(g):
+        por_tipo, por_regiao, por_origem, hist, grau = {}, {}, {}, {}, {}
+        for e in g.data["arestas"]:
+            por_tipo[e["tipo"]] = por_tipo.get(e["tipo"], 0) + 1
+            for nid in (e["de"], e["para"]):
+                grau[nid] = grau.get(nid, 0) + 1
+        for nid, n in g.data["nodos"].items():
+            nome = n["regiao"]["nome"]
+            por_regiao[nome] = por_regiao.get(nome, 0) + 1
+            por_origem[n["origem"]] = por_origem.get(n["origem"], 0) + 1
+            faixa = TRQGraph._faixa_grau(grau.get(nid, 0))
+            hist[faixa] = hist.get(faixa, 0) + 1
+        return por_tipo, por_regiao, por_origem, hist
+
+    def confere(g):
+        s = g.stats()
+        assert (s["arestas_por_tipo"], s["nodos_por_regiao"], s["nodos_por_origem"],
+                s["histograma_grau"]) == contagem_completa(g)
+        assert s["total_arestas"] == sum(s["arestas_por_tipo"].values())
+
+    g = _grafo_exemplo()
+    confere(g)
+    assert g.stats()["histograma_grau"] == {"1": 3, "2-3": 2}
+
+    g.add_node("bit", "unidade de informacao", regiao="ti:dados:1", origem="nucleo", save=False)
+    g.add_edge("bit", "energia", "relacionado", save=False)
+    g.add_edge("energia", "trabalho", "relacionado", peso=0.9, save=False)  # upsert
+    confere(g)
+    assert g.stats()["nodos_por_origem"] == {"humano": 5, "nucleo": 1}
+    assert g.stats()["histograma_grau"]["4-7"] == 1
+
+    try:
+        with g.batch():
+            g.add_node("watt", "unidade", regiao="fisica:unidades:1", save=False)
+            g.add_edge("watt", "energia", "exemplo", save=False)
+            raise RuntimeError("rollback")
+    except RuntimeError:
+        pass
+    confere(g)
+
+    # Mesmos números ao recarregar do disco
+    g.save()
+    assert TRQGraph(str(g.path)).stats() == g.stats()
+
+    print("[OK] Estatísticas incrementais funcionando")
+    print()
+
+
+def test_shards_regiao():
+    """Testa grafo fragmentado por região com carga sob demanda e orçamento"""
+    print("=" * 60)
+    print("TESTE 14: Shards por região")
+    print("=" * 60)
+
+    from core.trq_shards import TRQGraphShards
+
+    g = _grafo_exemplo()
+    g.add_node("bit", "unidade de informacao", regiao="ti:dados:1", save=False)
+    g.add_node("byte", "oito bits", regiao="ti:dados:1", save=False)
+    g.add_node("ser", "o que existe", regiao="filosofia:ontologia:1", save=False)
+    g.add_edge("byte", "bit", "parte_de", save=False)
+    g.add_edge("bit", "energia", "relacionado", save=False)  # cruza ti -> fisica
+    destino = g.path.parent / "shards"
+    assert g.export_shards(str(destino)) == {"shards": 3, "nodos": 8, "arestas_cruzadas": 1}
+
+    s = TRQGraphShards(str(destino))
+    assert s.carregados() == [] and s.stats() == g.stats()
+
+    # Tocar um nó carrega só o shard dele
+    assert s.get_node("forca") == g.get_node("forca")
+    assert s.carregados() == ["fisica"]
+    assert sorted(s.neighbors("energia")) == sorted(g.neighbors("energia"))
+    assert s.related("bit", "energia") == g.related("bit", "energia")
+    assert s.neighbors("energia", regiao="ti") == ["bit"]
+    assert "filosofia" not in s.carregados()
+
+    # Mutações nos dois tipos de aresta + persistência
+    s.add_node("watt", "unidade de potencia", regiao="fisica:unidades:1")
+    s.add_edge("watt", "energia", "relacionado")
+    s.add_edge("ser", "energia", "relacionado", save=False)
+    s.save()
+    s2 = TRQGraphShards(str(destino))
+    assert s2.has_edge("watt", "energia", "relacionado") and s2.has_edge("ser", "energia", "relacionado")
+    assert s2.stats()["total_nodos"] == 9 and s2.stats()["total_arestas"] == 8
+    assert s2.stats()["histograma_grau"] == s.stats()["histograma_grau"]
+
+    # Orçamento: o shard frio é descarregado (e gravado) ao passar do limite
+    s3 = TRQGraphShards(str(destino), max_nodos=6)
+    s3.get_node("bit")
+    s3.add_edge("bit", "byte", "relacionado", save=False)
+    s3.get_node("energia")
+    assert s3.carregados() == ["fisica"]
+    assert TRQGraphShards(str(destino)).has_edge("bit", "byte", "relacionado")
+
+    print("[OK] Shards por região funcionando")
+    print()
+
+
+def test_carga_streaming():
+    """Testa leitura incremental do snapshot e do dicionário"""
+    print("=" * 60)
+    print("TESTE 15: Carga em streaming")
+    print("=" * 60)
+
+    import json
+    from core import json_stream
+    from core.dictionary_store import DictionaryStore
+
+    g = _grafo_exemplo()
+    obj = json.loads(g.path.read_text(encoding="utf-8"))
+
+    # Blocos minúsculos cortam chaves, strings e números no meio
+    itens = list(json_stream.itens(g.path, nivel=2, bloco=3))
+    assert len(itens) == 5 + 4
+    assert itens[0] == (("nodos", "energia"), obj["nodos"]["energia"])
+    assert itens[-1] == (("arestas", 3), obj["arestas"][3])
+
+    # Bloco de 1 byte sobre números: o corte cai depois de ".", "e" e sinal
+    numeros = [1.5, 2e-3, -0.25, 10, 3.0e+2, 7, 0.5E-1, 12345]
+    lista = g.path.parent / "numeros.json"
+    lista.write_text("[1.5, 2e-3, -0.25, 10, 3.0e+2, 7, 0.5E-1, 12345]", encoding="utf-8")
+    assert [v for _, v in json_stream.itens(lista, nivel=1, bloco=1)] == numeros
+
+    # Arestas antes dos nós e chaves extras: mesmo grafo, mesmas stats
+    invertido = {"versao": 2, "arestas": obj["arestas"], "nodos": obj["nodos"]}
+    g.path.write_text(json.dumps(invertido, ensure_ascii=False), encoding="utf-8")
+    progresso = []
+    g2 = TRQGraph(str(g.path), progresso=lambda lidos, total: progresso.append((lidos, total)))
+    assert g2.stats() == g.stats() and g2.data["versao"] == 2
+    assert progresso[-1][0] == progresso[-1][1] == g.path.stat().st_size
+
+    # Arquivo corrompido continua resultando em grafo vazio
+    g.path.write_text('{"nodos": {"x": {"id": "x"', encoding="utf-8")
+    assert TRQGraph(str(g.path)).stats()["total_nodos"] == 0
+
+    dic = g.path.parent / "dicionario.json"
+    dic.write_text(json.dumps({"energia": {"forma": "energia"}, "ação": {"forma": "ação"}}), encoding="utf-8")
+    assert DictionaryStore(str(dic)).data == {"energia": {"forma": "energia"}, "ação": {"forma": "ação"}}
+
+    print("[OK] Carga em streaming funcionando")
+    print()
+
+
+def test_diff_patch():
+    """Testa diff linear entre grafos e aplicação atômica do patch"""
+    print("=" * 60)
+    print("TESTE 16: Diff e patch")
+    print("=" * 60)
+
+    import json
+    from core.trq_diff import calcular_diff, vazio
+
+    a = _grafo_exemplo()
+    obj = json.loads(a.path.read_text(encoding="utf-8"))
+    del obj["nodos"]["calor"]
+    obj["arestas"] = [e for e in obj["arestas"] if e["de"] != "calor"]
+    obj["nodos"]["forca"]["definicao"] = "massa vezes aceleracao"
+    obj["nodos"]["potencia"] = dict(obj["nodos"]["energia"], id="potencia")
+    obj["arestas"].append(dict(obj["arestas"][0], de="potencia"))
+    obj["arestas"][0].update(peso=0.95, origem="nucleo")
+    b = _grafo_tmp()
+    b.path.write_text(json.dumps(obj, ensure_ascii=False), encoding="utf-8")
+    b.load()
+
+    patch = a.diff(b)
+    assert patch["nodos"]["removidos"] == ["calor"]
+    assert list(patch["nodos"]["alterados"]) == ["forca"]
+    assert patch["arestas"]["removidas"] == [["calor", "energia", "exemplo"]]
+    assert len(patch["arestas"]["alteradas"]) == 1 and len(patch["arestas"]["adicionadas"]) == 1
+
+    # Aplicar em a reproduz b (conteúdo, índices e stats); journal recebe um registro
+    aj = TRQGraph(str(a.path), journal=True)
+    res = aj.apply_patch(json.loads(json.dumps(patch)))
+    assert res["nodos_removidos"] == 1 and res["arestas_alteradas"] == 1
+    assert vazio(calcular_diff(aj, b)) and aj.stats() == b.stats()
+    assert aj.neighbors("energia") == b.neighbors("energia")
+    ca, cb = aj.centralidade("trabalho"), b.centralidade("trabalho")
+    assert ca["grau"] == cb["grau"] and abs(ca["grau_ponderado"] - cb["grau_ponderado"]) < 1e-9
+    assert len(aj.journal_path.read_text(encoding="utf-8").splitlines()) == 1
+    assert vazio(TRQGraph(str(a.path), journal=True).diff(b))
+
+    # Reaplicar conflita: nada muda, nada é gravado
+    antes = aj.snapshot()
+    try:
+        aj.apply_patch(patch)
+        assert False, "patch conflitante deveria falhar"
+    except ValueError:
+        pass
+    assert vazio(calcular_diff(antes, aj)) and aj.stats() == antes.stats()
+    assert len(aj.journal_path.read_text(encoding="utf-8").splitlines()) == 1
+
+    # CLI sem --out: stdout traz só o patch (progresso vai para stderr)
+    import subprocess
+    import sys
+    saida = subprocess.run(
+        [sys.executable, "core/trq_diff.py", "diff", str(b.path), str(_grafo_exemplo().path)],
+        capture_output=True, text=True, check=True, cwd=Path(__file__).resolve().parent,
+    )
+    assert json.loads(saida.stdout) == calcular_diff(b, _grafo_exemplo())
+    assert "[antigo]" in saida.stderr
+
+    print("[OK] Diff e patch funcionando")
+    print()
+
+
+def test_arestas_compactas():
+    """Testa o registro compacto de aresta (slots + strings internadas)"""
+    print("=" * 60)
+    print("TESTE 17: Arestas compactas")
+    print("=" * 60)
+
+    import json
+    from core.trq_graph import Aresta
+
+    g = _grafo_exemplo()
+    e = g.related("energia", "trabalho")[0]
+    assert isinstance(e, Aresta) and not hasattr(e, "__dict__")
+    assert e == {"de": "energia", "para": "trabalho", "tipo": "relacionado", "peso": 0.8, "origem": "humano"}
+    assert dict(e) == {**e} and e.get("inexistente") is None
+
+    # Mesmo texto, mesmo objeto: ids, tipos e origens são compartilhados
+    obj = json.loads(g.path.read_text(encoding="utf-8"))
+    obj["arestas"][0]["criado_em"] = "2024-01-01"
+    g.path.write_text(json.dumps(obj, ensure_ascii=False), encoding="utf-8")
+    g2 = TRQGraph(str(g.path))
+    a, b = g2.data["arestas"][0], g2.data["arestas"][3]
+    assert a["de"] is b["de"] and a["origem"] is b["origem"]
+    assert a["de"] is next(k for k in g2.data["nodos"] if k == "energia")
+
+    # Campos extras sobrevivem; o arquivo gravado é o mesmo de antes
+    g2.save()
+    assert json.loads(g.path.read_text(encoding="utf-8")) == obj
+
+    print("[OK] Arestas compactas funcionando")
+    print()
+
+
+def test_componentes():
+    """Testa componentes conexas incrementais (union-find)"""
+    print("=" * 60)
+    print("TESTE 18: Componentes conexas")
+    print("=" * 60)
+
+    g = _grafo_exemplo()
+    g.add_node("bit", "unidade de informacao", regiao="ti:dados:1", save=False)
+    g.add_node("byte", "oito bits", regiao="ti:dados:1", save=False)
+    g.add_edge("byte", "bit", "parte_de", save=False)
+
+    assert g.same_component("calor", "forca") and not g.same_component("energia", "bit")
+    assert g.component_size("trabalho") == 5 and g.component_size("inexistente") == 0
+    assert sorted(g.component_sizes().values()) == [2, 5]
+    assert g.component_of("inexistente") is None
+    # Restrito por tipo: só "causa" liga forca-trabalho e energia-movimento
+    assert not g.same_component("forca", "energia", tipo="causa")
+    assert g.same_component("energia", "movimento", tipo="causa")
+
+    # Inserções unem na hora; snapshots antigos não enxergam a união
+    v1 = g.snapshot()
+    g.add_edge("bit", "energia", "relacionado", save=False)
+    assert g.same_component("byte", "calor") and g.component_size("bit") == 7
+    assert not v1.same_component("byte", "calor")
+    assert g.same_component("forca", "energia", tipo="causa") is False
+
+    # Remoção separa de novo (estrutura remontada na próxima consulta)
+    g.apply_patch({"arestas": {"removidas": [["bit", "energia", "relacionado"]]}}, save=False)
+    assert not g.same_component("byte", "calor")
+    assert sorted(g.component_sizes().values()) == [2, 5]
+
+    print("[OK] Componentes conexas funcionando")
+    print()
+
+
+def test_ego_network():
+    """Testa a vizinhança de raio r gerada item a item, com tetos"""
+    print("=" * 60)
+    print("TESTE 19: Ego network")
+    print("=" * 60)
+
+    import json
+
+    g = _grafo_exemplo()
+    itens = list(g.ego_network("trabalho", raio=1))
+    nodos = [i["id"] for i in itens if i["item"] == "nodo"]
+    arestas = [i["aresta"] for i in itens if i["item"] == "aresta"]
+    assert nodos[0] == "trabalho" and sorted(nodos) == ["energia", "forca", "trabalho"]
+    # Subgrafo induzido: só arestas entre nós emitidos, cada uma uma vez
+    assert sorted((e["de"], e["para"]) for e in arestas) == [("energia", "trabalho"), ("forca", "trabalho")]
+    assert itens[-1] == {"item": "fim", "nodos": 3, "arestas": 2, "truncado": False}
+    json.dumps(itens)  # pronto para NDJSON
+
+    # Raio 2 alcança tudo; cada nó sai antes das arestas que o ligam
+    itens = list(g.ego_network("trabalho", raio=2))
+    assert itens[-1]["nodos"] == 5 and itens[-1]["arestas"] == 4
+    emitidos = set()
+    for i in itens[:-1]:
+        if i["item"] == "nodo":
+            emitidos.add(i["id"])
+        else:
+            assert {i["aresta"]["de"], i["aresta"]["para"]} <= emitidos
+
+    # Tetos cortam e avisam; a ordem é estável entre chamadas
+    assert list(g.ego_network("trabalho", raio=2, max_nodos=2))[-1]["truncado"]
+    fim = list(g.ego_network("trabalho", raio=2, max_arestas=1))[-1]
+    assert fim["arestas"] == 1 and fim["truncado"]
+    assert list(g.ego_network("energia", raio=2)) == list(g.ego_network("energia", raio=2))
+    assert list(g.ego_network("inexistente")) == []
+
+    print("[OK] Ego network funcionando")
+    print()
+
+
+def test_consulta_padrao():
+    """Testa a mini-linguagem de padrões (parse, plano e casamentos)"""
+    print("=" * 60)
+    print("TESTE 20: Consulta por padrão")
+    print("=" * 60)
+
+    from core import trq_query
+
+    g = _grafo_exemplo()
+    g.add_edge("trabalho", "movimento", "parte_de", save=False)
+
+    res = list(g.query("X -causa-> ? -parte_de-> movimento"))
+    assert [r["vars"] for r in res] == [{"X": "forca"}]
+    assert res[0]["nodos"] == ["forca", "trabalho", "movimento"]
+    assert trq_query.formatar(res[0]) == "forca -causa-> trabalho -parte_de-> movimento"
+
+    # Começa pelo nó fixo mais seletivo; sem nó fixo, varre o tipo mais raro
+    consulta = trq_query.parse("? -relacionado- energia -causa-> ?y")
+    assert trq_query.planejar(g, consulta)["estrategia"] == "indice"
+    assert [r["vars"] for r in trq_query.executar(g, consulta)] == [{"y": "movimento"}]
+    consulta = trq_query.parse("A -*-> B -parte_de-> C")
+    assert trq_query.planejar(g, consulta) == {"inicio": 1, "estrategia": "varredura", "custo": 1}
+    assert sorted(r["vars"]["A"] for r in trq_query.executar(g, consulta)) == ["energia", "forca"]
+
+    # Sentido inverso, variável repetida, limite e erros de sintaxe
+    assert [r["vars"] for r in g.query("energia <-exemplo- X")] == [{"X": "calor"}]
+    assert list(g.query("X -causa-> X")) == []
+    assert len(list(g.query("X -- Y", limite=3))) == 3
+    assert list(g.query("inexistente -causa-> X")) == []
+    for ruim in ("energia", "X -causa-> ", "X <-causa-> Y", "X Y Z"):
+        try:
+            g.query(ruim)
+            assert False, ruim
+        except ValueError:
+            pass
+
+    print("[OK] Consulta por padrão funcionando")
+    print()
+
+
+def test_remover_origem():
+    """Testa o índice de proveniência e remove_origin em lote"""
+    print("=" * 60)
+    print("TESTE 21: Remoção por origem")
+    print("=" * 60)
+
+    from core.trq_diff import calcular_diff, vazio
+
+    g = _grafo_exemplo()
+    antes = TRQGraph(str(g.path))
+    gj = TRQGraph(str(g.path), journal=True)
+    fonte = "enciclopedia:cards.json"
+    with gj.batch():
+        gj.add_node("bit", "unidade de informacao", origem=fonte)
+        gj.add_node("byte", "oito bits", origem=fonte)
+        gj.add_edge("byte", "bit", "parte_de", origem=fonte)
+        gj.add_edge("bit", "energia", "relacionado", origem=fonte)
+        gj.add_edge("energia", "trabalho", "relacionado", peso=0.5, origem=fonte)
+    gj.add_edge("byte", "energia", "relacionado")  # humano, preso a nó importado
+    assert gj.origins()[fonte] == {"nodos": 2, "arestas": 3}
+    assert gj.related("energia", "trabalho")[0]["origem"] == "humano+" + fonte
+
+    # Falha no meio do lote externo: nada muda
+    n_arestas = len(gj.data["arestas"])
+    try:
+        with gj.batch():
+            gj.remove_origin(fonte)
+            raise RuntimeError("desiste")
+    except RuntimeError:
+        pass
+    assert gj.get_node("bit") is not None and gj.origins()[fonte]["arestas"] == 3
+    assert len(gj.data["arestas"]) == n_arestas and gj.has_edge("byte", "bit", "parte_de")
+
+    linhas = len(gj.journal_path.read_text(encoding="utf-8").splitlines())
+    velho = gj.snapshot()
+    res = gj.remove_origin(fonte)
+    assert res == {"nodos_removidos": 2, "nodos_alterados": 0, "arestas_removidas": 2,
+                   "arestas_alteradas": 1, "arestas_orfas": 1}
+    assert fonte not in gj.origins() and gj.origins()["humano"]["nodos"] == 5
+    assert vazio(calcular_diff(antes, gj)) and gj.stats() == antes.stats()
+    assert gj.centralidade("bit")["grau"] == 0 and not gj.same_component("byte", "energia")
+    # Snapshot anterior continua vendo a fonte
+    assert velho.get_node("bit") is not None
+    assert velho.related("energia", "trabalho")[0]["origem"] == "humano+" + fonte
+    assert gj.related("energia", "trabalho")[0]["origem"] == "humano"
+    assert len(gj.journal_path.read_text(encoding="utf-8").splitlines()) == linhas + 1
+    assert vazio(TRQGraph(str(g.path), journal=True).diff(antes))
+
+    print("[OK] Remoção por origem funcionando")
+    print()
+
+
+def test_remover_atualizar():
+    """Testa remove_node/remove_edge/update_node/update_edge_weight indexados"""
+    print("=" * 60)
+    print("TESTE 22: Remoção e atualização")
+    print("=" * 60)
+
+    from core.trq_diff import vazio
+
+    g = _grafo_exemplo()
+    gj = TRQGraph(str(g.path), journal=True)
+    velho = gj.snapshot()
+
+    assert gj.update_edge_weight("energia", "trabalho", "relacionado", 0.3)
+    assert gj.related("energia", "trabalho")[0]["peso"] == 0.3
+    assert abs(gj.centralidade("trabalho")["grau_ponderado"] - 1.1) < 1e-9
+    assert velho.related("energia", "trabalho")[0]["peso"] == 0.8
+    assert not gj.update_edge_weight("energia", "trabalho", "causa", 0.5)
+
+    assert gj.update_node("forca", definicao="massa vezes aceleracao", regiao="fisica:dinamica:1")
+    assert gj.get_node("forca")["definicao_curta"] == "massa vezes aceleracao"
+    assert gj.region_nodes("fisica", "dinamica") == ["forca"]
+    assert gj.get_node("forca")["peso"] == {"estabilidade": 1.0, "confianca": 1.0}
+    assert velho.get_node("forca")["regiao"]["campo"] == "mecanica"
+
+    gj.add_edge("trabalho", "energia", "causa", bidirecional=True)
+    assert gj.remove_edge("trabalho", "energia", "causa", bidirecional=True)
+    assert not gj.has_edge("energia", "trabalho", "causado_por")
+    assert not gj.remove_edge("trabalho", "energia", "causa")
+
+    assert gj.remove_node("energia")
+    assert gj.get_node("energia") is None and not gj.remove_node("energia")
+    assert gj.neighbors("trabalho") == ["forca"] and gj.neighbors("calor") == []
+    assert gj.stats()["total_arestas"] == 1 and len(gj.data["arestas"]) == 1
+    assert gj.stats()["arestas_por_tipo"] == {"causa": 1}
+
+    # Lote que falha desfaz a cascata inteira
+    try:
+        with gj.batch():
+            gj.remove_node("trabalho")
+            raise RuntimeError("desiste")
+    except RuntimeError:
+        pass
+    assert gj.has_edge("forca", "trabalho", "causa") and gj.get_node("trabalho") is not None
+
+    # Adicionar e remover no mesmo lote: o desfazer acha a aresta de novo
+    antes = gj.stats()
+    try:
+        with gj.batch():
+            gj.add_edge("calor", "forca", "causa")
+            gj.remove_edge("calor", "forca", "causa")
+            gj.add_edge("calor", "forca", "causa")
+            gj.remove_node("forca")
+            raise RuntimeError("desiste")
+    except RuntimeError:
+        pass
+    assert not gj.has_edge("calor", "forca", "causa") and gj.edges("calor") == []
+    assert gj.stats() == antes and gj.has_edge("forca", "trabalho", "causa")
+    assert len(gj.data["arestas"]) == len(gj._posicoes_mutaveis()) == 1
+
+    # Journal reaplica tudo; grafo recarregado bate com o em memória
+    recarregado = TRQGraph(str(g.path), journal=True)
+    assert vazio(recarregado.diff(gj)) and recarregado.stats() == gj.stats()
+    assert recarregado.related("forca", "trabalho")[0]["peso"] == 0.8
+
+    print("[OK] Remoção e atualização funcionando")
+    print()
+
+
+def test_inversas_virtuais():
+    """Testa relações inversas respondidas pelo índice de entrada e a migração"""
+    print("=" * 60)
+    print("TESTE 23: Relações inversas virtuais")
+    print("=" * 60)
+
+    import json
+    from core.trq_diff import vazio
+
+    g = _grafo_exemplo()
+    assert g.neighbors("trabalho", tipo="causado_por", direcao="out") == ["forca"]
+    assert g.neighbors("energia", tipo="exemplificado_por") == ["calor"]
+    e = g.edges("movimento", "out", "causado_por")[0]
+    assert (e["de"], e["para"], e["tipo"]) == ("movimento", "energia", "causado_por")
+    assert g.has_edge("trabalho", "forca", "causado_por")
+    assert not g.has_edge("forca", "trabalho", "causado_por")
+
+    # bidirecional não grava mais a inversa; tipo inverso grava o direto
+    n = g.stats()["total_arestas"]
+    assert g.add_edge("movimento", "trabalho", "parte_de", bidirecional=True, save=False)
+    assert g.add_edge("energia", "calor", "composto_por", save=False)
+    assert g.stats()["total_arestas"] == n + 2
+    assert "composto_por" not in g.stats()["arestas_por_tipo"]
+    assert g.has_edge("calor", "energia", "parte_de")
+    assert g.neighbors("trabalho", tipo="composto_por") == ["movimento"]
+
+    # Consulta por padrão: partindo de nó fixo e por varredura
+    assert [c["vars"] for c in g.query("trabalho -composto_por-> X")] == [{"X": "movimento"}]
+    assert sorted(c["vars"]["X"] for c in g.query("X -causado_por-> Y")) == ["movimento", "trabalho"]
+
+    # SQLite responde igual
+    db = g.path.with_suffix(".db")
+    migrar_json(g.path, db)
+    s = TRQGraphSQLite(str(db))
+    assert s.neighbors("trabalho", tipo="causado_por") == ["forca"]
+    assert s.has_edge("movimento", "energia", "causado_por")
+    s.close()
+
+    # Snapshot CSR também
+    from core.trq_snapshot import TRQSnapshot
+    g.export_csr(str(g.path.parent / "csr"))
+    csr = TRQSnapshot(str(g.path.parent / "csr"))
+    assert csr.neighbors("trabalho", tipo="causado_por", direcao="out") == ["forca"]
+    assert csr.neighbors("trabalho", tipo="composto_por") == ["movimento"]
+    e = csr.edges("movimento", "out", "causado_por")[0]
+    assert (e["de"], e["para"], e["tipo"]) == ("movimento", "energia", "causado_por")
+    assert csr.has_edge("trabalho", "forca", "causado_por")
+    assert not csr.has_edge("forca", "trabalho", "causado_por")
+
+    # Migração: inversas gravadas por versões antigas voltam para a direta
+    obj = json.loads(g.path.read_text(encoding="utf-8"))
+    obj["arestas"] += [
+        {"de": "trabalho", "para": "forca", "tipo": "causado_por", "peso": 0.9, "origem": "nucleo"},
+        {"de": "energia", "para": "calor", "tipo": "composto_por", "peso": 0.5, "origem": "humano"},
+    ]
+    legado = _grafo_tmp()
+    legado.path.write_text(json.dumps(obj, ensure_ascii=False), encoding="utf-8")
+    lj = TRQGraph(str(legado.path), journal=True)
+    assert lj.fold_inverse_edges() == {"dobradas": 2, "mescladas": 1}
+    assert lj.stats()["tipos_relacao"] == ["causa", "exemplo", "parte_de", "relacionado"]
+    assert lj.stats()["total_arestas"] == 5
+    r = lj.related("forca", "trabalho")[0]
+    assert r["peso"] == 0.9 and r["origem"] == "humano+nucleo"
+    assert lj.get_node("calor") and lj.has_edge("calor", "energia", "parte_de")
+    assert lj.fold_inverse_edges() == {"dobradas": 0, "mescladas": 0}
+    assert vazio(TRQGraph(str(legado.path), journal=True).diff(lj))
+
+    # Migração para SQLite também dobra as inversas legadas
+    legado = _grafo_tmp()
+    legado.path.write_text(json.dumps(obj, ensure_ascii=False), encoding="utf-8")
+    db = legado.path.with_suffix(".db")
+    assert migrar_json(legado.path, db) == {"nodos": 5, "arestas": 5}
+    s = TRQGraphSQLite(str(db))
+    assert s.stats()["arestas_por_tipo"].get("causado_por") is None
+    assert [r["peso"] for r in s.related("forca", "trabalho")] == [0.9]
+    s.close()
+
+    print("[OK] Relações inversas virtuais funcionando")
+    print()
+
+
+def test_persistencia_adiada():
+    """Testa a gravação adiada (debounce) do grafo e do dicionário"""
+    print("=" * 60)
+    print("TESTE 24: Persistência adiada")
+    print("=" * 60)
+
+    import json
+    import time
+    from core.dictionary_store import DictionaryStore
+    from core.persistencia import GravadorAdiado
+
+    g = _grafo_exemplo()
+    ga = TRQGraph(str(g.path), journal=True, adiar=True)
+    ds = DictionaryStore(str(g.path.with_name("dictionary_pt.json")))
+    gravador = GravadorAdiado(intervalo_ms=60_000)
+    gravador.registrar("grafo", ga.flush)
+    gravador.registrar("dicionario", ds.save)
+
+    # Primeira mudança sai logo, no thread de fundo (a janela está aberta)
+    ga.add_node("potencia", "trabalho por tempo")
+    gravador.marcar("grafo")
+    limite = time.monotonic() + 5
+    while gravador.metricas()["gravacoes"] < 1 and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert TRQGraph(str(g.path), journal=True).get_node("potencia") is not None
+
+    # Rajada dentro da janela: aceita em memória, nada vai ao disco ainda
+    for i in range(20):
+        ga.add_node(f"conceito{i}", "teste")
+        ds.add(f"palavra{i}", "substantivo", "teste", save=False)
+        gravador.marcar("grafo")
+        gravador.marcar("dicionario")
+    m = gravador.metricas()
+    assert m["pendentes"] == ["dicionario", "grafo"] and m["atraso_ms"] > 0
+    assert TRQGraph(str(g.path), journal=True).get_node("conceito0") is None
+    assert not ds.path.exists()
+
+    # fechar() grava tudo, coalescido: uma gravação por alvo
+    gravador.fechar()
+    m = gravador.metricas()
+    assert m["gravacoes"] == 3 and m["atraso_ms"] == 0.0 and m["pendentes"] == []
+    assert len(TRQGraph(str(g.path), journal=True).data["nodos"]) == 26
+    assert len(json.loads(ds.path.read_text(encoding="utf-8"))) == 20
+    assert not ds.path.with_name(ds.path.name + ".tmp").exists()
+
+    # Depois de fechado, marcar grava na hora
+    ds.add("extra", "substantivo", "teste", save=False)
+    gravador.marcar("dicionario")
+    assert len(json.loads(ds.path.read_text(encoding="utf-8"))) == 21
+
+    # gravar_ao_sair=False (jobs de recálculo): fechar() só para o thread
+    rodadas = []
+    job = GravadorAdiado(intervalo_ms=60_000, gravar_ao_sair=False)
+    job.registrar("grafo", lambda: rodadas.append(1))
+    job.marcar("grafo")
+    limite = time.monotonic() + 5
+    while job.metricas()["gravacoes"] < 1 and time.monotonic() < limite:
+        time.sleep(0.01)
+    job.marcar("grafo")  # dentro da janela: fica pendente
+    job.fechar()
+    job.marcar("grafo")
+    assert rodadas == [1] and job.metricas()["pendentes"] == ["grafo"]
+
+    print("[OK] Persistência adiada funcionando")
+    print()
+
+
+def test_conceitos_relacionados():
+    """Testa a tabela de relacionados por PageRank personalizado e a atualização incremental"""
+    print("=" * 60)
+    print("TESTE 25: Conceitos relacionados")
+    print("=" * 60)
+
+    g = _grafo_exemplo()
+    assert g.recalcular_relacionados() == 0  # nada consultado: não calcula o grafo todo
+
+    # Fora da tabela: calculado na hora e pedido ao job
+    rel = g.related_concepts("energia")
+    assert set(rel) == {"trabalho", "forca", "calor", "movimento"}
+    assert rel.index("forca") == 3  # vizinhos diretos antes dos de 2 saltos
+    assert g.related_concepts("calor", k=2) == ["energia", "trabalho"]
+    assert g._rel_pedidos == {"energia", "calor"}
+    assert g.recalcular_relacionados() == 2
+    assert set(g._relacionados) == {"energia", "calor"} and not g._rel_pedidos
+    assert isinstance(g._relacionados["energia"], tuple)
+    assert g.related_concepts("energia") == rel and not g._rel_pedidos
+
+    # Snapshots também pedem
+    g.snapshot().related_concepts("forca")
+    assert g._rel_pedidos == {"forca"}
+    assert g.recalcular_relacionados() == 1
+
+    # Tabela gravada ao lado do grafo: quem carrega a mesma versão reaproveita
+    assert g.relacionados_path.exists()
+    assert g.recalcular_relacionados() == 0
+    gj = TRQGraph(str(g.path), journal=True)
+    assert gj.recalcular_relacionados() == 0 and gj.related_concepts("energia") == rel
+    assert not gj._rel_pedidos
+    gj.add_edge("movimento", "calor", "causa")  # vai para o journal
+    assert gj.recalcular_relacionados() == 2  # calor e energia (movimento não foi consultado)
+    recarregado = TRQGraph(str(g.path), journal=True)
+    assert recarregado.recalcular_relacionados() == 0
+    assert recarregado.related_concepts("calor") == gj.related_concepts("calor")
+    assert not recarregado._rel_pedidos
+
+    # Incremental: só os nós da tabela tocados (ou vizinhos de um tocado)
+    g.add_node("potencia", "trabalho por tempo", save=False)
+    g.add_node("isolado", "sem relações", save=False)
+    g.add_edge("potencia", "trabalho", "relacionado", peso=1.0, save=False)
+    assert "potencia" not in g.related_concepts("forca")  # tabela anterior
+    assert g.recalcular_relacionados() == 2  # energia e forca, vizinhos de trabalho
+    assert "potencia" in g.related_concepts("forca")
+    assert g.related_concepts("potencia")[0] == "trabalho"
+    assert g.related_concepts("isolado") == []
+    assert g.recalcular_relacionados() == 2  # os dois pedidos
+
+    # Nó removido some das sugestões na hora, antes da próxima rodada
+    g.remove_node("potencia", save=False)
+    assert "potencia" not in g.related_concepts("forca")
+    assert g.recalcular_relacionados() == 2
+    assert "potencia" not in g._relacionados
+
+    # A tabela gravada agora é de outra versão: quem carrega o disco começa vazio
+    outro = TRQGraph(str(g.path), journal=True)
+    assert outro.recalcular_relacionados() == 0 and outro._relacionados == {}
+    assert outro.recalcular_relacionados(completo=True) == 5
+
+    print("[OK] Conceitos relacionados funcionando")
+    print()
+
+
+if __name__ == "__main__":
+    test_adjacencia()
+    test_arestas_tipadas()
+    test_deduplicacao()
+    test_journal()
+    test_backend_sqlite()
+    test_snapshot_csr()
+    test_indice_regioes()
+    test_percurso()
+    test_caminhos()
+    test_centralidade()
+    test_transacao()
+    test_snapshot_cow()
+    test_stats_incrementais()
+    test_shards_regiao()
+    test_carga_streaming()
+    test_diff_patch()
+    test_arestas_compactas()
+    test_componentes()
+    test_ego_network()
+    test_consulta_padrao()
+    test_remover_origem()
+    test_remover_atualizar()
+    test_inversas_virtuais()
+    test_persistencia_adiada()
+    test_conceitos_relacionados()
@@ -5,18 +5,21 @@ Web server simples para a Antonia com seleção de modos via botões.
 Executa em FastAPI e pode ser exposto via Ngrok.
 """
 
+import itertools
+import json
 import re
 import unicodedata
 from pathlib import Path
 from typing import Optional
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
 from core.engine import Antonia
 from core.session_store import create_session, set_profile, get_session
 from core.profiles import PROFILES
+from core.tokenizer import normalize
 
 BASE_DIR = Path(__file__).resolve().parent
 WEB_DIR = BASE_DIR / "web"
@@ -133,6 +136,51 @@ async def state():
     return {"profile": s.profile_id, "auto": bool(s.estado_dinamico.get("auto_profile", True))}
 
 
+@app.get("/api/graph/stats")
+async def graph_stats():
+    # Contadores incrementais: barato o bastante para ser coletado a cada poucos segundos
+    return _bot.graph.snapshot().stats()
+
+
+@app.get("/api/persistencia")
+async def persistencia():
+    # atraso_ms: há quanto tempo a mudança mais antiga ainda não gravada espera o disco
+    return _bot.persistencia.metricas()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    _bot.fechar()
+
+
+@app.get("/api/graph/ego/{conceito}")
+def graph_ego(
+    conceito: str,
+    raio: int = Query(1, ge=0, le=3),
+    max_nodos: int = Query(200, ge=1, le=5000),
+    max_arestas: int = Query(1000, ge=0, le=20000),
+    formato: str = Query("ndjson", pattern="^(ndjson|json)$"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(200, ge=1, le=2000),
+):
+    """
+    Vizinhança (ego network) de um conceito para a UI desenhar.
+    ndjson: um item por linha, serializado conforme é gerado.
+    json: página [offset, offset+limit) dos mesmos itens, na mesma ordem.
+    """
+    grafo = _bot.graph.snapshot()
+    node_id = normalize(conceito)
+    if grafo.get_node(node_id) is None:
+        raise HTTPException(status_code=404, detail="Conceito nao encontrado")
+    itens = grafo.ego_network(node_id, raio=raio, max_nodos=max_nodos, max_arestas=max_arestas)
+    if formato == "ndjson":
+        linhas = (json.dumps(item, ensure_ascii=False) + "\n" for item in itens)
+        return StreamingResponse(linhas, media_type="application/x-ndjson")
+    pagina = list(itertools.islice(itens, offset, offset + limit + 1))
+    proximo = offset + limit if len(pagina) > limit else None
+    return {"itens": pagina[:limit], "proximo": proximo}
+
+
 @app.post("/api/auto/{enabled}")
 async def set_auto(enabled: int):
     s = get_session(_session.session_id)